@@ -297,10 +297,10 @@ print(estatisticas2)
 class BobRuidoso(Bob):
     taxa_depolar = 1e7 # taxa de depolarização dos qubits que esperam [Hz]
 
-    def _lide_com_teleporte(self, expressao_evento):
+    def _lida_com_teleporte(self, expressao_evento):
         # Função callback que primeiro aplica ruído ao qubit antes das correções
         expr_alice = expressao_evento.second_term
-        expr_charlie = expressão_evento.first_term
+        expr_charlie = expressao_evento.first_term
         # Computa o tempo que o qubit recebido de Charlie esperou
         atraso = ns.sim_time() - expr_charlie.triggered_time
         # Aplice ruído quântico dependente de tempo ao qubit de Bob
@@ -0,0 +1,358 @@
+"""Benchmarks of the simulation scenarios in this repository.
+
+Every scenario runs in a fresh interpreter with a fixed seed. The harness
+measures the wall time, the simulated time per wall clock second, the number
+of events triggered (as reported by the summary ``ns.sim_run`` returns) and
+the peak resident memory.
+
+Usage
+-----
+
+Run all scenarios and store the results::
+
+    python bench.py run --output baseline.json
+
+Run again after a change and flag regressions against the baseline::
+
+    python bench.py run --output current.json
+    python bench.py compare baseline.json current.json --threshold 0.1
+
+The pure entity scenarios also run on the light event kernel of
+:mod:`lightsim`, which needs no netsquid install. Comparing against the
+netsquid results shows the difference in events per second::
+
+    python bench.py run pingpong_entities tutorial2_events --output light.json --backend light
+
+"""
+import argparse
+import contextlib
+import functools
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+from sim_summary import summary_counts
+
+__all__ = [
+    "SCENARIOS",
+    "LIGHT_SCENARIOS",
+    "BACKENDS",
+    "run_scenario",
+    "run_benchmarks",
+    "compare",
+]
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+_TUTORIALS = os.path.join(os.path.dirname(_HERE), "netsquid-pt-br")
+
+
+def _telp_sweep_point(formalism=None):
+    import netsquid as ns
+    import telp
+    if formalism is not None:
+        formalism = ns.QFormalism[formalism]
+    telp._run_sweep_point(200, 1e7, 4e-3, 0.0, aggregate=True, formalism=formalism)
+
+
+def _telp_many_points(reuse_network):
+    # Many cheap points, where building the network dominates
+    import telp
+    telp.run_experiment(10, [1e5 * i for i in range(100)], aggregate=True,
+                        reuse_network=reuse_network)
+
+
+def _telp_gates(fuse_gates, pauli_frame=False):
+    # 200 teleports with the programs applied gate by gate or fused, and Bob's
+    # corrections executed or deferred
+    import netsquid as ns
+    import telp
+    from sweep_stats import SweepAggregator
+    network = telp.example_network_setup(dephase_rate=0.0, fuse_gates=fuse_gates)
+    protocol_alice, protocol_bob, _ = telp.example_sim_setup(
+        network.get_node("Alice"), network.get_node("Bob"), aggregator=SweepAggregator(),
+        sweep_key=1e7, fuse_gates=fuse_gates, pauli_frame=pauli_frame)
+    protocol_alice.start()
+    protocol_bob.start()
+    ns.sim_run(100 * 200)
+
+
+def _lossy_link(skip_ahead):
+    # 200 expected heralded pairs over 20 km with the fibre loss of tutorial 3,
+    # losing photons attempt by attempt or skipping the failed attempts
+    import netsquid as ns
+    from netsquid.components.models.qerrormodels import FibreLossModel
+    from netsquid.nodes import Node, Network
+    import telp
+    from lossy_link import heralding_probability
+    length, source_frequency, successes = 20., 1e6, 200
+    if skip_ahead:
+        connection = telp.LossyEntanglingConnection(length, source_frequency)
+    else:
+        connection = telp.EntanglingConnection(length, source_frequency)
+        for name in ("qchannel_C2A", "qchannel_C2B"):
+            connection.subcomponents[name].models["quantum_loss_model"] = FibreLossModel(
+                p_loss_init=0.83, p_loss_length=0.2)
+    alice, bob = Node("Alice"), Node("Bob")
+    network = Network("Lossy_link")
+    network.add_nodes([alice, bob])
+    port_alice, port_bob = network.add_connection(alice, bob, connection=connection,
+                                                  label="quantum")
+    for node, port in ((alice, port_alice), (bob, port_bob)):
+        node.ports[port].bind_input_handler(lambda message: None)
+    p_success = heralding_probability(length, p_loss_init=0.83, p_loss_length=0.2)
+    ns.sim_run(1e9 / source_frequency * successes / p_success)
+
+
+# Scenarios are either a script that is run as __main__, or a function
+SCENARIOS = {
+    "telp": _telp_sweep_point,
+    # Throughput of the teleport sweep per quantum state formalism
+    "telp_ket": functools.partial(_telp_sweep_point, "KET"),
+    "telp_dm": functools.partial(_telp_sweep_point, "DM"),
+    "telp_stab": functools.partial(_telp_sweep_point, "STAB"),
+    # Setup cost per point, rebuilding or reconfiguring the network
+    "telp_sweep_rebuild": functools.partial(_telp_many_points, False),
+    "telp_sweep_reuse": functools.partial(_telp_many_points, True),
+    # Gate by gate against fused state preparation and Bell measurement programs
+    "telp_gates": functools.partial(_telp_gates, False),
+    "telp_fused": functools.partial(_telp_gates, True),
+    "telp_pauli_frame": functools.partial(_telp_gates, False, True),
+    # Every lossy attempt simulated against skipping to the next heralded pair
+    "lossy_link_attempts": functools.partial(_lossy_link, False),
+    "lossy_link_skip_ahead": functools.partial(_lossy_link, True),
+    "quantum_teleportation": os.path.join(_HERE, "quantum_teleportation.py"),
+    "pingpong_entities": os.path.join(_HERE, "1entidadesPingPong.py"),
+    "pingpong_tutorial": os.path.join(_HERE, "pingpongtutorial.py"),
+    "tutorial2_events": os.path.join(_TUTORIALS, "2.tutorial-simulacao-eventos-discretos.py"),
+    "tutorial3_components": os.path.join(_TUTORIALS,
+                                         "3.tutorial-modelagem-componentes-rede.py"),
+}
+
+# Scenarios that only use the entity API and qubits, so they also run on lightsim
+LIGHT_SCENARIOS = ("pingpong_entities", "tutorial2_events")
+BACKENDS = ("netsquid", "light")
+
+def _peak_rss_kb():
+    try:
+        import resource
+    except ImportError:  # not available on Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def run_scenario(name, seed=42, backend="netsquid"):
+    """Run a single scenario in this process and measure it.
+
+    Parameters
+    ----------
+    name : str
+        Name of the scenario in :data:`SCENARIOS`.
+    seed : int, optional
+        Seed of the simulator and numpy random state.
+    backend : str, optional
+        Event kernel to run on, "netsquid" or "light". Only the scenarios in
+        :data:`LIGHT_SCENARIOS` run on the light kernel.
+
+    Returns
+    -------
+    dict
+        Measured ``wall_time`` [s], ``sim_time`` [ns], ``sim_time_per_wall_second``,
+        ``events``, ``events_per_wall_second`` and ``peak_rss_kb``.
+
+    """
+    if backend == "light":
+        if name not in LIGHT_SCENARIOS:
+            raise ValueError(f"Scenario {name} does not run on the light kernel")
+        import lightsim
+        with lightsim.install():
+            return _run_scenario(name, seed)
+    return _run_scenario(name, seed)
+
+
+def _run_scenario(name, seed):
+    import numpy as np
+    import netsquid as ns
+    scenario = SCENARIOS[name]
+    summaries = []
+    sim_run = ns.sim_run
+
+    def counting_sim_run(*args, **kwargs):
+        stats = sim_run(*args, **kwargs)
+        summaries.append(str(stats))
+        return stats
+
+    ns.sim_run = counting_sim_run
+    ns.sim_reset()
+    ns.set_random_state(seed=seed)
+    np.random.seed(seed)
+    start = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            if callable(scenario):
+                scenario()
+            else:
+                import runpy
+                sys.path.insert(0, os.path.dirname(scenario))
+                runpy.run_path(scenario, run_name="__main__")
+    finally:
+        wall_time = time.perf_counter() - start
+        ns.sim_run = sim_run
+    events, sim_time = summary_counts(summaries)
+    return {
+        "wall_time": wall_time,
+        "sim_time": sim_time,
+        "sim_time_per_wall_second": sim_time / wall_time if wall_time > 0 else None,
+        "events": events,
+        "events_per_wall_second": events / wall_time if wall_time > 0 else None,
+        "peak_rss_kb": _peak_rss_kb(),
+    }
+
+
+def run_benchmarks(names=None, repeat=3, seed=42, backend="netsquid"):
+    """Run scenarios, each repetition in a fresh interpreter.
+
+    Parameters
+    ----------
+    names : list of str or None, optional
+        Scenarios to run, all if None.
+    repeat : int, optional
+        Number of repetitions per scenario. The fastest repetition is reported.
+    seed : int, optional
+        Seed of every repetition.
+    backend : str, optional
+        Event kernel to run on, see :func:`run_scenario`.
+
+    Returns
+    -------
+    dict
+        Benchmark results with ``meta`` data and ``results`` per scenario.
+
+    """
+    results = {}
+    if not names:
+        names = list(LIGHT_SCENARIOS if backend == "light" else SCENARIOS)
+    for name in names:
+        runs = []
+        for _ in range(repeat):
+            completed = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "_worker", name, "--seed", str(seed),
+                 "--backend", backend],
+                cwd=_HERE, capture_output=True, text=True)
+            if completed.returncode != 0:
+                raise RuntimeError(f"Scenario {name} failed:\n{completed.stderr}")
+            runs.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+        best = min(runs, key=lambda run: run["wall_time"])
+        results[name] = dict(best, wall_times=[run["wall_time"] for run in runs])
+    return {
+        "meta": {"python": platform.python_version(), "platform": platform.platform(),
+                 "seed": seed, "repeat": repeat, "backend": backend,
+                 "date": time.strftime("%Y-%m-%dT%H:%M:%S")},
+        "results": results,
+    }
+
+
+def compare(baseline, current, threshold=0.1):
+    """Compare benchmark results against a baseline.
+
+    Parameters
+    ----------
+    baseline : dict
+        Results of :func:`run_benchmarks` to compare against.
+    current : dict
+        Results of :func:`run_benchmarks` to check.
+    threshold : float, optional
+        Relative increase of wall time or peak memory that counts as regression.
+
+    Returns
+    -------
+    list of dict
+        One entry per scenario present in both, with the relative changes and
+        a ``regression`` flag.
+
+    """
+    rows = []
+    for name, result in current["results"].items():
+        if name not in baseline["results"]:
+            continue
+        reference = baseline["results"][name]
+        row = {"scenario": name}
+        for key in ("wall_time", "peak_rss_kb"):
+            if reference.get(key) and result.get(key) is not None:
+                row[key] = result[key] / reference[key] - 1.
+            else:
+                row[key] = None
+        # A different number of events means the scenario itself changed
+        row["events_changed"] = result["events"] != reference["events"]
+        row["regression"] = any(row[key] is not None and row[key] > threshold
+                                for key in ("wall_time", "peak_rss_kb"))
+        rows.append(row)
+    return rows
+
+
+def _format_change(change):
+    return "n/a" if change is None else f"{100 * change:+.1f}%"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run", help="run scenarios and store the results")
+    run_parser.add_argument("scenarios", nargs="*",
+                            help=f"scenarios to run, from {', '.join(SCENARIOS)} (default: all)")
+    run_parser.add_argument("--output", "-o", default="bench_results.json")
+    run_parser.add_argument("--repeat", type=int, default=3)
+    run_parser.add_argument("--seed", type=int, default=42)
+    run_parser.add_argument("--backend", choices=BACKENDS, default="netsquid")
+    compare_parser = commands.add_parser("compare", help="flag regressions against a baseline")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.1)
+    worker_parser = commands.add_parser("_worker")
+    worker_parser.add_argument("scenario", choices=list(SCENARIOS))
+    worker_parser.add_argument("--seed", type=int, default=42)
+    worker_parser.add_argument("--backend", choices=BACKENDS, default="netsquid")
+    args = parser.parse_args(argv)
+
+    if args.command == "_worker":
+        print(json.dumps(run_scenario(args.scenario, seed=args.seed, backend=args.backend)))
+        return 0
+    if args.command == "run":
+        available = LIGHT_SCENARIOS if args.backend == "light" else SCENARIOS
+        unknown = set(args.scenarios) - set(available)
+        if unknown:
+            parser.error(f"unknown scenarios for the {args.backend} backend: "
+                         f"{', '.join(sorted(unknown))}")
+        results = run_benchmarks(args.scenarios, repeat=args.repeat, seed=args.seed,
+                                 backend=args.backend)
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+        for name, result in results["results"].items():
+            print(f"{name:25s} {result['wall_time']:9.4f} s {result['events']:10d} events "
+                  f"{result['events_per_wall_second'] or 0:12.4g} events/s "
+                  f"{result['sim_time_per_wall_second'] or 0:12.4g} ns/s "
+                  f"{result['peak_rss_kb'] or 0:9d} kB")
+        return 0
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+    with open(args.current) as file:
+        current = json.load(file)
+    rows = compare(baseline, current, threshold=args.threshold)
+    for row in rows:
+        flags = []
+        if row["regression"]:
+            flags.append("REGRESSION")
+        if row["events_changed"]:
+            flags.append("events changed")
+        print(f"{row['scenario']:25s} wall {_format_change(row['wall_time']):>8s} "
+              f"rss {_format_change(row['peak_rss_kb']):>8s} {' '.join(flags)}")
+    return 1 if any(row["regression"] for row in rows) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,169 @@
+"""Automatic choice of the quantum state formalism.
+
+Circuits of Clifford instructions acting on stabilizer states, with noise
+that only applies Pauli operators, never leave the set of stabilizer states.
+Such runs can be simulated in the stabilizer formalism (``QFormalism.STAB``,
+see tutorial 1), whose cost grows polynomially with the number of qubits,
+instead of the ket or density matrix formalisms.
+
+The teleportation programs of :mod:`telp` qualify: ``InitStateProgram``
+(INIT, H, S), ``BellMeasurementProgram`` (CNOT, H, MEASURE), Bob's X and Z
+corrections, the depolarizing memory and dephasing measurement noise, and the
+states b00 and y0.
+
+Example
+-------
+
+>>> from netsquid.qubits import ketstates as ks
+>>> from telp import InitStateProgram
+>>> instructions = program_instructions(InitStateProgram())
+>>> select_formalism(instructions, states=[ks.y0])  # doctest: +ELLIPSIS
+<QFormalism.STAB: ...>
+
+"""
+import itertools
+
+import numpy as np
+import netsquid as ns
+from netsquid.components import instructions as instr
+from netsquid.components.models.qerrormodels import DepolarNoiseModel, DephaseNoiseModel
+
+__all__ = [
+    "CLIFFORD_INSTRUCTIONS",
+    "PAULI_NOISE_MODELS",
+    "program_instructions",
+    "is_stabilizer_state",
+    "select_formalism",
+]
+
+# Instructions that map stabilizer states to stabilizer states
+CLIFFORD_INSTRUCTIONS = frozenset([
+    instr.INSTR_INIT,
+    instr.INSTR_I,
+    instr.INSTR_X,
+    instr.INSTR_Y,
+    instr.INSTR_Z,
+    instr.INSTR_H,
+    instr.INSTR_S,
+    instr.INSTR_CNOT,
+    instr.INSTR_CZ,
+    instr.INSTR_SWAP,
+    instr.INSTR_MEASURE,
+    instr.INSTR_DISCARD,
+])
+
+# Noise models that apply Pauli operators with some probability
+PAULI_NOISE_MODELS = (DepolarNoiseModel, DephaseNoiseModel)
+
+_PAULIS = [np.eye(2), np.array([[0, 1], [1, 0]]), np.array([[0, -1j], [1j, 0]]),
+           np.array([[1, 0], [0, -1]])]
+
+
+def program_instructions(program):
+    """Instructions a quantum program applies, without executing it.
+
+    The program is stepped through with ``apply`` and ``run`` replaced by a
+    recorder, so no processor is needed.
+
+    Parameters
+    ----------
+    program : :class:`~netsquid.components.qprogram.QuantumProgram`
+        A fresh program instance. It is not usable for execution afterwards.
+
+    Returns
+    -------
+    list of :class:`~netsquid.components.instructions.Instruction` or None
+        Instructions in the order they are applied, or None if the program
+        could not be stepped through, e.g. because it branches on its outputs.
+
+    """
+    instructions = []
+
+    def record(instruction, *args, **kwargs):
+        instructions.append(instruction)
+
+    program.apply = record
+    program.run = lambda *args, **kwargs: None
+    try:
+        for _ in program.program():
+            pass
+    except Exception:
+        return None
+    return instructions
+
+
+def is_stabilizer_state(ket, atol=1e-8):
+    """Whether a pure state is a stabilizer state.
+
+    A state of ``n`` qubits is a stabilizer state if and only if ``2 ** n``
+    Pauli operators have it as eigenvector. All ``4 ** n`` Pauli operators are
+    tried, so this is meant for the few-qubit states sources emit.
+
+    Parameters
+    ----------
+    ket : array_like
+        State vector of length ``2 ** n``.
+    atol : float, optional
+        Absolute tolerance on the expectation values.
+
+    Returns
+    -------
+    bool
+        Whether the state is a stabilizer state.
+
+    >>> is_stabilizer_state(np.array([1, 1j]) / np.sqrt(2))
+    True
+    >>> is_stabilizer_state(np.array([1, np.exp(0.25j * np.pi)]) / np.sqrt(2))
+    False
+
+    """
+    ket = np.asarray(ket, dtype=complex).ravel()
+    num_qubits = int(round(np.log2(len(ket))))
+    if 2 ** num_qubits != len(ket):
+        raise ValueError("Length of ket must be a power of 2")
+    ket = ket / np.linalg.norm(ket)
+    stabilizers = 0
+    for paulis in itertools.product(_PAULIS, repeat=num_qubits):
+        operator = np.ones((1, 1))
+        for pauli in paulis:
+            operator = np.kron(operator, pauli)
+        if abs(abs(np.vdot(ket, operator @ ket)) - 1.) < atol:
+            stabilizers += 1
+    return stabilizers == 2 ** num_qubits
+
+
+def select_formalism(instructions, noise_models=(), states=(), default=None):
+    """Choose the stabilizer formalism if the simulation allows it.
+
+    Parameters
+    ----------
+    instructions : iterable of :class:`~netsquid.components.instructions.Instruction`
+        All instructions that are applied, see :func:`program_instructions`.
+        None entries mark unknown instructions.
+    noise_models : iterable of :class:`~netsquid.components.models.qerrormodels.QuantumErrorModel`
+        All noise models of memories, instructions and channels. None entries
+        are ignored.
+    states : iterable of array_like
+        State vectors qubits are created in, e.g. by sources.
+    default : :class:`~netsquid.qubits.qformalism.QFormalism` or None, optional
+        Formalism to use if the stabilizer formalism can not be used.
+        Defaults to the current formalism.
+
+    Returns
+    -------
+    :class:`~netsquid.qubits.qformalism.QFormalism`
+        ``QFormalism.STAB`` if all instructions are Clifford, all noise models
+        apply Pauli operators and all states are stabilizer states,
+        ``default`` otherwise.
+
+    """
+    if default is None:
+        default = ns.get_qstate_formalism()
+    if not all(instruction in CLIFFORD_INSTRUCTIONS for instruction in instructions):
+        return default
+    if not all(model is None or isinstance(model, PAULI_NOISE_MODELS)
+               for model in noise_models):
+        return default
+    if not all(is_stabilizer_state(state) for state in states):
+        return default
+    return ns.QFormalism.STAB
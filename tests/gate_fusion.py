@@ -0,0 +1,352 @@
+"""Gate fusion of quantum program instruction sequences.
+
+Programs like ``InitStateProgram`` (INIT, H, S) and ``BellMeasurementProgram``
+(CNOT, H, MEASURE, MEASURE) of :mod:`telp` apply one gate per instruction, so
+every teleport manipulates the quantum state once per gate. This module
+compiles a program once per class: runs of consecutive unitaries are merged
+into a single precomputed operator, applied with one instruction that takes
+the summed duration of the gates it replaces.
+
+Fusion respects noise boundaries:
+
+* non-unitary instructions (INIT, MEASURE, ...) and instructions with a
+  quantum noise model attached are never fused;
+* memory noise is applied by the processor between gates. Depolarizing noise
+  commutes with any unitary on the single qubit it acts on, so with it a run
+  can only grow by single-qubit gates after its first gate. With any other
+  memory noise nothing is fused.
+
+Example
+-------
+
+>>> import numpy as np
+>>> H = np.array([[1, 1], [1, -1]]) / np.sqrt(2)
+>>> S = np.diag([1, 1j])
+>>> CNOT = np.array([[1, 0, 0, 0], [0, 1, 0, 0], [0, 0, 0, 1], [0, 0, 1, 0]])
+>>> operations = [Operation("INIT", (0,), duration=3), Operation("H", (0,), H, 1),
+...               Operation("S", (0,), S, 1)]
+>>> [(op.name, op.duration) for op in fuse_operations(operations)]
+[('INIT', 3), ('H*S', 2)]
+>>> operations = [Operation("CNOT", (0, 1), CNOT, 4), Operation("H", (0,), H, 1),
+...               Operation("MEASURE", (0,), duration=7, noisy=True)]
+>>> fused = fuse_operations(operations)
+>>> [op.name for op in fused], fused[0].positions
+(['CNOT*H', 'MEASURE'], (0, 1))
+>>> [op.name for op in fuse_operations(operations, memory_noise="other")]
+['CNOT', 'H', 'MEASURE']
+
+"""
+from collections import namedtuple
+
+import numpy as np
+
+__all__ = [
+    "Operation",
+    "fuse_operations",
+    "unitary_segments",
+    "CompiledProgram",
+    "compile_program",
+]
+
+#: Instruction of a program: ``matrix`` is None for non-unitary instructions,
+#: ``parts`` the names of the gates a fused operation replaces.
+Operation = namedtuple("Operation", ["name", "positions", "matrix", "duration", "noisy",
+                                     "kwargs", "instruction", "parts"],
+                       defaults=[None, 0, False, None, None, None])
+
+MEMORY_NOISE_KINDS = ("none", "depolar", "other")
+
+# Compiled programs per program class and processor configuration
+_CACHE = {}
+
+
+def _embed(matrix, positions, support):
+    # Matrix of a gate on positions, as operator on all qubits of the support,
+    # the first support qubit being the most significant
+    num = len(support)
+    k = len(positions)
+    axes = [support.index(position) for position in positions]
+    tensor = np.asarray(matrix, dtype=complex).reshape((2,) * (2 * k))
+    identity = np.eye(2 ** num, dtype=complex).reshape((2,) * (2 * num))
+    result = np.tensordot(tensor, identity, axes=(list(range(k, 2 * k)), axes))
+    result = np.moveaxis(result, list(range(k)), axes)
+    return result.reshape(2 ** num, 2 ** num)
+
+
+def _fusable(run, op, memory_noise, max_qubits):
+    if op.matrix is None or op.noisy or memory_noise == "other":
+        return False
+    support = set(run[0].positions).union(*(other.positions for other in run[1:]))
+    if len(support | set(op.positions)) > max_qubits:
+        return False
+    # Noise gathered before this gate only commutes with it on a single qubit
+    return memory_noise == "none" or len(op.positions) == 1
+
+
+def _merge(run):
+    # One operation applying the gates of a run in order
+    if len(run) == 1:
+        return run[0]
+    support = []
+    for op in run:
+        support.extend(position for position in op.positions if position not in support)
+    matrix = np.eye(2 ** len(support), dtype=complex)
+    for op in run:
+        matrix = _embed(op.matrix, op.positions, support) @ matrix
+    parts = tuple(name for op in run for name in (op.parts or (op.name,)))
+    return Operation("*".join(parts), tuple(support), matrix,
+                     sum(op.duration for op in run), False, {}, None, parts)
+
+
+def fuse_operations(operations, memory_noise="depolar", max_qubits=2):
+    """Merge runs of consecutive unitaries into single operations.
+
+    Parameters
+    ----------
+    operations : list of :class:`Operation`
+        Instructions in the order they are applied.
+    memory_noise : str, optional
+        Memory noise of the qubits, one of :data:`MEMORY_NOISE_KINDS`.
+    max_qubits : int, optional
+        Maximum number of qubits of a fused operation.
+
+    Returns
+    -------
+    list of :class:`Operation`
+        Operations with the same effect and total duration.
+
+    """
+    if memory_noise not in MEMORY_NOISE_KINDS:
+        raise ValueError(f"Unknown memory noise {memory_noise!r}, "
+                         f"expected one of {MEMORY_NOISE_KINDS}")
+    fused = []
+    run = []
+    for op in operations:
+        if run and _fusable(run, op, memory_noise, max_qubits):
+            run.append(op)
+            continue
+        if run:
+            fused.append(_merge(run))
+        if op.matrix is not None and not op.noisy:
+            run = [op]
+        else:
+            run = []
+            fused.append(op)
+    if run:
+        fused.append(_merge(run))
+    return fused
+
+
+def unitary_segments(operations):
+    """Overall unitary of every run of unitaries between non-unitary operations.
+
+    Used to verify a fused program against its original.
+
+    Parameters
+    ----------
+    operations : list of :class:`Operation`
+        Instructions in the order they are applied.
+
+    Returns
+    -------
+    list of tuple of (tuple, :class:`numpy.ndarray`)
+        Qubits and unitary of every segment, qubits in increasing order.
+
+    """
+    segments = []
+    current = []
+
+    def close():
+        if current:
+            support = sorted(set().union(*(op.positions for op in current)))
+            matrix = np.eye(2 ** len(support), dtype=complex)
+            for op in current:
+                matrix = _embed(op.matrix, op.positions, support) @ matrix
+            segments.append((tuple(support), matrix))
+            current.clear()
+
+    for op in operations:
+        if op.matrix is None:
+            close()
+        else:
+            current.append(op)
+    close()
+    return segments
+
+
+def _gate_matrices():
+    # Matrices of the standard gate instructions
+    import netsquid as ns
+    from netsquid.components import instructions as instr
+    return {instr.INSTR_I: ns.I.arr, instr.INSTR_X: ns.X.arr, instr.INSTR_Y: ns.Y.arr,
+            instr.INSTR_Z: ns.Z.arr, instr.INSTR_H: ns.H.arr, instr.INSTR_S: ns.S.arr,
+            instr.INSTR_T: ns.T.arr, instr.INSTR_CNOT: ns.CNOT.arr, instr.INSTR_CZ: ns.CZ.arr}
+
+
+def _record(program):
+    # (instruction, positions, kwargs) of every apply, and None for every run
+    calls = []
+
+    def apply(instruction, qubit_indices=None, **kwargs):
+        if isinstance(qubit_indices, int):
+            qubit_indices = [qubit_indices]
+        calls.append((instruction, tuple(qubit_indices or ()), kwargs))
+
+    def run(*args, **kwargs):
+        calls.append(None)
+
+    program.apply = apply
+    program.run = run
+    for _ in program.program():
+        pass
+    return calls
+
+
+class CompiledProgram:
+    """A quantum program class compiled with gate fusion.
+
+    Created by :func:`compile_program`.
+
+    Attributes
+    ----------
+    program_class : type
+        The original program class.
+    original : list of list of :class:`Operation`
+        Operations of every ``run`` of the original program.
+    fused : list of list of :class:`Operation`
+        Operations of every ``run`` after fusion.
+
+    """
+
+    def __init__(self, program_class, original, fused):
+        self.program_class = program_class
+        self.original = original
+        self.fused = fused
+
+    @property
+    def num_applications(self):
+        """tuple of int: Instructions applied by the original and the fused program."""
+        return (sum(len(ops) for ops in self.original), sum(len(ops) for ops in self.fused))
+
+    def physical_instructions(self):
+        """Physical instructions a processor needs for the fused operations.
+
+        Returns
+        -------
+        list of :class:`~netsquid.components.qprocessor.PhysicalInstruction`
+            One per fused operation, with the summed duration of its gates.
+
+        """
+        from netsquid.components.qprocessor import PhysicalInstruction
+        return [PhysicalInstruction(op.instruction, duration=op.duration, parallel=True)
+                for ops in self.fused for op in ops if op.parts is not None]
+
+    def program(self, **kwargs):
+        """New instance of the fused program.
+
+        Parameters
+        ----------
+        **kwargs
+            Arguments of :class:`~netsquid.components.qprogram.QuantumProgram`.
+
+        Returns
+        -------
+        :class:`~netsquid.components.qprogram.QuantumProgram`
+            Program applying the fused operations.
+
+        """
+        from netsquid.components.qprogram import QuantumProgram
+        compiled = self
+
+        class FusedProgram(QuantumProgram):
+            default_num_qubits = self.program_class.default_num_qubits
+
+            def program(self):
+                indices = self.get_qubit_indices(self.default_num_qubits)
+                for ops in compiled.fused:
+                    for op in ops:
+                        self.apply(op.instruction, [indices[position] for position in op.positions],
+                                   **op.kwargs)
+                    yield self.run()
+
+        FusedProgram.__name__ = f"Fused{self.program_class.__name__}"
+        return FusedProgram(**kwargs)
+
+    def report(self):
+        """Original and fused instruction sequences, with the fused unitaries verified.
+
+        Returns
+        -------
+        str
+            One line per sequence and whether every unitary segment of the
+            fused program equals the original's.
+
+        """
+        def describe(ops):
+            return " ".join(f"{op.name}{list(op.positions)}" for op in ops)
+
+        original = [op for ops in self.original for op in ops]
+        fused = [op for ops in self.fused for op in ops]
+        matches = all(
+            support == fused_support and np.allclose(matrix, fused_matrix)
+            for (support, matrix), (fused_support, fused_matrix)
+            in zip(unitary_segments(original), unitary_segments(fused)))
+        return "\n".join([f"{self.program_class.__name__}",
+                          f"  original ({len(original)}): {describe(original)}",
+                          f"  fused    ({len(fused)}): {describe(fused)}",
+                          f"  unitaries match: {matches}"])
+
+
+def compile_program(program_class, durations, noisy_instructions=(), memory_noise="depolar",
+                    max_qubits=2):
+    """Compile a quantum program class with gate fusion, cached per class and configuration.
+
+    Parameters
+    ----------
+    program_class : type
+        :class:`~netsquid.components.qprogram.QuantumProgram` subclass whose
+        ``program`` does not branch on measurement outcomes.
+    durations : dict
+        Duration of every instruction on the processor [ns].
+    noisy_instructions : iterable, optional
+        Instructions with a quantum noise model attached, never fused.
+    memory_noise : str, optional
+        Memory noise of the processor, one of :data:`MEMORY_NOISE_KINDS`.
+    max_qubits : int, optional
+        Maximum number of qubits of a fused operation.
+
+    Returns
+    -------
+    :class:`CompiledProgram`
+        The compiled program, the same instance for the same arguments, so
+        processors and protocols share its fused instructions.
+
+    """
+    key = (program_class, frozenset(durations.items()),
+           frozenset(noisy_instructions), memory_noise, max_qubits)
+    try:
+        return _CACHE[key]
+    except KeyError:
+        pass
+    from netsquid.components import instructions as instr
+    from netsquid.qubits.operators import Operator
+    matrices = _gate_matrices()
+    noisy_instructions = set(noisy_instructions)
+    original = [[]]
+    for call in _record(program_class()):
+        if call is None:
+            original.append([])
+            continue
+        instruction, positions, kwargs = call
+        original[-1].append(Operation(instruction.name, positions, matrices.get(instruction),
+                                      durations.get(instruction, 0),
+                                      instruction in noisy_instructions, kwargs, instruction))
+    # Operations after the last run are never executed
+    original.pop()
+    fused = []
+    for ops in original:
+        fused.append([op if op.parts is None else
+                      op._replace(instruction=instr.IGate(op.name, Operator(op.name, op.matrix)))
+                      for op in fuse_operations(ops, memory_noise, max_qubits)])
+    compiled = _CACHE[key] = CompiledProgram(program_class, original, fused)
+    return compiled
@@ -0,0 +1,209 @@
+"""Opt-in profiling of pydynaa entity event handlers.
+
+While enabled, every :class:`pydynaa.EventHandler` and
+:class:`pydynaa.ExpressionHandler` created gets its callback wrapped to record
+call counts and wall time, and the entity owning the callback gets its
+``_schedule_*`` methods wrapped to count the events it schedules per event type.
+Nothing is patched while the profiler is disabled, so it costs nothing then.
+
+Handlers are wrapped when they are created, so the profiler has to be enabled
+before the entities are set up.
+
+Example
+-------
+
+>>> profiler = HandlerProfiler()
+>>> with profiler:  # doctest: +SKIP
+...     setup_network(Adauto(estado_inicial=ns.h1), Junior(), Eduardo())
+...     ns.sim_run(end_time=100)
+>>> print(profiler.report())  # doctest: +SKIP
+
+or, for a script::
+
+    python handler_profiling.py quantum_teleportation.py
+
+"""
+import sys
+import time
+
+import pydynaa
+
+__all__ = [
+    "HandlerProfiler",
+    "profile_script",
+]
+
+_SCHEDULE_METHODS = {
+    # method name: position of the event type argument
+    "_schedule_now": 0,
+    "_schedule_after": 1,
+    "_schedule_at": 1,
+}
+
+
+class HandlerProfiler:
+    """Records call counts and wall time of entity event handler callbacks.
+
+    Parameters
+    ----------
+    report_after_run : bool, optional
+        Whether to print the report every time ``ns.sim_run`` returns.
+
+    """
+
+    def __init__(self, report_after_run=False):
+        self.report_after_run = report_after_run
+        # (entity type, callback name) -> [calls, cumulative wall time]
+        self.handler_stats = {}
+        # (entity type, event type name) -> scheduled events
+        self.scheduled = {}
+        self._originals = None
+
+    @property
+    def enabled(self):
+        """bool: Whether the profiler is currently enabled."""
+        return self._originals is not None
+
+    def enable(self):
+        """Start wrapping newly created event handlers."""
+        if self.enabled:
+            return
+        import netsquid as ns
+        self._originals = {"EventHandler": pydynaa.EventHandler,
+                           "ExpressionHandler": pydynaa.ExpressionHandler,
+                           "sim_run": ns.sim_run}
+        pydynaa.EventHandler = self._handler_factory(pydynaa.EventHandler)
+        pydynaa.ExpressionHandler = self._handler_factory(pydynaa.ExpressionHandler)
+        if self.report_after_run:
+            sim_run = ns.sim_run
+
+            def reporting_sim_run(*args, **kwargs):
+                stats = sim_run(*args, **kwargs)
+                print(self.report())
+                return stats
+
+            ns.sim_run = reporting_sim_run
+
+    def disable(self):
+        """Stop wrapping event handlers. Handlers created meanwhile stay wrapped."""
+        if not self.enabled:
+            return
+        import netsquid as ns
+        pydynaa.EventHandler = self._originals["EventHandler"]
+        pydynaa.ExpressionHandler = self._originals["ExpressionHandler"]
+        ns.sim_run = self._originals["sim_run"]
+        self._originals = None
+
+    def __enter__(self):
+        self.enable()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.disable()
+
+    def reset(self):
+        """Forget all recorded statistics."""
+        self.handler_stats.clear()
+        self.scheduled.clear()
+
+    def _handler_factory(self, handler_class):
+        def create_handler(callback, *args, **kwargs):
+            return handler_class(self._wrap_callback(callback), *args, **kwargs)
+
+        return create_handler
+
+    def _wrap_callback(self, callback):
+        entity = getattr(callback, "__self__", None)
+        if isinstance(entity, pydynaa.Entity):
+            self._instrument_entity(entity)
+        key = (type(entity).__name__ if entity is not None else "<function>",
+               getattr(callback, "__name__", repr(callback)))
+        stats = self.handler_stats.setdefault(key, [0, 0.])
+        perf_counter = time.perf_counter
+
+        def timed_callback(argument):
+            start = perf_counter()
+            try:
+                return callback(argument)
+            finally:
+                stats[0] += 1
+                stats[1] += perf_counter() - start
+
+        return timed_callback
+
+    def _instrument_entity(self, entity):
+        attributes = getattr(entity, "__dict__", None)
+        if attributes is None or attributes.get("_handler_profiler") is self:
+            # Entities without instance attributes can not be instrumented
+            return
+        attributes["_handler_profiler"] = self
+        entity_name = type(entity).__name__
+        for method_name, type_position in _SCHEDULE_METHODS.items():
+            setattr(entity, method_name,
+                    self._counting_schedule(getattr(entity, method_name), entity_name,
+                                            type_position))
+
+    def _counting_schedule(self, schedule, entity_name, type_position):
+        def counting_schedule(*args, **kwargs):
+            event_type = kwargs.get("event_type", args[type_position]
+                                    if len(args) > type_position else None)
+            key = (entity_name, getattr(event_type, "name", str(event_type)))
+            self.scheduled[key] = self.scheduled.get(key, 0) + 1
+            return schedule(*args, **kwargs)
+
+        return counting_schedule
+
+    def report(self):
+        """Report of the recorded statistics.
+
+        Returns
+        -------
+        str
+            Handlers sorted by cumulative wall time, followed by the number of
+            scheduled events per entity and event type.
+
+        """
+        lines = [f"{'entity':20s} {'handler':30s} {'calls':>8s} {'cumulative [s]':>15s} "
+                 f"{'per call [us]':>14s}"]
+        for (entity, handler), (calls, cumulative) in sorted(
+                self.handler_stats.items(), key=lambda item: item[1][1], reverse=True):
+            per_call = 1e6 * cumulative / calls if calls else 0.
+            lines.append(f"{entity:20s} {handler:30s} {calls:8d} {cumulative:15.6f} "
+                         f"{per_call:14.2f}")
+        lines.append("")
+        lines.append(f"{'entity':20s} {'event type':30s} {'scheduled':>9s}")
+        for (entity, event_type), count in sorted(self.scheduled.items(),
+                                                  key=lambda item: item[1], reverse=True):
+            lines.append(f"{entity:20s} {event_type:30s} {count:9d}")
+        return "\n".join(lines)
+
+
+def profile_script(path, report_after_run=True):
+    """Run a script with handler profiling enabled.
+
+    Parameters
+    ----------
+    path : str
+        Path of the script.
+    report_after_run : bool, optional
+        Whether to print the report every time ``ns.sim_run`` returns.
+
+    Returns
+    -------
+    :class:`HandlerProfiler`
+        The profiler with the statistics of the run.
+
+    """
+    import os
+    import runpy
+    profiler = HandlerProfiler(report_after_run=report_after_run)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(path)))
+    with profiler:
+        runpy.run_path(path, run_name="__main__")
+    return profiler
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2:
+        sys.exit(f"usage: {sys.argv[0]} SCRIPT")
+    profile_script(sys.argv[1])
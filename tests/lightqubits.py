@@ -0,0 +1,341 @@
+"""Minimal NumPy stand-in for the ``netsquid.qubits`` API of the entity scripts.
+
+Covers what tutorial 2 and the ping pong scripts use next to the event
+kernel of :mod:`lightsim`: creating qubits, applying operators, measuring in
+the eigenbasis of an observable, assigning states, (time dependent)
+depolarizing noise and fidelities. Every shared quantum state is kept as a
+density matrix, whatever formalism is set, so ket and density matrix runs
+give the same statistics.
+
+Example
+-------
+
+>>> set_random_state(seed=42)
+>>> q1, q2 = create_qubits(2)
+>>> operate(q1, H)
+>>> operate([q1, q2], CNOT)
+>>> print(f"{fidelity([q1, q2], b00, squared=True):.3f}")
+1.000
+
+"""
+import enum
+
+import numpy as np
+
+__all__ = [
+    "QFormalism",
+    "Operator",
+    "Qubit",
+    "I", "X", "Y", "Z", "H", "S", "T", "CNOT", "CZ",
+    "s0", "s1", "h0", "h1", "y0", "y1", "b00", "b01", "b10", "b11",
+    "set_random_state",
+    "get_random_state",
+    "set_qstate_formalism",
+    "get_qstate_formalism",
+    "create_qubits",
+    "assign_qstate",
+    "operate",
+    "measure",
+    "reduced_dm",
+    "fidelity",
+    "depolarize",
+    "delay_depolarize",
+    "discard",
+]
+
+
+class QFormalism(enum.Enum):
+    """Quantum state formalisms. The shim always uses density matrices."""
+    KET = 0
+    DM = 1
+    STAB = 2
+    GSLC = 3
+
+
+class Operator:
+    """Named operator on one or more qubits.
+
+    Parameters
+    ----------
+    name : str
+        Name of the operator.
+    matrix : array_like
+        Matrix of the operator.
+
+    """
+
+    __slots__ = ("name", "arr", "num_qubits")
+
+    def __init__(self, name, matrix):
+        self.name = name
+        self.arr = np.asarray(matrix, dtype=complex)
+        self.num_qubits = int(np.log2(self.arr.shape[0]))
+
+    def __repr__(self):
+        return f"Operator({self.name!r})"
+
+
+I = Operator("I", np.eye(2))
+X = Operator("X", [[0, 1], [1, 0]])
+Y = Operator("Y", [[0, -1j], [1j, 0]])
+Z = Operator("Z", [[1, 0], [0, -1]])
+H = Operator("H", np.array([[1, 1], [1, -1]]) / np.sqrt(2))
+S = Operator("S", [[1, 0], [0, 1j]])
+T = Operator("T", [[1, 0], [0, np.exp(0.25j * np.pi)]])
+CNOT = Operator("CNOT", [[1, 0, 0, 0], [0, 1, 0, 0], [0, 0, 0, 1], [0, 0, 1, 0]])
+CZ = Operator("CZ", np.diag([1, 1, 1, -1]))
+
+s0 = np.array([[1], [0]], dtype=complex)
+s1 = np.array([[0], [1]], dtype=complex)
+h0 = (s0 + s1) / np.sqrt(2)
+h1 = (s0 - s1) / np.sqrt(2)
+y0 = (s0 + 1j * s1) / np.sqrt(2)
+y1 = (s0 - 1j * s1) / np.sqrt(2)
+b00 = np.array([[1], [0], [0], [1]], dtype=complex) / np.sqrt(2)
+b01 = np.array([[0], [1], [1], [0]], dtype=complex) / np.sqrt(2)
+b10 = np.array([[1], [0], [0], [-1]], dtype=complex) / np.sqrt(2)
+b11 = np.array([[0], [1], [-1], [0]], dtype=complex) / np.sqrt(2)
+
+_random_state = np.random.RandomState()
+_formalism = QFormalism.KET
+
+
+def set_random_state(seed=None, rng=None):
+    """Seed the random state of measurements and noise."""
+    global _random_state
+    _random_state = rng if rng is not None else np.random.RandomState(seed)
+
+
+def get_random_state():
+    """:class:`numpy.random.RandomState`: Random state of measurements and noise."""
+    return _random_state
+
+
+def set_qstate_formalism(formalism):
+    """Record the formalism. States are kept as density matrices regardless."""
+    global _formalism
+    _formalism = formalism
+
+
+def get_qstate_formalism():
+    """:class:`QFormalism`: The formalism last set."""
+    return _formalism
+
+
+class _QState:
+    # Density matrix shared by the qubits in it, the first qubit being the
+    # most significant
+    __slots__ = ("dm", "qubits")
+
+    def __init__(self, dm, qubits):
+        self.dm = dm
+        self.qubits = qubits
+
+    @property
+    def num_qubits(self):
+        return len(self.qubits)
+
+
+class Qubit:
+    """Qubit, sharing a quantum state with the qubits it interacted with.
+
+    Parameters
+    ----------
+    name : str
+        Name of the qubit.
+
+    """
+
+    __slots__ = ("name", "qstate")
+
+    def __init__(self, name):
+        self.name = name
+        self.qstate = None
+
+    def __repr__(self):
+        return f"Qubit({self.name!r})"
+
+
+def _as_list(qubits):
+    return [qubits] if isinstance(qubits, Qubit) else list(qubits)
+
+
+def _apply(dm, num_qubits, positions, operator):
+    # operator @ dm @ operator^dagger on the given positions of the state
+    k = len(positions)
+    tensor = dm.reshape((2,) * (2 * num_qubits))
+    gate = operator.reshape((2,) * (2 * k))
+    tensor = np.tensordot(gate, tensor, axes=(list(range(k, 2 * k)), positions))
+    tensor = np.moveaxis(tensor, list(range(k)), positions)
+    columns = [num_qubits + position for position in positions]
+    tensor = np.tensordot(tensor, gate.conj(), axes=(columns, list(range(k, 2 * k))))
+    tensor = np.moveaxis(tensor, list(range(2 * num_qubits - k, 2 * num_qubits)), columns)
+    return tensor.reshape(dm.shape)
+
+
+def _trace_out(qstate, positions):
+    # Density matrix of the qubits at the positions not given
+    num_qubits = qstate.num_qubits
+    keep = [position for position in range(num_qubits) if position not in positions]
+    tensor = qstate.dm.reshape((2,) * (2 * num_qubits))
+    letters = "abcdefghijklmnopqrstuvwxyz"[:num_qubits]
+    rows = "".join(letters[position] for position in keep)
+    columns = "".join(letters[position].upper() for position in keep)
+    column_letters = "".join(letter if position in positions else letter.upper()
+                             for position, letter in enumerate(letters))
+    dim = 2 ** len(keep)
+    return np.einsum(f"{letters}{column_letters}->{rows}{columns}",
+                     tensor).reshape(dim, dim)
+
+
+def _remove(qubits):
+    # Take qubits out of their states, tracing them out of the remaining qubits
+    for qubit in qubits:
+        qstate = qubit.qstate
+        if qstate is None:
+            continue
+        position = qstate.qubits.index(qubit)
+        if qstate.num_qubits > 1:
+            qstate.dm = _trace_out(qstate, [position])
+            qstate.qubits = qstate.qubits[:position] + qstate.qubits[position + 1:]
+        qubit.qstate = None
+
+
+def _merge(qubits):
+    # Combine the states of the qubits into one and return it
+    states = []
+    for qubit in qubits:
+        if qubit.qstate is None:
+            raise ValueError(f"{qubit} has no quantum state")
+        if all(qubit.qstate is not state for state in states):
+            states.append(qubit.qstate)
+    if len(states) == 1:
+        return states[0]
+    dm = states[0].dm
+    members = list(states[0].qubits)
+    for state in states[1:]:
+        dm = np.kron(dm, state.dm)
+        members.extend(state.qubits)
+    merged = _QState(dm, members)
+    for qubit in members:
+        qubit.qstate = merged
+    return merged
+
+
+def create_qubits(num_qubits, system_name="QS", no_state=False):
+    """Create qubits, each in its own ``|0>`` state unless ``no_state`` is set.
+
+    Returns
+    -------
+    list of :class:`Qubit`
+        The qubits.
+
+    """
+    qubits = [Qubit(f"{system_name}#{index}-0") for index in range(num_qubits)]
+    if not no_state:
+        for qubit in qubits:
+            qubit.qstate = _QState(np.array([[1, 0], [0, 0]], dtype=complex), [qubit])
+    return qubits
+
+
+def assign_qstate(qubits, qrepr, formalism=None):
+    """Assign a ket or density matrix to qubits, taking them out of their states."""
+    qubits = _as_list(qubits)
+    _remove(qubits)
+    qrepr = np.asarray(qrepr, dtype=complex)
+    dm = qrepr if qrepr.ndim == 2 and qrepr.shape[0] == qrepr.shape[1] > 1 else None
+    if dm is None:
+        ket = qrepr.reshape(-1, 1)
+        dm = ket @ ket.conj().T
+    qstate = _QState(dm, qubits)
+    for qubit in qubits:
+        qubit.qstate = qstate
+
+
+def operate(qubits, operator):
+    """Apply an operator to qubits, in the order of the operator's qubits."""
+    qubits = _as_list(qubits)
+    qstate = _merge(qubits)
+    positions = [qstate.qubits.index(qubit) for qubit in qubits]
+    qstate.dm = _apply(qstate.dm, qstate.num_qubits, positions, operator.arr)
+
+
+def measure(qubit, observable=Z, discard=False):
+    """Measure a qubit in the eigenbasis of an observable.
+
+    Returns
+    -------
+    int
+        Outcome, 0 for the larger eigenvalue.
+    float
+        Probability of the outcome.
+
+    """
+    qstate = _merge([qubit])
+    position = qstate.qubits.index(qubit)
+    eigenvalues, eigenvectors = np.linalg.eigh(observable.arr)
+    eigenvectors = eigenvectors[:, np.argsort(eigenvalues)[::-1]]
+    rest = qstate.num_qubits - 1
+    probabilities = []
+    for outcome in range(2):
+        vector = eigenvectors[:, outcome:outcome + 1]
+        projector = vector @ vector.conj().T
+        projected = _apply(qstate.dm, qstate.num_qubits, [position], projector)
+        probabilities.append((max(float(np.real(np.trace(projected))), 0.), vector, projected))
+    total = probabilities[0][0] + probabilities[1][0]
+    outcome = int(_random_state.random_sample() * total >= probabilities[0][0])
+    prob, vector, projected = probabilities[outcome]
+    qstate.dm = projected / prob
+    # The measured qubit is left in the eigenstate, split off from the others
+    if rest:
+        qstate.dm = _trace_out(qstate, [position])
+        qstate.qubits = qstate.qubits[:position] + qstate.qubits[position + 1:]
+        qubit.qstate = None
+        if not discard:
+            assign_qstate([qubit], vector)
+    elif discard:
+        qubit.qstate = None
+    else:
+        qstate.dm = vector @ vector.conj().T
+    return outcome, prob / total
+
+
+def reduced_dm(qubits):
+    """Density matrix of qubits, tracing out the qubits they share a state with."""
+    qubits = _as_list(qubits)
+    qstate = _merge(qubits)
+    positions = [qstate.qubits.index(qubit) for qubit in qubits]
+    others = [position for position in range(qstate.num_qubits) if position not in positions]
+    dm = _trace_out(qstate, others) if others else qstate.dm
+    # Order the remaining qubits as requested
+    order = np.argsort(np.argsort(positions))
+    num = len(qubits)
+    tensor = dm.reshape((2,) * (2 * num))
+    tensor = np.transpose(tensor, list(order) + [num + index for index in order])
+    return tensor.reshape(dm.shape)
+
+
+def fidelity(qubits, reference_state, squared=False):
+    """Fidelity of qubits with a pure reference ket."""
+    ket = np.asarray(reference_state, dtype=complex).reshape(-1, 1)
+    value = float(np.real((ket.conj().T @ reduced_dm(qubits) @ ket)[0, 0]))
+    return value if squared else np.sqrt(max(value, 0.))
+
+
+def depolarize(qubit, prob=1.):
+    """Replace a qubit by the maximally mixed state with probability ``prob``."""
+    qstate = _merge([qubit])
+    position = qstate.qubits.index(qubit)
+    mixed = sum(_apply(qstate.dm, qstate.num_qubits, [position], pauli.arr)
+                for pauli in (I, X, Y, Z)) / 4
+    qstate.dm = (1. - prob) * qstate.dm + prob * mixed
+
+
+def delay_depolarize(qubit, depolar_rate, delay):
+    """Depolarize a qubit for having waited ``delay`` [ns] at ``depolar_rate`` [Hz]."""
+    depolarize(qubit, prob=1. - np.exp(-delay * 1e-9 * depolar_rate))
+
+
+def discard(qubit):
+    """Take a qubit out of its state."""
+    _remove([qubit])
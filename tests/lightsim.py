@@ -0,0 +1,462 @@
+"""Lightweight discrete event kernel with the entity API of pydynaa.
+
+Implements the subset of pydynaa the pure entity scenarios use (tutorial 2
+and 1entidadesPingPong.py). Scripts built on components, nodes or protocols,
+such as pingpongtutorial.py with its ``netsquid.nodes`` and
+``netsquid.protocols`` imports, still need netsquid:
+
+* :class:`Entity` with ``_schedule_now``, ``_schedule_after``,
+  ``_schedule_at``, ``_wait``, ``_wait_once`` and ``_dismiss``;
+* :class:`EventType`, :class:`EventHandler` and :class:`ExpressionHandler`;
+* :class:`EventExpression`, combined with ``&`` and ``|``, with
+  ``first_term``, ``second_term``, ``atomic_source``, ``triggered_time``,
+  ``triggered_events`` and ``value``;
+* :func:`sim_run`, :func:`sim_reset` and :func:`sim_time`.
+
+Scheduled events are kept in a binary heap of ``(time, sequence, event)``
+tuples, so events at the same time trigger in the order they were scheduled,
+and handlers are looked up in a dict keyed by source and event type.
+
+With :func:`install` the kernel stands in for ``pydynaa`` and, together with
+the qubit shim of :mod:`lightqubits`, for the parts of ``netsquid`` the entity
+scenarios use, so those run unchanged without a netsquid install::
+
+    python lightsim.py 1entidadesPingPong.py
+
+Example
+-------
+
+>>> class Ticker(Entity):
+...     tick = EventType("TICK", "A tick.")
+...     def start(self):
+...         self._wait(EventHandler(self._on_tick), entity=self, event_type=Ticker.tick)
+...         self._schedule_now(Ticker.tick)
+...     def _on_tick(self, event):
+...         self._schedule_after(10., Ticker.tick)
+>>> sim_reset()
+>>> Ticker().start()
+>>> stats = sim_run(end_time=95)
+>>> stats.events, sim_time()
+(10, 95.0)
+
+"""
+import contextlib
+import heapq
+import itertools
+import sys
+import time
+import types
+
+__all__ = [
+    "EventType",
+    "Event",
+    "EventHandler",
+    "ExpressionHandler",
+    "EventExpression",
+    "Entity",
+    "SimStats",
+    "sim_run",
+    "sim_reset",
+    "sim_time",
+    "install",
+    "run_script",
+]
+
+
+class EventType:
+    """Type of an event.
+
+    Parameters
+    ----------
+    name : str
+        Name of the event type.
+    description : str, optional
+        Description of the event type.
+
+    """
+
+    __slots__ = ("name", "description")
+
+    def __init__(self, name, description=""):
+        self.name = name
+        self.description = description
+
+    def __repr__(self):
+        return f"EventType({self.name!r})"
+
+
+class Event:
+    """Event scheduled on the timeline by an entity."""
+
+    __slots__ = ("source", "type", "id", "time")
+
+    _ids = itertools.count()
+
+    def __init__(self, source, event_type, trigger_time):
+        self.source = source
+        self.type = event_type
+        self.id = next(Event._ids)
+        self.time = trigger_time
+
+    def __repr__(self):
+        return f"Event({self.type!r}, time={self.time})"
+
+
+class EventHandler:
+    """Handler calling ``callback(event)`` for every event it waits for.
+
+    Parameters
+    ----------
+    callback : callable
+        Function called with the triggered :class:`Event`.
+
+    """
+
+    __slots__ = ("callback",)
+
+    def __init__(self, callback):
+        self.callback = callback
+
+
+class ExpressionHandler:
+    """Handler calling ``callback(expression)`` every time an expression triggers.
+
+    Parameters
+    ----------
+    callback : callable
+        Function called with the triggered :class:`EventExpression`.
+
+    """
+
+    __slots__ = ("callback",)
+
+    def __init__(self, callback):
+        self.callback = callback
+
+
+class EventExpression:
+    """Expression of events, atomic or combining two expressions with ``&`` or ``|``.
+
+    Parameters
+    ----------
+    source : :class:`Entity` or None, optional
+        Entity the events come from, any entity if None.
+    event_type : :class:`EventType` or None, optional
+        Type of the events, any type if None.
+    event_id : int or None, optional
+        Id of the event, any event if None.
+
+    """
+
+    __slots__ = ("atomic_source", "atomic_type", "atomic_id", "first_term", "second_term",
+                 "_operator", "value", "triggered_time", "_triggered_events")
+
+    def __init__(self, source=None, event_type=None, event_id=None):
+        self.atomic_source = source
+        self.atomic_type = event_type
+        self.atomic_id = event_id
+        self.first_term = None
+        self.second_term = None
+        self._operator = None
+        self.value = False
+        self.triggered_time = None
+        self._triggered_events = []
+
+    @classmethod
+    def _combine(cls, first, second, operator):
+        expression = cls()
+        expression.first_term = first
+        expression.second_term = second
+        expression._operator = operator
+        return expression
+
+    def __and__(self, other):
+        return EventExpression._combine(self, other, all)
+
+    def __or__(self, other):
+        return EventExpression._combine(self, other, any)
+
+    @property
+    def is_atomic(self):
+        """bool: Whether the expression describes events directly."""
+        return self._operator is None
+
+    @property
+    def triggered_events(self):
+        """list of :class:`Event`: Events that made the expression trigger."""
+        if self.is_atomic:
+            return self._triggered_events
+        return self.first_term.triggered_events + self.second_term.triggered_events
+
+    def _atoms(self):
+        if self.is_atomic:
+            return [self]
+        return self.first_term._atoms() + self.second_term._atoms()
+
+    def _evaluate(self):
+        if not self.is_atomic:
+            self.value = self._operator((self.first_term._evaluate(),
+                                         self.second_term._evaluate()))
+        return self.value
+
+    def _reset(self):
+        self.value = False
+        if self.is_atomic:
+            self._triggered_events = []
+        else:
+            self.first_term._reset()
+            self.second_term._reset()
+
+
+class _Wait:
+    # A registered wait: a handler with its expression, for atomic waits the
+    # expression only carries the event id to match
+    __slots__ = ("owner", "handler", "expression", "once", "active")
+
+    def __init__(self, owner, handler, expression, once):
+        self.owner = owner
+        self.handler = handler
+        self.expression = expression
+        self.once = once
+        self.active = True
+
+
+class SimStats:
+    """Statistics of a call of :func:`sim_run`."""
+
+    def __init__(self, events, callbacks, sim_time, wall_time):
+        self.events = events
+        self.callbacks = callbacks
+        self.sim_time = sim_time
+        self.wall_time = wall_time
+
+    def __str__(self):
+        return ("\nSimulation summary\n==================\n\n"
+                f"Elapsed wallclock time: {self.wall_time}\n"
+                f"Elapsed simulation time: {self.sim_time:.2e} [ns]\n"
+                f"Triggered events: {self.events}\n"
+                f"Handled callbacks: {self.callbacks}\n")
+
+
+class _Engine:
+    # State of the simulation: clock, heap of scheduled events and waits per
+    # (source, event type), with None standing for any
+
+    def __init__(self):
+        self.now = 0.
+        self.heap = []
+        self.sequence = itertools.count()
+        self.waits = {}
+
+    def schedule(self, source, event_type, trigger_time):
+        if trigger_time < self.now:
+            raise ValueError("Events can not be scheduled in the past")
+        event = Event(source, event_type, trigger_time)
+        heapq.heappush(self.heap, (trigger_time, next(self.sequence), event))
+        return event
+
+    def add_wait(self, wait):
+        for atom in wait.expression._atoms():
+            self.waits.setdefault((atom.atomic_source, atom.atomic_type), []).append((wait, atom))
+
+    def remove_waits(self, owner, handler):
+        for key, waits in self.waits.items():
+            for wait, _ in waits:
+                if wait.owner is owner and wait.handler is handler:
+                    wait.active = False
+            self.waits[key] = [item for item in waits if item[0].active]
+
+    def trigger(self, event):
+        callbacks = 0
+        matched = []
+        for key in ((event.source, event.type), (None, event.type), (event.source, None),
+                    (None, None)):
+            matched.extend(self.waits.get(key, ()))
+        for wait, atom in matched:
+            if not wait.active or (atom.atomic_id is not None and atom.atomic_id != event.id):
+                continue
+            atom.value = True
+            atom.triggered_time = self.now
+            atom._triggered_events = [event]
+            expression = wait.expression
+            if not expression._evaluate():
+                continue
+            expression.triggered_time = self.now
+            if wait.once:
+                self.remove_waits(wait.owner, wait.handler)
+            if isinstance(wait.handler, ExpressionHandler):
+                wait.handler.callback(expression)
+            else:
+                wait.handler.callback(event)
+            callbacks += 1
+            expression._reset()
+        return callbacks
+
+    def run(self, end_time):
+        events = callbacks = 0
+        heap = self.heap
+        while heap and (end_time is None or heap[0][0] <= end_time):
+            self.now, _, event = heapq.heappop(heap)
+            events += 1
+            callbacks += self.trigger(event)
+        if end_time is not None and end_time > self.now:
+            self.now = float(end_time)
+        return events, callbacks
+
+
+_engine = _Engine()
+
+
+class Entity:
+    """Base class of simulation entities.
+
+    Subclasses do not need to call ``Entity.__init__``, as with pydynaa.
+
+    """
+
+    def _schedule_now(self, event_type):
+        return _engine.schedule(self, event_type, _engine.now)
+
+    def _schedule_after(self, delay, event_type):
+        return _engine.schedule(self, event_type, _engine.now + delay)
+
+    def _schedule_at(self, trigger_time, event_type):
+        return _engine.schedule(self, event_type, trigger_time)
+
+    def _wait(self, handler, entity=None, event_type=None, event=None, expression=None,
+              once=False):
+        if expression is None:
+            if event is not None:
+                expression = EventExpression(source=event.source, event_type=event.type,
+                                             event_id=event.id)
+            else:
+                expression = EventExpression(source=entity, event_type=event_type)
+        _engine.add_wait(_Wait(self, handler, expression, once))
+
+    def _wait_once(self, handler, entity=None, event_type=None, event=None, expression=None):
+        self._wait(handler, entity=entity, event_type=event_type, event=event,
+                   expression=expression, once=True)
+
+    def _dismiss(self, handler, **kwargs):
+        _engine.remove_waits(self, handler)
+
+
+def sim_time(magnitude=None):
+    """Current simulation time [ns].
+
+    Parameters
+    ----------
+    magnitude : float or None, optional
+        Unit to express the time in, in ns.
+
+    Returns
+    -------
+    float
+        The simulation time.
+
+    """
+    return _engine.now if magnitude is None else _engine.now / magnitude
+
+
+def sim_reset():
+    """Clear all scheduled events and waits and set the time back to zero."""
+    global _engine
+    _engine = _Engine()
+
+
+def sim_run(end_time=None, duration=None, magnitude=None):
+    """Run the simulation.
+
+    Parameters
+    ----------
+    end_time : float or None, optional
+        Time to run until, events at this time included.
+    duration : float or None, optional
+        Time to run for, instead of ``end_time``.
+    magnitude : float or None, optional
+        Unit of ``end_time`` and ``duration``, in ns.
+
+    Returns
+    -------
+    :class:`SimStats`
+        Statistics of the run. If neither ``end_time`` nor ``duration`` is
+        given the simulation runs until no events are left.
+
+    """
+    scale = 1. if magnitude is None else magnitude
+    if duration is not None:
+        end_time = _engine.now + duration * scale
+    elif end_time is not None:
+        end_time = end_time * scale
+    start_time = _engine.now
+    start = time.perf_counter()
+    events, callbacks = _engine.run(end_time)
+    return SimStats(events, callbacks, _engine.now - start_time, time.perf_counter() - start)
+
+
+def _shim_modules():
+    # Modules standing in for pydynaa and the parts of netsquid the entity scripts use
+    import lightqubits
+    pydynaa = types.ModuleType("pydynaa")
+    for name in ("EventType", "Event", "EventHandler", "ExpressionHandler", "EventExpression",
+                 "Entity"):
+        setattr(pydynaa, name, globals()[name])
+    qformalism = types.ModuleType("netsquid.qubits.qformalism")
+    qformalism.QFormalism = lightqubits.QFormalism
+    qubits = types.ModuleType("netsquid.qubits")
+    for name in lightqubits.__all__:
+        setattr(qubits, name, getattr(lightqubits, name))
+    qubits.qformalism = qformalism
+    qubits.qubitapi = qubits
+    netsquid = types.ModuleType("netsquid")
+    for name in lightqubits.__all__:
+        setattr(netsquid, name, getattr(lightqubits, name))
+    netsquid.qubits = qubits
+    netsquid.sim_run = sim_run
+    netsquid.sim_reset = sim_reset
+    netsquid.sim_time = sim_time
+    return {"pydynaa": pydynaa, "netsquid": netsquid, "netsquid.qubits": qubits,
+            "netsquid.qubits.qubitapi": qubits, "netsquid.qubits.qformalism": qformalism}
+
+
+@contextlib.contextmanager
+def install():
+    """Let ``import pydynaa`` and ``import netsquid`` load the light kernel.
+
+    Restores the previously imported modules, if any, on exit.
+
+    """
+    shims = _shim_modules()
+    previous = {name: sys.modules.get(name) for name in shims}
+    sys.modules.update(shims)
+    try:
+        yield shims["netsquid"]
+    finally:
+        for name, module in previous.items():
+            if module is None:
+                del sys.modules[name]
+            else:
+                sys.modules[name] = module
+
+
+def run_script(path):
+    """Run a script against the light kernel.
+
+    Parameters
+    ----------
+    path : str
+        Path of the script.
+
+    """
+    import os
+    import runpy
+    sys.path.insert(0, os.path.dirname(os.path.abspath(path)))
+    sim_reset()
+    with install():
+        runpy.run_path(path, run_name="__main__")
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2:
+        sys.exit(f"usage: {sys.argv[0]} SCRIPT")
+    run_script(sys.argv[1])
@@ -0,0 +1,120 @@
+"""Geometric skip-ahead timing of lossy heralded entanglement attempts.
+
+On a lossy link most attempts of the entanglement source lose a photon, and
+simulating each of them costs a full round of events for nothing. Since
+attempts fail independently, the number of attempts up to and including the
+next success is geometrically distributed with the success probability of
+one attempt. :class:`GeometricSkipDelayModel` draws that number and lets the
+source's clock jump straight to the next successful attempt, so a run costs
+time proportional to the successes rather than the attempts.
+
+The success probability follows the ``FibreLossModel`` of tutorial 3: a
+photon travelling ``length`` km survives with probability
+``(1 - p_loss_init) * 10 ** (-p_loss_length * length / 10)``, and a pair from
+a midpoint source is heralded when both photons survive their half of the link.
+
+Example
+-------
+
+>>> p_success = heralding_probability(20, p_loss_init=0.83, p_loss_length=0.2)
+>>> print(f"{p_success:.5f}")
+0.01151
+>>> model = GeometricSkipDelayModel(period=1e3, p_success=p_success)
+>>> print(f"{model.delay:.4g}")
+8.692e+04
+
+"""
+from netsquid.components.models.delaymodels import DelayModel
+
+__all__ = [
+    "survival_probability",
+    "heralding_probability",
+    "GeometricSkipDelayModel",
+]
+
+
+def survival_probability(length, p_loss_init=0., p_loss_length=0.):
+    """Probability that a photon survives a fibre, as in ``FibreLossModel``.
+
+    Parameters
+    ----------
+    length : float
+        Length of the fibre [km].
+    p_loss_init : float, optional
+        Probability of losing the photon when it enters the fibre.
+    p_loss_length : float, optional
+        Attenuation of the fibre [dB/km].
+
+    Returns
+    -------
+    float
+        Survival probability.
+
+    """
+    return (1. - p_loss_init) * 10 ** (-p_loss_length * length / 10.)
+
+
+def heralding_probability(length, p_loss_init=0., p_loss_length=0.):
+    """Probability that an attempt of a midpoint source heralds a pair.
+
+    Parameters
+    ----------
+    length : float
+        End to end length of the link [km], each photon travels half of it.
+    p_loss_init : float, optional
+        Probability of losing a photon when it enters the fibre.
+    p_loss_length : float, optional
+        Attenuation of the fibre [dB/km].
+
+    Returns
+    -------
+    float
+        Probability that both photons of an attempt arrive.
+
+    """
+    return survival_probability(length / 2., p_loss_init, p_loss_length) ** 2
+
+
+class GeometricSkipDelayModel(DelayModel):
+    """Timing model of a source that skips the failed attempts.
+
+    Every delay is the attempt ``period`` times the number of attempts up to
+    the next success, drawn from the geometric distribution with the
+    random state in ``properties["rng"]``.
+
+    Parameters
+    ----------
+    period : float
+        Time between attempts [ns].
+    p_success : float
+        Probability that an attempt succeeds, in (0, 1].
+
+    Attributes
+    ----------
+    attempts : int
+        Number of attempts skipped over or made so far.
+    successes : int
+        Number of successful attempts, one per generated delay.
+
+    """
+
+    def __init__(self, period, p_success):
+        super().__init__()
+        if not 0. < p_success <= 1.:
+            raise ValueError(f"Success probability {p_success} not in (0, 1]")
+        self.properties["period"] = period
+        self.properties["p_success"] = p_success
+        self.attempts = 0
+        self.successes = 0
+
+    @property
+    def delay(self):
+        """float: Mean delay between successes [ns], as ``FixedDelayModel.delay``."""
+        return self.properties["period"] / self.properties["p_success"]
+
+    def generate_delay(self, **kwargs):
+        p_success = self.properties["p_success"]
+        attempts = 1 if p_success == 1. else int(self.properties["rng"].geometric(p_success))
+        self.attempts += attempts
+        self.successes += 1
+        return attempts * self.properties["period"]
@@ -0,0 +1,431 @@
+"""Array-backed quantum register with a fixed number of memory positions.
+
+The ``qubitapi`` pattern of tutorial 1 and 0telepsimples.py combines the
+states of qubits before every multi-qubit gate and splits them again on
+measurement, and the protocols of :mod:`telp` create fresh qubits every cycle,
+so every cycle allocates new shared states. A :class:`QubitRegister` instead
+preallocates the density matrix of all its positions once, e.g. the 2 positions
+of ``telp.create_processor``, plus a scratch buffer of the same size. Gates,
+measurements, noise and re-initialisation act in place on these arrays, and a
+measured qubit simply stays in the register in its collapsed state.
+
+:class:`RegisterQubitAPI` offers ``qubitapi``-style functions on the
+positions of a register, so code written against ``qubitapi`` can be pointed
+at a register with few changes.
+
+Example
+-------
+
+>>> register = QubitRegister(3)
+>>> api = RegisterQubitAPI(register, rng=42)
+>>> a1, a2, b1 = api.qubits()
+>>> api.operate(a1, H)
+>>> api.operate(a1, S)
+>>> api.operate(a2, H)
+>>> api.operate([a2, b1], CNOT)
+>>> api.operate([a1, a2], CNOT)
+>>> api.operate(a1, H)
+>>> m1, _ = api.measure(a1)
+>>> m2, _ = api.measure(a2)
+>>> if m2:
+...     api.operate(b1, X)
+>>> if m1:
+...     api.operate(b1, Z)
+>>> print(f"{api.fidelity(b1, Y0_KET, squared=True):.3f}")
+1.000
+
+"""
+import numpy as np
+
+__all__ = [
+    "I", "X", "Y", "Z", "H", "S", "CNOT",
+    "Y0_KET",
+    "QubitRegister",
+    "RegisterQubit",
+    "RegisterQubitAPI",
+]
+
+I = np.eye(2, dtype=complex)
+X = np.array([[0, 1], [1, 0]], dtype=complex)
+Y = np.array([[0, -1j], [1j, 0]], dtype=complex)
+Z = np.array([[1, 0], [0, -1]], dtype=complex)
+H = np.array([[1, 1], [1, -1]], dtype=complex) / np.sqrt(2)
+S = np.array([[1, 0], [0, 1j]], dtype=complex)
+CNOT = np.array([[1, 0, 0, 0], [0, 1, 0, 0], [0, 0, 0, 1], [0, 0, 1, 0]], dtype=complex)
+Y0_KET = np.array([1, 1j], dtype=complex) / np.sqrt(2)
+
+_LETTERS = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+
+class QubitRegister:
+    """Density matrix of a fixed set of memory positions, updated in place.
+
+    All positions start in ``|0>``. Position 0 is the most significant qubit,
+    as in netsquid.
+
+    Parameters
+    ----------
+    num_positions : int
+        Number of memory positions.
+
+    """
+
+    def __init__(self, num_positions):
+        # Two letters per position are needed for the einsum subscripts
+        if not 1 <= num_positions <= len(_LETTERS) // 4:
+            raise ValueError(f"num_positions must be between 1 and {len(_LETTERS) // 4}")
+        self.num_positions = num_positions
+        dim = 2 ** num_positions
+        self._dm = np.zeros((dim, dim), dtype=complex)
+        self._dm[0, 0] = 1.
+        self._scratch = np.empty_like(self._dm)
+        shape = (2,) * (2 * num_positions)
+        # Views with one axis per row and column qubit
+        self._tensor = self._dm.reshape(shape)
+        self._scratch_tensor = self._scratch.reshape(shape)
+        self._subscripts = {}
+
+    @property
+    def dm(self):
+        """:class:`numpy.ndarray`: Read-only view of the density matrix."""
+        view = self._dm.view()
+        view.flags.writeable = False
+        return view
+
+    def _block(self, tensor, position, row, column):
+        # View of the elements with the qubit at position in |row><column|
+        index = [slice(None)] * (2 * self.num_positions)
+        index[position] = row
+        index[self.num_positions + position] = column
+        return tensor[tuple(index)]
+
+    def _check(self, positions):
+        if len(set(positions)) != len(positions) or not all(
+                0 <= position < self.num_positions for position in positions):
+            raise ValueError(f"Invalid positions {positions}")
+
+    def reset(self, positions=None):
+        """Initialise positions to ``|0>``, tracing out their previous state.
+
+        Parameters
+        ----------
+        positions : list of int or None, optional
+            Positions to initialise, all if None.
+
+        """
+        if positions is None:
+            self._dm.fill(0.)
+            self._dm[0, 0] = 1.
+            return
+        for position in positions:
+            tensor = self._tensor
+            self._block(tensor, position, 0, 0)[...] += self._block(tensor, position, 1, 1)
+            for row, column in ((1, 1), (0, 1), (1, 0)):
+                self._block(tensor, position, row, column)[...] = 0.
+
+    def assign(self, positions, state):
+        """Put positions in a state, tracing out their previous state.
+
+        Parameters
+        ----------
+        positions : list of int
+            Positions to assign.
+        state : array_like
+            Ket of length ``2 ** len(positions)`` or density matrix.
+
+        """
+        self._check(positions)
+        state = np.asarray(state, dtype=complex)
+        if state.ndim == 1 or 1 in state.shape:
+            state = state.reshape(-1, 1)
+            state = state @ state.conj().T
+        self.reset(positions)
+        index = [slice(None)] * (2 * self.num_positions)
+        for position in positions:
+            index[position] = index[self.num_positions + position] = 0
+        # Remaining state of the other positions, with the positions in |0..0>
+        rest = self._scratch_tensor[tuple(index)]
+        rest[...] = self._tensor[tuple(index)]
+        num = len(positions)
+        for row in range(2 ** num):
+            for column in range(2 ** num):
+                for k, position in enumerate(positions):
+                    index[position] = (row >> (num - 1 - k)) & 1
+                    index[self.num_positions + position] = (column >> (num - 1 - k)) & 1
+                np.multiply(rest, state[row, column], out=self._tensor[tuple(index)])
+
+    def _apply_subscripts(self, positions):
+        key = tuple(positions)
+        if key not in self._subscripts:
+            n = self.num_positions
+            rows = list(_LETTERS[:n])
+            columns = list(_LETTERS[n:2 * n])
+            extra = _LETTERS[2 * n:]
+            gate_out = [extra[k] for k in range(len(positions))]
+            gate_in = [rows[position] for position in positions]
+            new_rows = list(rows)
+            for k, position in enumerate(positions):
+                new_rows[position] = gate_out[k]
+            left = (f"{''.join(gate_out + gate_in)},{''.join(rows + columns)}"
+                    f"->{''.join(new_rows + columns)}")
+            gate_out = [extra[len(positions) + k] for k in range(len(positions))]
+            gate_in = [columns[position] for position in positions]
+            new_columns = list(columns)
+            for k, position in enumerate(positions):
+                new_columns[position] = gate_out[k]
+            right = (f"{''.join(new_rows + columns)},{''.join(gate_out + gate_in)}"
+                     f"->{''.join(new_rows + new_columns)}")
+            self._subscripts[key] = left, right
+        return self._subscripts[key]
+
+    def apply(self, positions, operator):
+        """Apply an operator to positions, in the order of the operator's qubits.
+
+        Parameters
+        ----------
+        positions : list of int
+            Positions the operator acts on.
+        operator : array_like
+            Matrix of the operator.
+
+        """
+        self._check(positions)
+        operator = np.asarray(operator, dtype=complex)
+        gate = operator.reshape((2,) * (2 * len(positions)))
+        left, right = self._apply_subscripts(positions)
+        # operator @ dm into the scratch buffer, then @ operator^dagger back
+        np.einsum(left, gate, self._tensor, out=self._scratch_tensor)
+        np.einsum(right, self._scratch_tensor, gate.conj(), out=self._tensor)
+
+    def probability(self, position, outcome=0):
+        """Probability of measuring ``outcome`` on a position in the standard basis."""
+        block = self._block(self._tensor, position, outcome, outcome)
+        size = 2 ** (self.num_positions - 1)
+        return float(np.real(np.einsum("ii->", block.reshape(size, size))))
+
+    def measure(self, position, rng=None):
+        """Measure a position in the standard basis.
+
+        Parameters
+        ----------
+        position : int
+            Position to measure.
+        rng : :class:`numpy.random.Generator` or None, optional
+            Random number generator.
+
+        Returns
+        -------
+        int
+            Outcome.
+        float
+            Probability of the outcome.
+
+        """
+        rng = np.random.default_rng(rng) if not isinstance(rng, np.random.Generator) else rng
+        prob_zero = min(max(self.probability(position, 0), 0.), 1.)
+        outcome = int(rng.random() >= prob_zero)
+        prob = prob_zero if outcome == 0 else 1. - prob_zero
+        self.project(position, outcome, prob)
+        return outcome, prob
+
+    def project(self, position, outcome, prob=None):
+        """Project a position onto ``|outcome>`` and renormalise.
+
+        Parameters
+        ----------
+        position : int
+            Position to project.
+        outcome : int
+            Basis state to project onto.
+        prob : float or None, optional
+            Probability of the outcome, computed if None.
+
+        """
+        if prob is None:
+            prob = self.probability(position, outcome)
+        tensor = self._tensor
+        other = 1 - outcome
+        for row, column in ((other, other), (0, 1), (1, 0)):
+            self._block(tensor, position, row, column)[...] = 0.
+        if prob > 0:
+            self._block(tensor, position, outcome, outcome)[...] /= prob
+
+    def depolarize(self, position, prob):
+        """Depolarize a position: ``rho -> (1 - p) rho + p I/2 (x) Tr_position(rho)``."""
+        if prob == 0:
+            return
+        tensor = self._tensor
+        diagonal_0 = self._block(tensor, position, 0, 0)
+        diagonal_1 = self._block(tensor, position, 1, 1)
+        mixed = self._block(self._scratch_tensor, position, 0, 0)
+        np.add(diagonal_0, diagonal_1, out=mixed)
+        mixed *= 0.5 * prob
+        for block in (diagonal_0, diagonal_1):
+            block *= 1. - prob
+            block += mixed
+        self._block(tensor, position, 0, 1)[...] *= 1. - prob
+        self._block(tensor, position, 1, 0)[...] *= 1. - prob
+
+    def dephase(self, position, prob):
+        """Dephase a position: ``rho -> (1 - p) rho + p Z rho Z``."""
+        if prob == 0:
+            return
+        self._block(self._tensor, position, 0, 1)[...] *= 1. - 2. * prob
+        self._block(self._tensor, position, 1, 0)[...] *= 1. - 2. * prob
+
+    def reduced_dm(self, positions):
+        """Density matrix of positions, in the given order.
+
+        Returns
+        -------
+        :class:`numpy.ndarray`
+            A new array of shape ``(2 ** len(positions), 2 ** len(positions))``.
+
+        """
+        self._check(positions)
+        n = self.num_positions
+        rows = list(_LETTERS[:n])
+        columns = list(rows)
+        for position in positions:
+            columns[position] = _LETTERS[n + position]
+        output = ([rows[position] for position in positions] +
+                  [columns[position] for position in positions])
+        dim = 2 ** len(positions)
+        return np.einsum(f"{''.join(rows + columns)}->{''.join(output)}",
+                         self._tensor).reshape(dim, dim)
+
+    def fidelity(self, positions, reference, squared=False):
+        """Fidelity of positions with a pure reference ket."""
+        ket = np.asarray(reference, dtype=complex).ravel()
+        value = float(np.real(np.vdot(ket, self.reduced_dm(positions) @ ket)))
+        return value if squared else np.sqrt(max(value, 0.))
+
+
+class RegisterQubit:
+    """Handle of a memory position, used as qubit by :class:`RegisterQubitAPI`."""
+
+    __slots__ = ("register", "position")
+
+    def __init__(self, register, position):
+        self.register = register
+        self.position = position
+
+    def __repr__(self):
+        return f"RegisterQubit(position={self.position})"
+
+
+def _matrix(operator):
+    # netsquid operators keep their matrix in arr
+    return np.asarray(getattr(operator, "arr", operator), dtype=complex)
+
+
+class RegisterQubitAPI:
+    """``qubitapi``-style functions acting on the positions of a register.
+
+    Parameters
+    ----------
+    register : :class:`QubitRegister`
+        Register the qubits live in.
+    rng : :class:`numpy.random.Generator`, int or None, optional
+        Random number generator of measurements, or seed to create one.
+
+    """
+
+    def __init__(self, register, rng=None):
+        self.register = register
+        self.rng = np.random.default_rng(rng)
+        self._qubits = [RegisterQubit(register, position)
+                        for position in range(register.num_positions)]
+
+    def qubits(self, positions=None):
+        """Qubit handles of positions, all if None."""
+        if positions is None:
+            return list(self._qubits)
+        return [self._qubits[position] for position in positions]
+
+    @staticmethod
+    def _positions(qubits):
+        if isinstance(qubits, RegisterQubit):
+            return [qubits.position]
+        return [qubit.position for qubit in qubits]
+
+    def operate(self, qubits, operator):
+        self.register.apply(self._positions(qubits), _matrix(operator))
+
+    def measure(self, qubit, observable=None):
+        """Measure in the eigenbasis of ``observable``, Z if None; 0 is the larger eigenvalue."""
+        if observable is None:
+            return self.register.measure(qubit.position, rng=self.rng)
+        eigenvalues, eigenvectors = np.linalg.eigh(_matrix(observable))
+        basis = eigenvectors[:, np.argsort(eigenvalues)[::-1]]
+        self.register.apply([qubit.position], basis.conj().T)
+        result = self.register.measure(qubit.position, rng=self.rng)
+        self.register.apply([qubit.position], basis)
+        return result
+
+    def assign_qstate(self, qubits, qrepr):
+        self.register.assign(self._positions(qubits), qrepr)
+
+    def reduced_dm(self, qubits):
+        return self.register.reduced_dm(self._positions(qubits))
+
+    def fidelity(self, qubits, reference_state, squared=False):
+        return self.register.fidelity(self._positions(qubits), reference_state, squared=squared)
+
+    def depolarize(self, qubit, prob=1.):
+        self.register.depolarize(qubit.position, prob)
+
+    def dephase(self, qubit, prob=1.):
+        self.register.dephase(qubit.position, prob)
+
+    def delay_depolarize(self, qubit, depolar_rate, delay):
+        self.register.depolarize(qubit.position, 1. - np.exp(-delay * 1e-9 * depolar_rate))
+
+    def discard(self, qubit):
+        """Free a position, which puts it back in ``|0>``."""
+        self.register.reset([qubit.position])
+
+
+def _teleport(api, qubits):
+    # One round of 0telepsimples.py, on any qubitapi-like object
+    a1, a2, b1 = qubits
+    api.operate(a1, H)
+    api.operate(a1, S)
+    api.operate(a2, H)
+    api.operate([a2, b1], CNOT)
+    api.operate([a1, a2], CNOT)
+    api.operate(a1, H)
+    m1, _ = api.measure(a1)
+    m2, _ = api.measure(a2)
+    if m2:
+        api.operate(b1, X)
+    if m1:
+        api.operate(b1, Z)
+    return api.fidelity(b1, Y0_KET, squared=True)
+
+
+if __name__ == '__main__':
+    import time
+    import lightqubits
+    num_rounds = 20000
+    register = QubitRegister(3)
+    api = RegisterQubitAPI(register, rng=42)
+    start = time.perf_counter()
+    for _ in range(num_rounds):
+        register.reset()
+        _teleport(api, api.qubits())
+    register_time = time.perf_counter() - start
+
+    class _Operators:
+        # Fresh qubits every round, combined and split by the qubit shim
+        operate = staticmethod(lambda qubits, operator: lightqubits.operate(
+            qubits, lightqubits.Operator("U", operator)))
+        measure = staticmethod(lightqubits.measure)
+        fidelity = staticmethod(lightqubits.fidelity)
+
+    start = time.perf_counter()
+    for _ in range(num_rounds):
+        _teleport(_Operators, lightqubits.create_qubits(3))
+    shared_time = time.perf_counter() - start
+    print(f"register: {1e6 * register_time / num_rounds:.1f} us per teleportation, "
+          f"combine/split: {1e6 * shared_time / num_rounds:.1f} us per teleportation")
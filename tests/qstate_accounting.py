@@ -0,0 +1,409 @@
+"""Accounting of the size of shared quantum states, with a memory budget.
+
+Qubits that interact share one quantum state, whose memory grows as ``2**n``
+in the ket and ``4**n`` in the density matrix formalism for ``n`` qubits.
+A :class:`StateAccountant` wraps the functions of
+:mod:`netsquid.qubits.qubitapi` that create, merge and discard states, keeps
+the number of qubits of every live shared state, and:
+
+* before a merge would take the live states over ``budget_bytes``, warns,
+  raises or switches the formalism of new states to a cheaper one
+  (tutorials 1 and 3 do that by hand with ``ns.set_qstate_formalism``);
+* reports the peak merged state size per run, with the protocol step, qubit
+  API call and simulation time it was reached at.
+
+States are tracked through weak references, so a state leaves the account
+once it is garbage collected, also when its qubits were measured and dropped
+without a ``discard``.
+
+Only calls made through the qubit API module (``qapi.operate``,
+``ns.qubits.operate``, ...) are hooked. Quantum processor instructions and
+sources (``QSource``) create and merge their states inside netsquid, so
+protocols pass the qubits they hold to :meth:`StateAccountant.observe_memory`
+instead, before and after the programs that merge them. The protocols of
+:mod:`telp` and :mod:`repeater_chain` do that when given an accountant, see
+``accountant`` of :func:`telp.run_experiment` and
+:meth:`repeater_chain.RepeaterChain.run`.
+
+Example
+-------
+
+>>> state_bytes(3, "DM"), state_bytes(3, "KET"), state_bytes(3, "STAB")
+(1024, 128, 42)
+
+Accounting a run needs netsquid::
+
+    accountant = StateAccountant(budget_bytes=2 ** 20, on_exceed="switch")
+    with accountant:
+        accountant.start_run("teleport")
+        with accountant.step("bell_measurement"):
+            ns.qubits.operate([q1, q2], ns.CNOT)
+    accountant.dataframe()
+
+and a processor driven run, whose protocols report the qubits they hold::
+
+    accountant = StateAccountant(budget_bytes=2 ** 20)
+    RepeaterChain(num_nodes=5).run(num_runs=100, accountant=accountant)
+
+"""
+import contextlib
+import gc
+import warnings
+import weakref
+
+__all__ = [
+    "FORMALISMS",
+    "StateBudgetWarning",
+    "state_bytes",
+    "StateAccountant",
+]
+
+#: Formalisms of netsquid whose state size is estimated.
+FORMALISMS = ("KET", "DM", "STAB", "GSLC")
+
+# Representations of netsquid quantum states per formalism
+_REPR_FORMALISMS = {"KetRepr": "KET", "DenseDMRepr": "DM", "SparseDMRepr": "DM",
+                    "StabRepr": "STAB", "GSLCRepr": "GSLC"}
+
+# Qubit API functions wrapped, and whether they merge the states of their qubits
+_WRAPPED = {"create_qubits": False, "assign_qstate": False, "discard": False,
+            "measure": False, "operate": True, "multi_operate": True, "combine_qubits": True}
+
+
+class StateBudgetWarning(ResourceWarning):
+    """Warning that a merge takes the live quantum states over the memory budget."""
+
+
+def _formalism_name(formalism):
+    name = getattr(formalism, "name", formalism)
+    if name not in FORMALISMS:
+        raise ValueError(f"Unknown formalism {formalism!r}, expected one of {FORMALISMS}")
+    return name
+
+
+def state_bytes(num_qubits, formalism):
+    """Estimated memory of a quantum state.
+
+    Parameters
+    ----------
+    num_qubits : int
+        Number of qubits of the state.
+    formalism : str or :class:`~netsquid.qubits.qformalism.QFormalism`
+        Formalism of the state.
+
+    Returns
+    -------
+    int
+        Bytes of the complex ket or density matrix, or of the stabilizer
+        tableau (one byte per entry) or graph state adjacency matrix.
+
+    """
+    name = _formalism_name(formalism)
+    if name == "KET":
+        return 16 * 2 ** num_qubits
+    if name == "DM":
+        return 16 * 4 ** num_qubits
+    if name == "STAB":
+        return 2 * num_qubits * (2 * num_qubits + 1)
+    return num_qubits * (num_qubits + 1)
+
+
+def _repr_formalism(qstate):
+    # Formalism of a netsquid quantum state by its representation, None if unknown
+    return _REPR_FORMALISMS.get(type(getattr(qstate, "qrepr", None)).__name__)
+
+
+def _qubits(args, kwargs):
+    # Qubits passed to a qubit API function as first argument
+    qubits = kwargs.get("qubits", kwargs.get("qubit", args[0] if args else None))
+    if qubits is None:
+        return []
+    if isinstance(qubits, (list, tuple)):
+        return [qubit for qubit in qubits if qubit is not None]
+    return [qubits]
+
+
+class StateAccountant:
+    """Tracks the size of live shared quantum states against a memory budget.
+
+    Use as a context manager, or :meth:`install` and :meth:`uninstall`.
+
+    Parameters
+    ----------
+    budget_bytes : int or None, optional
+        Memory budget of all live states, see :func:`state_bytes`. None only
+        accounts.
+    on_exceed : str, optional
+        What to do before a merge exceeds the budget: "warn" with a
+        :class:`StateBudgetWarning`, "raise" a :class:`MemoryError`, or
+        "switch" the formalism of new states to the first of
+        ``fallback_formalisms`` in which the merged state fits, and warn.
+        Existing states keep their formalism.
+    fallback_formalisms : tuple of str, optional
+        Formalisms to switch to, cheapest last. Only include "STAB" if the
+        simulation is Clifford, see :func:`formalism_select.select_formalism`.
+
+    Attributes
+    ----------
+    runs : list of dict
+        Peaks of every run started with :meth:`start_run`.
+    switches : list of dict
+        Formalism switches, with the simulation time and step they happened at.
+
+    """
+
+    def __init__(self, budget_bytes=None, on_exceed="warn", fallback_formalisms=("KET",)):
+        if on_exceed not in ("warn", "raise", "switch"):
+            raise ValueError(f"Unknown action {on_exceed!r}, expected 'warn', 'raise' or "
+                             f"'switch'")
+        self.budget_bytes = budget_bytes
+        self.on_exceed = on_exceed
+        self.fallback_formalisms = tuple(_formalism_name(name) for name in fallback_formalisms)
+        self.runs = []
+        self.switches = []
+        self._originals = {}
+        self._step = None
+        # id of a live state -> (weak reference to it, its formalism). Entries
+        # drop out when the state is garbage collected, after its qubits were
+        # discarded, dropped, or merged into another state
+        self._states = {}
+
+    def __enter__(self):
+        self.install()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.uninstall()
+
+    def install(self):
+        """Wrap the qubit API functions, in ``qubitapi`` and re-exported in ``netsquid.qubits``."""
+        import netsquid.qubits
+        from netsquid.qubits import qubitapi
+        for name, merges in _WRAPPED.items():
+            original = getattr(qubitapi, name)
+            wrapper = self._wrap(name, original, merges)
+            for module in (qubitapi, netsquid.qubits):
+                if getattr(module, name, None) is original:
+                    self._originals[(module, name)] = original
+                    setattr(module, name, wrapper)
+
+    def uninstall(self):
+        """Restore the qubit API functions."""
+        for (module, name), original in self._originals.items():
+            setattr(module, name, original)
+        self._originals.clear()
+
+    @contextlib.contextmanager
+    def step(self, label):
+        """Attribute the states created or merged in the block to a protocol step.
+
+        Parameters
+        ----------
+        label : str
+            Name of the step, reported with the peaks.
+
+        """
+        previous, self._step = self._step, label
+        try:
+            yield
+        finally:
+            self._step = previous
+
+    def start_run(self, label=None):
+        """Start recording the peaks of a new run.
+
+        Parameters
+        ----------
+        label : hashable, optional
+            Label of the run, e.g. its sweep key.
+
+        """
+        self.runs.append({"run": len(self.runs) if label is None else label,
+                          "peak_state_qubits": 0, "peak_state_bytes": 0, "peak_live_bytes": 0,
+                          "peak_step": None, "peak_call": None, "peak_time": None})
+
+    @property
+    def live_states(self):
+        """int: Number of live shared states."""
+        return len(self._states)
+
+    @property
+    def live_bytes(self):
+        """int: Estimated memory of the live states."""
+        total = 0
+        for ref, formalism in list(self._states.values()):
+            qstate = ref()
+            if qstate is not None:
+                total += state_bytes(qstate.num_qubits, formalism)
+        return total
+
+    def observe(self, qubits, call="observe", merges=False):
+        """Account the states of qubits the qubit API hooks did not see.
+
+        Processor instructions and sources create and merge states inside
+        netsquid, without going through the wrapped functions. Protocols pass
+        the qubits they hold, e.g. ``qmemory.peek(positions)``, to attribute
+        those states to the current :meth:`step`. Works whether the
+        accountant is installed or not.
+
+        Parameters
+        ----------
+        qubits : list of :class:`~netsquid.qubits.qubit.Qubit`
+            Qubits to account, None entries are skipped.
+        call : str, optional
+            Name to report the peak under.
+        merges : bool, optional
+            Whether a program is about to merge the states of the qubits, so
+            the budget is checked for the merged state first.
+
+        """
+        qubits = [qubit for qubit in qubits if qubit is not None]
+        if merges:
+            self._check_budget(call, qubits, self._merged_formalism(qubits))
+        self._observe(call, qubits, None)
+
+    def observe_memory(self, qmemory, positions, step, merges=False):
+        """Account the qubits held by a quantum memory within a protocol step.
+
+        Parameters
+        ----------
+        qmemory : :class:`~netsquid.components.qmemory.QuantumMemory`
+            Memory holding the qubits, e.g. a node's processor.
+        positions : list of int
+            Memory positions of the qubits, empty positions are skipped.
+        step : str
+            Name of the step, see :meth:`step`.
+        merges : bool, optional
+            Whether a program is about to merge the states of the qubits, see
+            :meth:`observe`.
+
+        """
+        with self.step(step):
+            self.observe(qmemory.peek(positions, skip_noise=True), call="peek", merges=merges)
+
+    def dataframe(self):
+        """Peaks of every run.
+
+        Returns
+        -------
+        :class:`pandas.DataFrame`
+            One row per run, with the switches in ``attrs["switches"]``.
+
+        """
+        import pandas
+        df = pandas.DataFrame(self.runs, columns=["run", "peak_state_qubits", "peak_state_bytes",
+                                                  "peak_live_bytes", "peak_step", "peak_call",
+                                                  "peak_time"])
+        df.attrs["switches"] = list(self.switches)
+        return df
+
+    def _wrap(self, name, original, merges):
+        def wrapper(*args, **kwargs):
+            qubits = _qubits(args, kwargs)
+            formalism = None
+            if merges:
+                formalism = self._merged_formalism(qubits)
+                self._check_budget(name, qubits, formalism)
+            result = original(*args, **kwargs)
+            if name == "create_qubits":
+                qubits = list(result)
+            self._observe(name, qubits, formalism)
+            return result
+
+        wrapper.__name__ = name
+        wrapper.__doc__ = original.__doc__
+        wrapper.__wrapped__ = original
+        return wrapper
+
+    def _check_budget(self, name, qubits, formalism):
+        if self.budget_bytes is None:
+            return
+        import netsquid as ns
+        states = {id(qubit.qstate): qubit.qstate for qubit in qubits
+                  if getattr(qubit, "qstate", None) is not None}
+        if len(states) < 2:
+            return
+        num_qubits = sum(qstate.num_qubits for qstate in states.values())
+
+        def needed_bytes(merged_formalism):
+            remaining = self.live_bytes - sum(
+                state_bytes(qstate.num_qubits, self._formalism(qstate))
+                for qstate in states.values() if self._formalism(qstate) is not None)
+            return remaining, remaining + state_bytes(num_qubits, merged_formalism)
+
+        remaining, needed = needed_bytes(formalism)
+        if needed > self.budget_bytes:
+            # States of dropped qubits reference their qubits and back, so they
+            # are only freed by the cycle collector
+            gc.collect()
+            remaining, needed = needed_bytes(formalism)
+        if needed <= self.budget_bytes:
+            return
+        message = (f"{name} at {ns.sim_time()} ns (step {self._step}) merges a {num_qubits} "
+                   f"qubit {formalism} state, {needed} bytes live over the budget of "
+                   f"{self.budget_bytes}")
+        if self.on_exceed == "raise":
+            raise MemoryError(message)
+        current = _formalism_name(ns.get_qstate_formalism())
+        if self.on_exceed == "switch":
+            for fallback in self.fallback_formalisms:
+                if remaining + state_bytes(num_qubits, fallback) <= self.budget_bytes:
+                    if fallback != current:
+                        ns.set_qstate_formalism(ns.QFormalism[fallback])
+                        self.switches.append({"time": ns.sim_time(), "step": self._step,
+                                              "from": current, "to": fallback,
+                                              "num_qubits": num_qubits})
+                    message += f", new states use {fallback}"
+                    break
+        warnings.warn(message, StateBudgetWarning, stacklevel=3)
+
+    def _formalism(self, qstate):
+        # Formalism a live state was accounted in, None if it is not accounted
+        entry = self._states.get(id(qstate))
+        if entry is None or entry[0]() is not qstate:
+            return None
+        return entry[1]
+
+    def _merged_formalism(self, qubits):
+        # Merged states keep the formalism of the states they merge, new ones
+        # take the current formalism
+        import netsquid as ns
+        for qubit in qubits:
+            qstate = getattr(qubit, "qstate", None)
+            formalism = (None if qstate is None else
+                         self._formalism(qstate) or _repr_formalism(qstate))
+            if formalism is not None:
+                return formalism
+        return _formalism_name(ns.get_qstate_formalism())
+
+    def _drop(self, state_id, ref):
+        # Weak reference callback; the id may already belong to a newer state
+        entry = self._states.get(state_id)
+        if entry is not None and entry[0] is ref:
+            del self._states[state_id]
+
+    def _observe(self, name, qubits, formalism):
+        import netsquid as ns
+        touched = []
+        for qubit in qubits:
+            qstate = getattr(qubit, "qstate", None)
+            if qstate is None:
+                continue
+            if self._formalism(qstate) is None:
+                state_formalism = (formalism or _repr_formalism(qstate) or
+                                   _formalism_name(ns.get_qstate_formalism()))
+                state_id = id(qstate)
+                ref = weakref.ref(qstate, lambda ref, state_id=state_id: self._drop(state_id,
+                                                                                     ref))
+                self._states[state_id] = (ref, state_formalism)
+            touched.append(qstate)
+        if not self.runs or not touched:
+            return
+        run = self.runs[-1]
+        run["peak_live_bytes"] = max(run["peak_live_bytes"], self.live_bytes)
+        for qstate in touched:
+            num_qubits = qstate.num_qubits
+            if num_qubits > run["peak_state_qubits"]:
+                run.update(peak_state_qubits=num_qubits,
+                           peak_state_bytes=state_bytes(num_qubits, self._formalism(qstate)),
+                           peak_step=self._step, peak_call=name, peak_time=ns.sim_time())
@@ -0,0 +1,346 @@
+"""Linear repeater chain with entanglement swapping and end-to-end teleportation.
+
+Extends the two-node network of :mod:`telp` to a chain of ``N`` nodes::
+
+    Alice -- src -- Node_1 -- src -- Node_2 ... Node_N-2 -- src -- Bob
+
+Every link is an :class:`~telp.EntanglingConnection` with a midpoint source,
+next to a :class:`~telp.ClassicalConnection` towards Bob. The intermediate
+nodes swap entanglement with a Bell measurement as soon as both their qubits
+arrived and send the outcomes towards Bob. Alice teleports y0 over her link,
+exactly as in :mod:`telp`, and Bob applies the combined Pauli corrections of
+all swaps and the teleportation once every outcome of a round arrived.
+
+Every swap is logged in :attr:`RepeaterChain.registro_swap`, the swap log that
+network_parameters.md plans for the channels.
+
+Example
+-------
+
+>>> chain = RepeaterChain(num_nodes=5, total_length=4e-2, depolar_rate=1e6)
+>>> print(chain.run(num_runs=100))  # doctest: +SKIP
+
+"""
+import time
+
+import netsquid as ns
+from netsquid.nodes import Node, Network
+from netsquid.protocols.nodeprotocols import NodeProtocol
+from netsquid.protocols.protocol import Signals
+from netsquid.qubits import qubitapi as qapi
+import pydynaa
+
+from sweep_stats import SweepAggregator
+from telp import (ClassicalConnection, EntanglingConnection, BellMeasurementProgram,
+                  BellMeasurementProtocol, FidelityCollector, create_processor)
+
+__all__ = [
+    "SwapProtocol",
+    "ChainCorrectionProtocol",
+    "RepeaterChain",
+]
+
+
+class SwapProtocol(NodeProtocol):
+    """Protocol of an intermediate node: swap entanglement once both qubits arrived.
+
+    The outcomes are sent to the right as ``(index, m1, m2)``.
+
+    Parameters
+    ----------
+    node : :class:`~netsquid.nodes.node.Node`
+        Intermediate node with its left qubit in position 0 and right qubit in position 1.
+    index : int
+        Position of the node in the chain.
+    swap_log : list or None, optional
+        If given, ``(time, index, m1, m2)`` is appended for every swap.
+
+    Attributes
+    ----------
+    accountant : :class:`~qstate_accounting.StateAccountant` or None
+        If set, the swapped qubits are accounted before and after the swap, in step "swap".
+
+    """
+
+    def __init__(self, node, index, swap_log=None):
+        super().__init__(node)
+        self.index = index
+        self.swap_log = swap_log
+        self.accountant = None
+
+    def run(self):
+        port_left = self.node.ports["qin_left"]
+        port_right = self.node.ports["qin_right"]
+        left_ready = right_ready = False
+        swap_program = BellMeasurementProgram()
+        while True:
+            expr = yield (self.await_port_input(port_left) |
+                          self.await_port_input(port_right))
+            if expr.first_term.value:
+                left_ready = True
+            else:
+                right_ready = True
+            if left_ready and right_ready:
+                if self.accountant is not None:
+                    self.accountant.observe_memory(self.node.qmemory, [0, 1], "swap",
+                                                   merges=True)
+                yield self.node.qmemory.execute_program(swap_program, qubit_mapping=[0, 1])
+                if self.accountant is not None:
+                    self.accountant.observe_memory(self.node.qmemory, [0, 1], "swap")
+                m1, = swap_program.output["M1"]
+                m2, = swap_program.output["M2"]
+                self.node.ports["cout_right"].tx_output((self.index, m1, m2))
+                if self.swap_log is not None:
+                    self.swap_log.append((ns.sim_time(), self.index, m1, m2))
+                self.send_signal(Signals.SUCCESS)
+                left_ready = right_ready = False
+
+
+class ChainCorrectionProtocol(NodeProtocol):
+    """Bob's protocol: apply the corrections of all swaps and the teleportation.
+
+    Parameters
+    ----------
+    node : :class:`~netsquid.nodes.node.Node`
+        Bob's node, receiving its qubit in memory position 0.
+    num_senders : int
+        Number of nodes sending outcomes every round: the swapping nodes and Alice.
+
+    Attributes
+    ----------
+    accountant : :class:`~qstate_accounting.StateAccountant` or None
+        If set, Bob's qubit is accounted before the corrections, in step "correction".
+
+    """
+
+    def __init__(self, node, num_senders):
+        super().__init__(node)
+        self.num_senders = num_senders
+        self.accountant = None
+
+    def run(self):
+        port_messages = self.node.ports["cin_left"]
+        port_qubit = self.node.ports["qin_left"]
+        pending = {}
+        qubit_ready = False
+        while True:
+            expr = yield (self.await_port_input(port_messages) |
+                          self.await_port_input(port_qubit))
+            if expr.first_term.value:
+                for item in port_messages.rx_input().items:
+                    if len(item) == 2:
+                        # Alice's BellMeasurementProtocol sends untagged outcomes
+                        item = (0,) + tuple(item)
+                    sender, m1, m2 = item
+                    pending.setdefault(sender, []).append((m1, m2))
+            else:
+                qubit_ready = True
+            if qubit_ready and len(pending) == self.num_senders:
+                if self.accountant is not None:
+                    self.accountant.observe_memory(self.node.qmemory, [0], "correction")
+                z_correction = x_correction = 0
+                for sender in list(pending):
+                    m1, m2 = pending[sender].pop(0)
+                    z_correction ^= m1
+                    x_correction ^= m2
+                    if not pending[sender]:
+                        del pending[sender]
+                # Operate directly, so no outcomes of the next round are missed
+                if z_correction:
+                    self.node.qmemory.operate(ns.Z, positions=[0])
+                if x_correction:
+                    self.node.qmemory.operate(ns.X, positions=[0])
+                self.send_signal(Signals.SUCCESS, 0)
+                qubit_ready = False
+
+
+class RepeaterChain:
+    """Builder of a linear repeater chain with end-to-end teleportation.
+
+    The network, protocols and fidelity collector are built once, on first
+    access or run, and reused by every run: between runs the protocols and
+    the collector are stopped, the simulator and the components are reset,
+    and the protocols restarted with the collector streaming into a new
+    aggregator.
+
+    Parameters
+    ----------
+    num_nodes : int
+        Number of nodes including Alice and Bob, at least 2.
+    total_length : float, optional
+        End to end length of the chain [km].
+    depolar_rate : float, optional
+        Depolarization rate of qubits in memory.
+    dephase_rate : float, optional
+        Dephasing rate of physical measurement instruction.
+    source_frequency : float or None, optional
+        Frequency of the midpoint sources [Hz]. Defaults to the frequency
+        ``telp.example_network_setup`` uses for a single link of ``total_length``,
+        so a round completes before the next starts.
+
+    """
+
+    def __init__(self, num_nodes, total_length=4e-3, depolar_rate=1e7, dephase_rate=0.2,
+                 source_frequency=None):
+        if num_nodes < 2:
+            raise ValueError("A repeater chain needs at least 2 nodes")
+        self.num_nodes = num_nodes
+        self.total_length = total_length
+        self.depolar_rate = depolar_rate
+        self.dephase_rate = dephase_rate
+        self.source_frequency = (4e4 / total_length if source_frequency is None
+                                 else source_frequency)
+        self.registro_swap = []
+        self.build_time = None
+        self._network = None
+        self._protocols = None
+        self._collector = None
+
+    @property
+    def link_length(self):
+        """float: Length of a single link [km]."""
+        return self.total_length / (self.num_nodes - 1)
+
+    @property
+    def network(self):
+        """:class:`~netsquid.nodes.network.Network`: The chain, built once on first access."""
+        if self._network is None:
+            self.build()
+        return self._network
+
+    def _node_name(self, index):
+        if index == 0:
+            return "Alice"
+        if index == self.num_nodes - 1:
+            return "Bob"
+        return f"Node_{index}"
+
+    def _components(self):
+        # Every component of the network, to reset
+        stack = (list(self._network.nodes.values()) +
+                 list(self._network.connections.values()))
+        while stack:
+            component = stack.pop()
+            yield component
+            stack.extend(component.subcomponents.values())
+
+    def build(self):
+        """Build the network and protocols of the chain.
+
+        Returns
+        -------
+        :class:`~netsquid.nodes.network.Network`
+            The chain network.
+
+        """
+        start = time.perf_counter()
+        network = Network(f"Repeater_chain_{self.num_nodes}")
+        nodes = [Node(self._node_name(index),
+                      qmemory=create_processor(self.depolar_rate, self.dephase_rate))
+                 for index in range(self.num_nodes)]
+        network.add_nodes(nodes)
+        last = self.num_nodes - 1
+        for index, (left, right) in enumerate(zip(nodes[:-1], nodes[1:])):
+            # Alice uses the port names of telp, so her protocol can be reused
+            right_qport = "qin_charlie" if index == 0 else "qin_right"
+            right_cport = "cout_bob" if index == 0 else "cout_right"
+            network.add_connection(left, right, connection=ClassicalConnection(
+                length=self.link_length, name=f"ClassicalConnection_{index}"),
+                label=f"classical_{index}", port_name_node1=right_cport,
+                port_name_node2="cin_left")
+            network.add_connection(left, right, connection=EntanglingConnection(
+                length=self.link_length, source_frequency=self.source_frequency,
+                name=f"EntanglingConnection_{index}"),
+                label=f"quantum_{index}", port_name_node1=right_qport,
+                port_name_node2="qin_left")
+            # Alice keeps y0 in position 0 and intermediate nodes their left qubit
+            left.ports[right_qport].forward_input(left.qmemory.ports["qin1"])
+            right.ports["qin_left"].forward_input(right.qmemory.ports["qin0"])
+        for node in nodes[1:-1]:
+            # Outcomes from the left are passed on to the right as they arrive
+            node.ports["cin_left"].bind_input_handler(node.ports["cout_right"].tx_output)
+        self._protocols = ([BellMeasurementProtocol(nodes[0])] +
+                           [SwapProtocol(nodes[index], index, swap_log=self.registro_swap)
+                            for index in range(1, last)] +
+                           [ChainCorrectionProtocol(nodes[last], num_senders=last)])
+        self._collector = FidelityCollector(self._collect_teleport_data, None, self.num_nodes)
+        self._network = network
+        self.build_time = time.perf_counter() - start
+        return network
+
+    @staticmethod
+    def _collect_teleport_data(evexpr):
+        protocol = evexpr.triggered_events[-1].source
+        mem_pos = protocol.get_signal_result(Signals.SUCCESS)
+        qubit, = protocol.node.qmemory.pop(mem_pos)
+        fidelity = qapi.fidelity(qubit, ns.y0, squared=True)
+        qapi.discard(qubit)
+        return {"fidelity": fidelity, "time": ns.sim_time()}
+
+    def run(self, num_runs, accountant=None):
+        """Run the chain for a number of source cycles.
+
+        Resets the simulator and the components of the chain first, the chain
+        itself is only built by the first run.
+
+        Parameters
+        ----------
+        num_runs : int
+            Number of source cycles to simulate.
+        accountant : :class:`~qstate_accounting.StateAccountant` or None, optional
+            If given, a run labelled by the number of nodes is started in it,
+            and the protocols account the states of the qubits they hold at
+            the "bell_measurement", "swap" and "correction" steps.
+
+        Returns
+        -------
+        dict
+            ``num_nodes``, ``teleports`` completed, ``rate`` of end-to-end
+            teleportation per simulated second, mean ``fidelity`` and its ``sem``,
+            ``swaps`` performed, and the ``build_time`` and ``wall_time`` [s].
+            With an accountant also the ``peak_state_qubits`` of the largest
+            merged state and the ``peak_step`` it was reached in.
+
+        """
+        if self._network is None:
+            self.build()
+        self._collector.dismiss()
+        for protocol in self._protocols:
+            protocol.stop()
+        ns.sim_reset()
+        for component in self._components():
+            component.reset()
+        self.registro_swap.clear()
+        aggregator = self._collector.aggregator = SweepAggregator(key_name="num_nodes")
+        self._collector.collect_on(pydynaa.EventExpression(
+            source=self._protocols[-1], event_type=Signals.SUCCESS.value))
+        if accountant is not None:
+            accountant.start_run(self.num_nodes)
+        for protocol in self._protocols:
+            protocol.accountant = accountant
+            protocol.start()
+        start = time.perf_counter()
+        ns.sim_run(1e9 / self.source_frequency * num_runs + 1)
+        wall_time = time.perf_counter() - start
+        stats = aggregator.stats(self.num_nodes)
+        teleports = stats.count
+        result = {
+            "num_nodes": self.num_nodes,
+            "teleports": teleports,
+            "rate": teleports / (ns.sim_time() * 1e-9) if ns.sim_time() > 0 else 0.,
+            "fidelity": stats.mean if teleports else float("nan"),
+            "sem": stats.sem,
+            "swaps": len(self.registro_swap),
+            "build_time": self.build_time,
+            "wall_time": wall_time,
+        }
+        if accountant is not None:
+            peak = accountant.runs[-1]
+            result.update(peak_state_qubits=peak["peak_state_qubits"],
+                          peak_step=peak["peak_step"])
+        return result
+
+
+if __name__ == '__main__':
+    for num_nodes in (2, 3, 5, 10, 50, 200):
+        print(RepeaterChain(num_nodes, total_length=4e-2, depolar_rate=1e6).run(num_runs=100))
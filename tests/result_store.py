@@ -0,0 +1,299 @@
+"""On-disk columnar store of sweep results.
+
+Every completed sweep point is written as soon as it is done, one ``.npy``
+file per column, and recorded in an append-only index keyed by a hash of the
+point's parameters. A restarted sweep skips the points already in the store,
+and reading memory-maps the column files, so aggregating result sets larger
+than the available memory only ever holds one chunk at a time.
+
+Layout of a store directory::
+
+    index.jsonl                 one line per completed point, with its metadata
+    <key>.<column>.npy          column data of a point
+
+Example
+-------
+
+>>> store = ResultStore("results")  # doctest: +SKIP
+>>> params = {"depolar_rate": 1e6, "distance": 4e-3}
+>>> if params not in store:  # doctest: +SKIP
+...     store.write(params, {"fidelity": fidelities})
+>>> store.aggregate([params]).dataframe  # doctest: +SKIP
+
+"""
+import hashlib
+import json
+import numbers
+import os
+
+import numpy as np
+
+__all__ = [
+    "point_key",
+    "ResultStore",
+]
+
+_INDEX_FILE = "index.jsonl"
+
+
+def _normalise(value):
+    # Numbers as float whatever their type, so 0, 0.0 and numpy scalars share a key
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, bool) or value is None or isinstance(value, str):
+        return value
+    if isinstance(value, numbers.Real):
+        return float(value)
+    if isinstance(value, dict):
+        return {str(key): _normalise(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return [_normalise(item) for item in value]
+    return value
+
+
+def point_key(params):
+    """Key of a sweep point.
+
+    Parameters
+    ----------
+    params : dict
+        JSON serialisable parameters of the point, numbers may be numpy scalars.
+
+    Returns
+    -------
+    str
+        Hash of the parameters, independent of their order and of the type of
+        numbers: ``{"depolar_rate": 0}`` and ``{"depolar_rate": 0.0}`` share a key.
+
+    Examples
+    --------
+    >>> point_key({"depolar_rate": 0}) == point_key({"depolar_rate": np.float64(0.)})
+    True
+
+    """
+    encoded = json.dumps(_normalise(params), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(encoded.encode()).hexdigest()
+
+
+class ResultStore:
+    """Directory of sweep results, one entry per completed point.
+
+    Parameters
+    ----------
+    path : str
+        Directory of the store, created if it does not exist.
+
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._entries = {}
+        self._partial_line = False
+        index_path = os.path.join(path, _INDEX_FILE)
+        if os.path.exists(index_path):
+            with open(index_path) as index:
+                for line in index:
+                    self._partial_line = not line.endswith("\n")
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # Line of a point that was interrupted while being recorded
+                        continue
+                    self._entries[entry["key"]] = entry
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, params):
+        return point_key(params) in self._entries
+
+    def points(self):
+        """Parameters of all points in the store.
+
+        Returns
+        -------
+        list of dict
+            Parameters of each point, in the order they were written.
+
+        """
+        return [entry["params"] for entry in self._entries.values()]
+
+    def columns(self, params):
+        """Names of the columns stored for a point.
+
+        Parameters
+        ----------
+        params : dict
+            Parameters of the point.
+
+        Returns
+        -------
+        list of str
+            The column names, sorted.
+
+        """
+        return list(self._entry(params)["columns"])
+
+    def metadata(self, params):
+        """Metadata stored with a point.
+
+        Parameters
+        ----------
+        params : dict
+            Parameters of the point.
+
+        Returns
+        -------
+        dict
+            The metadata given to :meth:`write`, empty if none was.
+
+        """
+        return dict(self._entry(params).get("metadata", {}))
+
+    def _entry(self, params):
+        key = point_key(params)
+        if key not in self._entries:
+            raise KeyError(f"No results stored for {params}")
+        return self._entries[key]
+
+    def _column_path(self, key, column):
+        return os.path.join(self.path, f"{key}.{column}.npy")
+
+    def write(self, params, columns, metadata=None):
+        """Write the results of a completed point.
+
+        The column files are complete before the point is added to the index,
+        so an interrupted write leaves the store consistent.
+
+        Parameters
+        ----------
+        params : dict
+            JSON serialisable parameters of the point.
+        columns : dict
+            Column name to one-dimensional array of results.
+        metadata : dict or None, optional
+            JSON serialisable data of the point as a whole, e.g. its run time.
+
+        """
+        key = point_key(params)
+        lengths = set()
+        for column, values in columns.items():
+            values = np.asarray(values)
+            lengths.add(len(values))
+            path = self._column_path(key, column)
+            with open(path + ".tmp", "wb") as file:
+                np.save(file, values)
+            os.replace(path + ".tmp", path)
+        if len(lengths) > 1:
+            raise ValueError("All columns of a point must have the same length")
+        entry = {"key": key, "params": params, "columns": sorted(columns),
+                 "count": lengths.pop() if lengths else 0}
+        if metadata:
+            entry["metadata"] = metadata
+        with open(os.path.join(self.path, _INDEX_FILE), "a") as index:
+            # Do not append to the line of an interrupted write
+            index.write(("\n" if self._partial_line else "") + json.dumps(entry) + "\n")
+            self._partial_line = False
+            index.flush()
+            os.fsync(index.fileno())
+        self._entries[key] = entry
+
+    def read(self, params, column):
+        """Memory-mapped column of a point.
+
+        Parameters
+        ----------
+        params : dict
+            Parameters of the point.
+        column : str
+            Name of the column.
+
+        Returns
+        -------
+        :class:`numpy.memmap`
+            The column, read from disk only when accessed.
+
+        """
+        return np.load(self._column_path(self._entry(params)["key"], column), mmap_mode="r")
+
+    def iter_chunks(self, points, column, chunk_size=1 << 20):
+        """Iterate over a column of several points in chunks.
+
+        Parameters
+        ----------
+        points : iterable of dict
+            Parameters of the points.
+        column : str
+            Name of the column.
+        chunk_size : int, optional
+            Maximum number of values per chunk.
+
+        Yields
+        ------
+        tuple of (dict, :class:`numpy.ndarray`)
+            Parameters of the point and a chunk of its column.
+
+        """
+        for params in points:
+            values = self.read(params, column)
+            for start in range(0, len(values), chunk_size):
+                yield params, np.asarray(values[start:start + chunk_size])
+
+    def aggregate(self, points, key_name="depolar_rate", column="fidelity",
+                  chunk_size=1 << 20, keep_raw=False):
+        """Running statistics of a column per point, read chunk by chunk.
+
+        Parameters
+        ----------
+        points : iterable of dict
+            Parameters of the points.
+        key_name : str, optional
+            Parameter used as sweep key.
+        column : str, optional
+            Name of the column to aggregate.
+        chunk_size : int, optional
+            Maximum number of values held in memory at once.
+        keep_raw : bool, optional
+            Whether the aggregator also keeps every value, which are then all
+            held in memory.
+
+        Returns
+        -------
+        :class:`~sweep_stats.SweepAggregator`
+            Aggregated statistics per sweep key.
+
+        """
+        from sweep_stats import SweepAggregator
+        aggregator = SweepAggregator(key_name=key_name, value_name=column, keep_raw=keep_raw)
+        for params, chunk in self.iter_chunks(points, column, chunk_size=chunk_size):
+            aggregator.add_many(params[key_name], chunk)
+        return aggregator
+
+    def dataframe(self, points, column="fidelity", param_names=("depolar_rate",)):
+        """Load columns of several points into a single dataframe.
+
+        Parameters
+        ----------
+        points : iterable of dict
+            Parameters of the points.
+        column : str or sequence of str, optional
+            Name of the column, or names of the columns in order.
+        param_names : sequence of str, optional
+            Parameters to add as columns.
+
+        Returns
+        -------
+        :class:`pandas.DataFrame`
+            The columns of all points with their parameters.
+
+        """
+        import pandas
+        columns = [column] if isinstance(column, str) else list(column)
+        frames = [pandas.DataFrame(dict({name: np.asarray(self.read(params, name))
+                                         for name in columns},
+                                        **{name: params[name] for name in param_names}))
+                  for params in points]
+        if not frames:
+            return pandas.DataFrame()
+        return pandas.concat(frames)
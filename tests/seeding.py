@@ -0,0 +1,228 @@
+"""Independent random streams for sweep points and simulation components.
+
+Seeding every sweep point with ``seed + i`` gives overlapping, correlated
+streams across sweeps with nearby seeds, and a single global random state
+shared by all noise and delay models makes results depend on the order in
+which components draw from it. A :class:`SeedTree` derives every stream from
+one root seed with :class:`numpy.random.SeedSequence` spawning instead:
+
+* sweep point ``i`` gets the child sequence with spawn key ``(i,)``, so its
+  streams only depend on the root seed and its index, not on which worker or
+  in which order it runs;
+* within a point, the simulator random state and every random delay model
+  get their own child sequence, keyed by a stable hash of the component path.
+
+Delay models are given their stream through ``model.properties["rng"]``, the
+property ``PingPongDelayModel`` in pingpongtutorial.py and
+:class:`~lossy_link.GeometricSkipDelayModel` draw from. Noise models such as
+``DepolarNoiseModel`` and ``DephaseNoiseModel`` sample through the qubit API,
+which draws from the simulator random state, so their draws come from the
+per-point :func:`simulator_seed` and are not seeded per component.
+
+Example
+-------
+
+>>> tree = SeedTree(42)
+>>> tree.point(3).spawn_key
+(3,)
+>>> tree.point_seed(3) == SeedTree(42).point_seed(3)
+True
+>>> tree.record()["root_entropy"]
+42
+
+"""
+import zlib
+
+import numpy as np
+
+__all__ = [
+    "SeedTree",
+    "component_seed",
+    "iter_component_models",
+    "seed_components",
+    "simulator_seed",
+]
+
+# Spawn key of the simulator random state within a point
+_SIMULATOR_KEY = 0
+
+
+def _name_key(name):
+    # Stable across interpreters, unlike hash(); offset to never collide with _SIMULATOR_KEY
+    return zlib.crc32(name.encode()) + 1
+
+
+def component_seed(point, name):
+    """Seed of a named component within a sweep point.
+
+    Parameters
+    ----------
+    point : :class:`numpy.random.SeedSequence`
+        Sequence of the sweep point, see :meth:`SeedTree.point`.
+    name : str
+        Stable name of the component, e.g. its path in the network.
+
+    Returns
+    -------
+    int
+        32 bit seed of the component.
+
+    """
+    sequence = np.random.SeedSequence(point.entropy,
+                                      spawn_key=tuple(point.spawn_key) + (_name_key(name),))
+    return int(sequence.generate_state(1)[0])
+
+
+class SeedTree:
+    """Tree of seeds derived from one root seed.
+
+    Parameters
+    ----------
+    root_seed : int or None, optional
+        Root seed. If None fresh entropy is drawn from the operating system,
+        which :meth:`record` reports so the run can be repeated.
+
+    """
+
+    def __init__(self, root_seed=None):
+        self.root = np.random.SeedSequence(root_seed)
+
+    @property
+    def entropy(self):
+        """int: Entropy of the root, the seed to pass to repeat the run."""
+        return self.root.entropy
+
+    def point(self, index):
+        """Seed sequence of sweep point ``index``.
+
+        Returns
+        -------
+        :class:`numpy.random.SeedSequence`
+            The sequence, picklable so it can be sent to worker processes.
+
+        """
+        return np.random.SeedSequence(self.root.entropy, spawn_key=(index,))
+
+    def point_seed(self, index):
+        """Seed of the simulator random state of sweep point ``index``.
+
+        Returns
+        -------
+        int
+            32 bit seed, e.g. for ``ns.set_random_state``.
+
+        """
+        return simulator_seed(self.point(index))
+
+    def point_rng(self, index):
+        """Random number generator of sweep point ``index``.
+
+        Returns
+        -------
+        :class:`numpy.random.Generator`
+            Generator seeded from the sequence of the point.
+
+        """
+        return np.random.default_rng(self.point(index))
+
+    def record(self, num_points=0):
+        """Description of the tree, to store next to the results.
+
+        Parameters
+        ----------
+        num_points : int, optional
+            Number of points to include the simulator seeds of.
+
+        Returns
+        -------
+        dict
+            ``root_entropy`` and per point its ``spawn_key`` and ``simulator_seed``.
+
+        """
+        return {"root_entropy": self.entropy,
+                "points": [{"spawn_key": [index], "simulator_seed": self.point_seed(index)}
+                           for index in range(num_points)]}
+
+
+def simulator_seed(point):
+    """Seed of the simulator random state within a sweep point.
+
+    Parameters
+    ----------
+    point : :class:`numpy.random.SeedSequence`
+        Sequence of the sweep point.
+
+    Returns
+    -------
+    int
+        32 bit seed.
+
+    """
+    sequence = np.random.SeedSequence(point.entropy,
+                                      spawn_key=tuple(point.spawn_key) + (_SIMULATOR_KEY,))
+    return int(sequence.generate_state(1)[0])
+
+
+def iter_component_models(components):
+    """Iterate over the models of components and all their subcomponents.
+
+    Parameters
+    ----------
+    components : iterable of :class:`~netsquid.components.component.Component`
+        Top level components, e.g. the nodes and connections of a network.
+
+    Yields
+    ------
+    tuple of (str, :class:`~netsquid.components.models.model.Model`)
+        Path of the model, from component names and the model key, and the model.
+
+    """
+    stack = [(component.name, component) for component in components]
+    while stack:
+        path, component = stack.pop()
+        for key, model in sorted(component.models.items(), key=lambda item: item[0]):
+            if model is not None:
+                yield f"{path}/{key}", model
+        for name, subcomponent in sorted(component.subcomponents.items(),
+                                         key=lambda item: item[0]):
+            stack.append((f"{path}.{name}", subcomponent))
+
+
+def _draws_from_model_rng(model):
+    # Delay models draw from properties["rng"], except the deterministic ones;
+    # noise models use the simulator random state through the qubit API
+    from netsquid.components.models.delaymodels import (DelayModel, FibreDelayModel,
+                                                        FixedDelayModel)
+    return (isinstance(model, DelayModel)
+            and not isinstance(model, (FixedDelayModel, FibreDelayModel)))
+
+
+def seed_components(point, components):
+    """Give every random delay model of the components its own random state.
+
+    Models that do not draw from ``properties["rng"]``, noise models and fixed
+    or fibre delays, are left alone and not recorded.
+
+    Parameters
+    ----------
+    point : :class:`numpy.random.SeedSequence`
+        Sequence of the sweep point.
+    components : iterable of :class:`~netsquid.components.component.Component`
+        Top level components to seed.
+
+    Returns
+    -------
+    dict
+        Seed of every seeded model by path, to record with the results.
+
+    """
+    seeds = {}
+    seen = set()
+    for path, model in iter_component_models(components):
+        if id(model) in seen or not _draws_from_model_rng(model):
+            # Models shared between components, e.g. memory positions, keep one stream
+            continue
+        seen.add(id(model))
+        seeds[path] = component_seed(point, path)
+        model.properties["rng"] = np.random.RandomState(seeds[path])
+    return seeds
@@ -0,0 +1,43 @@
+"""Counts reported by the summaries ``ns.sim_run`` returns.
+
+``ns.sim_run`` returns a summary of the run, whose string form reports the
+simulated time and the number of events triggered. The benchmarks of
+:mod:`bench` and the scenarios that report their own event counts, like
+:mod:`star_network`, read them with :func:`summary_counts`.
+
+"""
+import re
+
+__all__ = [
+    "summary_counts",
+]
+
+_EVENTS_PATTERN = re.compile(r"Triggered events:\s*(\d+)")
+_SIM_TIME_PATTERN = re.compile(r"Elapsed simulation time:\s*([0-9.eE+-]+)")
+
+
+def summary_counts(summaries):
+    """Events triggered and simulated time reported by ``ns.sim_run`` summaries.
+
+    Parameters
+    ----------
+    summaries : iterable
+        Return values of ``ns.sim_run``, or their string form.
+
+    Returns
+    -------
+    tuple of (int, float)
+        Total number of triggered events and simulated time [ns].
+
+    Examples
+    --------
+    >>> summary_counts(["Elapsed simulation time: 9.10e+01 [ns]\\nTriggered events: 27"])
+    (27, 91.0)
+
+    """
+    summaries = [str(summary) for summary in summaries]
+    events = sum(int(match) for summary in summaries
+                 for match in _EVENTS_PATTERN.findall(summary))
+    sim_time = sum(float(match) for summary in summaries
+                   for match in _SIM_TIME_PATTERN.findall(summary))
+    return events, sim_time
@@ -0,0 +1,349 @@
+"""Star network of user pairs served by entanglement sources at a central hub.
+
+In :mod:`telp` and tutorial 3 every source serves exactly two endpoints. Here
+a hub node holds ``num_sources`` sources that are switched among the pairs
+of ``num_users`` users::
+
+    User_0   User_1
+         \\   /
+          Hub ---- User_2
+         /   \\
+    User_5   User_3 ...
+
+Users ``2p`` and ``2p + 1`` form pair ``p``. Every time a source emits a b00
+pair, a scheduling policy picks the user pair it goes to, and its two qubits
+travel over the users' links, each a :class:`HubLink`. Once both qubits of a
+pair arrived their fidelity with b00 is recorded and they are discarded.
+
+:meth:`StarNetwork.run` reports the per-pair rate and fidelity, and how the
+simulation itself scales: the wall time, the number of events triggered and
+the number of qubits in flight. The simulator does not expose the size of its
+event queue; every qubit in flight is a pending delivery in it, so the qubits
+in flight are a proxy and lower bound of the queue size, which also holds the
+clock and emission events of the sources. :func:`scaling_study` repeats this
+for growing numbers of users.
+
+Example
+-------
+
+>>> star = StarNetwork(num_users=10, num_sources=2, policy="least_served")
+>>> print(star.run(num_cycles=100))  # doctest: +SKIP
+
+"""
+import heapq
+import time
+from collections import deque
+
+import numpy as np
+import netsquid as ns
+from netsquid.components.qchannel import QuantumChannel
+from netsquid.components.qsource import QSource, SourceStatus
+from netsquid.components.models.delaymodels import FibreDelayModel, FixedDelayModel
+from netsquid.components.models.qerrormodels import DepolarNoiseModel
+from netsquid.nodes import Node, Connection, Network
+from netsquid.qubits import ketstates as ks
+from netsquid.qubits import qubitapi as qapi
+from netsquid.qubits.state_sampler import StateSampler
+
+from sim_summary import summary_counts
+
+__all__ = [
+    "POLICIES",
+    "HubLink",
+    "StarNetwork",
+    "scaling_study",
+]
+
+#: Scheduling policies choosing the user pair of the next emitted pair.
+POLICIES = ("round_robin", "random", "least_served")
+
+
+class HubLink(Connection):
+    """A connection that carries qubits from the hub (A) to a user (B).
+
+    Parameters
+    ----------
+    length : float
+        Length of the fibre [km].
+    depolar_rate : float, optional
+        Depolarization rate of qubits in the fibre [Hz].
+    name : str, optional
+        Name of this connection.
+
+    """
+
+    def __init__(self, length, depolar_rate=0., name="HubLink"):
+        super().__init__(name=name)
+        models = {"delay_model": FibreDelayModel()}
+        if depolar_rate > 0:
+            models["quantum_noise_model"] = DepolarNoiseModel(depolar_rate=depolar_rate)
+        self.add_subcomponent(QuantumChannel("Channel_A2B", length=length, models=models),
+                              forward_input=[("A", "send")],
+                              forward_output=[("B", "recv")])
+
+
+class StarNetwork:
+    """Builder of a star network of user pairs sharing the sources of a hub.
+
+    Parameters
+    ----------
+    num_users : int
+        Number of users, even and at least 2.
+    link_length : float or array_like, optional
+        Length of the link of every user to the hub [km], or one per user.
+    num_sources : int, optional
+        Number of sources at the hub.
+    source_frequency : float, optional
+        Frequency of every source [Hz].
+    policy : str, optional
+        Scheduling policy, one of :data:`POLICIES`: the pairs in turn, a
+        random pair, or the pair with the fewest pairs sent so far.
+    depolar_rate : float, optional
+        Depolarization rate of qubits in the fibres [Hz].
+    seed : int or None, optional
+        Seed of the random policy and of netsquid's random state.
+
+    """
+
+    def __init__(self, num_users, link_length=1., num_sources=1, source_frequency=1e6,
+                 policy="round_robin", depolar_rate=0., seed=None):
+        if num_users < 2 or num_users % 2:
+            raise ValueError(f"A star network needs an even number of users, at least 2, "
+                             f"not {num_users}")
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown policy {policy!r}, expected one of {POLICIES}")
+        self.num_users = num_users
+        self.num_pairs = num_users // 2
+        self.lengths = np.broadcast_to(np.asarray(link_length, dtype=float), (num_users,))
+        self.num_sources = num_sources
+        self.source_frequency = source_frequency
+        self.policy = policy
+        self.depolar_rate = depolar_rate
+        self.seed = seed
+        self.build_time = None
+        self._network = None
+
+    @property
+    def network(self):
+        """:class:`~netsquid.nodes.network.Network`: The star, built on first access."""
+        if self._network is None:
+            self.build()
+        return self._network
+
+    def build(self):
+        """Build the network and reset the schedule and statistics.
+
+        Returns
+        -------
+        :class:`~netsquid.nodes.network.Network`
+            The star network.
+
+        """
+        start = time.perf_counter()
+        network = Network(f"Star_{self.num_users}")
+        hub = Node("Hub")
+        users = [Node(f"User_{index}") for index in range(self.num_users)]
+        network.add_nodes([hub] + users)
+        for index, user in enumerate(users):
+            network.add_connection(hub, user, connection=HubLink(
+                self.lengths[index], self.depolar_rate, name=f"HubLink_{index}"),
+                label=f"link_{index}", port_name_node1=f"qout_{index}",
+                port_name_node2="qin_hub")
+            user.ports["qin_hub"].bind_input_handler(self._arrival_handler(index))
+        self._hub_ports = [hub.ports[f"qout_{index}"] for index in range(self.num_users)]
+        # The pair chosen for the emission in progress of every source
+        self._emitting = [None] * self.num_sources
+        for index in range(self.num_sources):
+            qsource = QSource(f"qsource_{index}", StateSampler([ks.b00], [1.0]), num_ports=2,
+                              timing_model=FixedDelayModel(delay=1e9 / self.source_frequency),
+                              status=SourceStatus.INTERNAL)
+            hub.add_subcomponent(qsource, name=f"qsource_{index}")
+            for side in (0, 1):
+                qsource.ports[f"qout{side}"].bind_output_handler(
+                    self._emission_handler(index, side))
+        self._reset_schedule()
+        self._network = network
+        self.build_time = time.perf_counter() - start
+        return network
+
+    def _reset_schedule(self):
+        self._rng = np.random.default_rng(self.seed)
+        self._next_pair = 0
+        self._served_heap = [(0, pair) for pair in range(self.num_pairs)]
+        self.sent = np.zeros(self.num_pairs, dtype=np.int64)
+        self.delivered = np.zeros(self.num_pairs, dtype=np.int64)
+        self.fidelity_sum = np.zeros(self.num_pairs)
+        self._arrived = [(deque(), deque()) for _ in range(self.num_pairs)]
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._in_flight_samples = 0
+        self._in_flight_total = 0
+
+    def _choose_pair(self):
+        if self.policy == "round_robin":
+            pair = self._next_pair
+            self._next_pair = (pair + 1) % self.num_pairs
+        elif self.policy == "random":
+            pair = int(self._rng.integers(self.num_pairs))
+        else:
+            count, pair = heapq.heappop(self._served_heap)
+            heapq.heappush(self._served_heap, (count + 1, pair))
+        self.sent[pair] += 1
+        return pair
+
+    def _emission_handler(self, source_index, side):
+        def handle(message):
+            # Both outputs of an emission go to the same pair, whichever comes first
+            pair = self._emitting[source_index]
+            if pair is None:
+                pair = self._emitting[source_index] = self._choose_pair()
+            else:
+                self._emitting[source_index] = None
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            self._in_flight_samples += 1
+            self._in_flight_total += self.in_flight
+            self._hub_ports[2 * pair + side].tx_output(message)
+
+        return handle
+
+    def _arrival_handler(self, user_index):
+        pair, side = divmod(user_index, 2)
+
+        def handle(message):
+            self.in_flight -= 1
+            arrived = self._arrived[pair]
+            arrived[side].append(message.items[0])
+            if arrived[0] and arrived[1]:
+                qubits = [arrived[0].popleft(), arrived[1].popleft()]
+                self.fidelity_sum[pair] += qapi.fidelity(qubits, ks.b00, squared=True)
+                self.delivered[pair] += 1
+                qapi.discard(qubits[0])
+                qapi.discard(qubits[1])
+
+        return handle
+
+    def run(self, num_cycles):
+        """Run the star for a number of source cycles.
+
+        Resets the simulator first.
+
+        Parameters
+        ----------
+        num_cycles : int
+            Number of emissions of every source.
+
+        Returns
+        -------
+        dict
+            ``num_users``, ``num_sources`` and ``policy``; ``pairs`` delivered,
+            their total ``rate`` per simulated second and mean ``fidelity``;
+            ``min_pair_rate`` and ``fairness`` (Jain's index of the pair
+            rates); ``events`` triggered, ``max_in_flight_qubits`` and
+            ``mean_in_flight_qubits`` at emissions, a proxy of the event queue
+            size that leaves out the sources' own events, and the ``build_time`` and
+            ``wall_time`` [s].
+
+        """
+        ns.sim_reset()
+        if self.seed is not None:
+            ns.set_random_state(seed=self.seed)
+        self._network = None
+        self.build()
+        start = time.perf_counter()
+        stats = ns.sim_run(1e9 / self.source_frequency * num_cycles + 1)
+        wall_time = time.perf_counter() - start
+        sim_seconds = ns.sim_time() * 1e-9
+        rates = self.pair_rates(sim_seconds)
+        delivered = int(self.delivered.sum())
+        return {
+            "num_users": self.num_users,
+            "num_sources": self.num_sources,
+            "policy": self.policy,
+            "pairs": delivered,
+            "rate": delivered / sim_seconds if sim_seconds > 0 else 0.,
+            "fidelity": self.fidelity_sum.sum() / delivered if delivered else float("nan"),
+            "min_pair_rate": float(rates.min()),
+            "fairness": (float(rates.sum() ** 2 / (len(rates) * (rates ** 2).sum()))
+                         if rates.any() else float("nan")),
+            "events": summary_counts([stats])[0],
+            "max_in_flight_qubits": self.max_in_flight,
+            "mean_in_flight_qubits": (self._in_flight_total / self._in_flight_samples
+                                      if self._in_flight_samples else 0.),
+            "build_time": self.build_time,
+            "wall_time": wall_time,
+        }
+
+    def pair_rates(self, sim_seconds=None):
+        """Rate of delivered pairs of every user pair.
+
+        Parameters
+        ----------
+        sim_seconds : float or None, optional
+            Simulated time [s], the current simulation time if None.
+
+        Returns
+        -------
+        :class:`numpy.ndarray`
+            Pairs per simulated second.
+
+        """
+        if sim_seconds is None:
+            sim_seconds = ns.sim_time() * 1e-9
+        if sim_seconds <= 0:
+            return np.zeros(self.num_pairs)
+        return self.delivered / sim_seconds
+
+    def pair_dataframe(self):
+        """Statistics of every user pair of the last run.
+
+        Returns
+        -------
+        :class:`pandas.DataFrame`
+            One row per pair with the ``users``, pairs ``sent`` and
+            ``delivered``, their ``rate`` and mean ``fidelity``.
+
+        """
+        import pandas
+        with np.errstate(invalid="ignore", divide="ignore"):
+            fidelity = self.fidelity_sum / self.delivered
+        return pandas.DataFrame({
+            "users": [f"User_{2 * pair}|User_{2 * pair + 1}" for pair in range(self.num_pairs)],
+            "sent": self.sent,
+            "delivered": self.delivered,
+            "rate": self.pair_rates(),
+            "fidelity": fidelity,
+        })
+
+
+def scaling_study(user_counts=(2, 10, 50, 100, 500, 1000), num_cycles=1000, **kwargs):
+    """Run star networks of growing size.
+
+    Parameters
+    ----------
+    user_counts : iterable of int, optional
+        Numbers of users to run.
+    num_cycles : int, optional
+        Number of emissions of every source per run.
+    **kwargs
+        Arguments of :class:`StarNetwork`.
+
+    Returns
+    -------
+    :class:`pandas.DataFrame`
+        One row per number of users, the results of :meth:`StarNetwork.run`
+        with the ``events_per_second`` of wall time.
+
+    """
+    import pandas
+    rows = []
+    for num_users in user_counts:
+        row = StarNetwork(num_users, **kwargs).run(num_cycles)
+        row["events_per_second"] = row["events"] / row["wall_time"] if row["wall_time"] else 0.
+        rows.append(row)
+    return pandas.DataFrame(rows)
+
+
+if __name__ == '__main__':
+    for policy in POLICIES:
+        print(scaling_study(num_sources=4, policy=policy, seed=42).to_string())
@@ -0,0 +1,377 @@
+"""Multi-dimensional sweeps of the teleportation simulation with point caching.
+
+:func:`telp.run_experiment` sweeps the depolarization rate only. A
+:class:`SweepPlanner` takes designs over any of :data:`AXES`, node distance,
+depolarization rate, dephasing rate, source frequency and the fibre loss of
+:class:`telp.LossyEntanglingConnection`, and runs only the points that are not
+in its :class:`~result_store.ResultStore` yet. Points are keyed by their
+parameters and the :func:`code_version` of the simulation, so refining a grid
+only simulates the new points, while changing the simulation code invalidates
+the cached results.
+
+Designs are lists of dicts with a value per axis:
+
+* :func:`grid`, the full factorial design;
+* :func:`latin_hypercube`, stratified random points;
+* :func:`sobol`, a low discrepancy sequence, needs scipy.
+
+Example
+-------
+
+>>> points = grid(depolar_rate=[1e6, 1e7], distance=[4e-3, 8e-3])
+>>> len(points)
+4
+>>> points[1]
+{'depolar_rate': 1000000.0, 'distance': 0.008}
+>>> design = latin_hypercube(4, {"dephase_rate": (0., 0.2)}, seed=1)
+>>> sorted(int(point["dephase_rate"] // 0.05) for point in design)
+[0, 1, 2, 3]
+>>> {"telp.py", "sweep_stats.py", "gate_fusion.py"} <= set(simulation_modules())
+True
+
+Running needs netsquid::
+
+    planner = SweepPlanner(ResultStore("results"), num_runs=1000, seed=42)
+    design = grid(depolar_rate=[1e6, 1e7], source_frequency=[1e7, 2e7])
+    planner.run(design, num_workers=4)
+    planner.summary(design)
+
+"""
+import ast
+import hashlib
+import itertools
+import math
+import os
+
+import numpy as np
+
+__all__ = [
+    "AXES",
+    "grid",
+    "latin_hypercube",
+    "sobol",
+    "simulation_modules",
+    "code_version",
+    "SweepPlanner",
+]
+
+#: Parameters a sweep can vary, with their defaults in :func:`telp.run_experiment`.
+AXES = {"distance": 4e-3, "depolar_rate": 1e7, "dephase_rate": 0.0, "source_frequency": None,
+        "p_loss_init": 0.0, "p_loss_length": 0.0}
+
+# Module whose source, with the local modules it imports, determines the results
+_SIMULATION_MODULE = "telp.py"
+
+
+def _check_axes(names):
+    unknown = set(names) - set(AXES)
+    if unknown:
+        raise ValueError(f"Unknown sweep axes {sorted(unknown)}, expected some of {list(AXES)}")
+
+
+def grid(**axes):
+    """Full factorial design.
+
+    Parameters
+    ----------
+    **axes : list of float
+        Values of every axis to vary.
+
+    Returns
+    -------
+    list of dict
+        Every combination of values, the last axis varying fastest.
+
+    """
+    _check_axes(axes)
+    names = list(axes)
+    return [dict(zip(names, map(float, values)))
+            for values in itertools.product(*axes.values())]
+
+
+def _scale(unit, bounds, log_scale):
+    # Map points of the unit hypercube to the bounds of every axis
+    _check_axes(bounds)
+    points = []
+    for row in unit:
+        point = {}
+        for value, (name, (low, high)) in zip(row, bounds.items()):
+            if name in log_scale:
+                point[name] = float(math.exp(math.log(low) + value * (math.log(high)
+                                                                      - math.log(low))))
+            else:
+                point[name] = float(low + value * (high - low))
+        points.append(point)
+    return points
+
+
+def latin_hypercube(num_points, bounds, seed=None, log_scale=()):
+    """Latin hypercube design: every axis has one point in each of ``num_points`` strata.
+
+    Parameters
+    ----------
+    num_points : int
+        Number of points.
+    bounds : dict
+        ``(low, high)`` of every axis to vary.
+    seed : int or None, optional
+        Seed of the design.
+    log_scale : iterable of str, optional
+        Axes to sample uniformly in the logarithm, e.g. rates spanning decades.
+
+    Returns
+    -------
+    list of dict
+        The points.
+
+    """
+    rng = np.random.default_rng(seed)
+    strata = np.array([rng.permutation(num_points) for _ in bounds]).T.reshape(num_points,
+                                                                               len(bounds))
+    unit = (strata + rng.random((num_points, len(bounds)))) / num_points
+    return _scale(unit, bounds, set(log_scale))
+
+
+def sobol(num_points, bounds, seed=None, log_scale=(), scramble=True):
+    """Design from a (scrambled) Sobol sequence, needs scipy.
+
+    Parameters
+    ----------
+    num_points : int
+        Number of points, preferably a power of two.
+    bounds : dict
+        ``(low, high)`` of every axis to vary.
+    seed : int or None, optional
+        Seed of the scrambling.
+    log_scale : iterable of str, optional
+        Axes to sample uniformly in the logarithm.
+    scramble : bool, optional
+        Whether to scramble the sequence.
+
+    Returns
+    -------
+    list of dict
+        The points. The first points are the same for any ``num_points``, so
+        extending a design only adds points.
+
+    """
+    try:
+        from scipy.stats import qmc
+    except ImportError:
+        raise ImportError("Sobol designs need scipy, use latin_hypercube or grid "
+                          "without it") from None
+    sampler = qmc.Sobol(d=len(bounds), scramble=scramble, seed=seed)
+    return _scale(sampler.random(num_points), bounds, set(log_scale))
+
+
+def simulation_modules(module=_SIMULATION_MODULE):
+    """Source files next to this module that a module imports, directly or not.
+
+    Imports inside functions count too, so lazily imported modules are included.
+
+    Parameters
+    ----------
+    module : str, optional
+        Source file to start from.
+
+    Returns
+    -------
+    list of str
+        The file names, sorted, including ``module``.
+
+    """
+    directory = os.path.dirname(os.path.abspath(__file__))
+    found = set()
+    stack = [module]
+    while stack:
+        name = stack.pop()
+        if name in found:
+            continue
+        found.add(name)
+        with open(os.path.join(directory, name), encoding="utf-8") as file:
+            tree = ast.parse(file.read(), filename=name)
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                imported = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+                imported = [node.module]
+            else:
+                continue
+            for import_name in imported:
+                file_name = f"{import_name.split('.')[0]}.py"
+                if os.path.isfile(os.path.join(directory, file_name)):
+                    stack.append(file_name)
+    return sorted(found)
+
+
+def code_version(modules=None):
+    """Version of the simulation code, a hash of its source.
+
+    Parameters
+    ----------
+    modules : iterable of str or None, optional
+        Source files next to this module that determine the results, the
+        :func:`simulation_modules` of :mod:`telp` if None.
+
+    Returns
+    -------
+    str
+        Short hash of the sources.
+
+    """
+    if modules is None:
+        modules = simulation_modules()
+    digest = hashlib.sha1()
+    directory = os.path.dirname(os.path.abspath(__file__))
+    for module in modules:
+        digest.update(module.encode())
+        with open(os.path.join(directory, module), "rb") as file:
+            digest.update(file.read())
+    return digest.hexdigest()[:12]
+
+
+class SweepPlanner:
+    """Runs designs of teleportation sweep points, skipping points already stored.
+
+    Parameters
+    ----------
+    store : :class:`~result_store.ResultStore`
+        Store of the computed points.
+    num_runs : int
+        Number of cycles per point, the maximum if ``target_sem`` is given.
+    seed : int or None, optional
+        Root seed of a :class:`~seeding.SeedTree`. Points draw from the child
+        keyed by a hash of their parameters, so a point gives the same results
+        whichever design it is part of.
+    formalism : :class:`~netsquid.qubits.qformalism.QFormalism`, str or None, optional
+        Formalism to simulate in, see :func:`telp.run_experiment`.
+    target_sem : float or None, optional
+        Standard error of the mean fidelity to stop every point on.
+    min_runs : int, optional
+        Minimum number of teleportations before stopping on ``target_sem``.
+    version : str or None, optional
+        Code version to key points by, :func:`code_version` if None.
+
+    """
+
+    def __init__(self, store, num_runs, seed=None, formalism=None, target_sem=None,
+                 min_runs=100, version=None):
+        self.store = store
+        self.num_runs = num_runs
+        self.seed = seed
+        self.formalism = formalism
+        self.target_sem = target_sem
+        self.min_runs = min_runs
+        self.version = code_version() if version is None else version
+
+    def params(self, point):
+        """Parameters a point is stored under.
+
+        Parameters
+        ----------
+        point : dict
+            Values of the axes to vary, the others take their default.
+
+        Returns
+        -------
+        dict
+            The parameters, including the code version and seed, as
+            :func:`telp.run_experiment` stores its points.
+
+        """
+        from telp import _point_params
+        _check_axes(point)
+        values = dict(AXES, **point)
+        return _point_params(self.num_runs, values["depolar_rate"], values["distance"],
+                             values["dephase_rate"], self.formalism, self.target_sem,
+                             values["source_frequency"], self.seed, values["p_loss_init"],
+                             values["p_loss_length"], self.version)
+
+    def missing(self, points):
+        """Points of a design that are not stored yet.
+
+        Parameters
+        ----------
+        points : list of dict
+            The design.
+
+        Returns
+        -------
+        list of dict
+            The points to simulate, without duplicates.
+
+        """
+        missing = {}
+        for point in points:
+            params = self.params(point)
+            key = tuple(sorted(params.items()))
+            if params not in self.store and key not in missing:
+                missing[key] = point
+        return list(missing.values())
+
+    def _point_args(self, point):
+        # Arguments of telp._run_sweep_point, seeded by the point's parameters
+        from result_store import point_key
+        values = dict(AXES, **point)
+        seed = None
+        if self.seed is not None:
+            from seeding import SeedTree
+            seed = SeedTree(self.seed).point(int(point_key(self.params(point))[:8], 16))
+        return (self.num_runs, values["depolar_rate"], values["distance"],
+                values["dephase_rate"], seed, True, True, self.formalism, self.target_sem,
+                self.min_runs, values["source_frequency"], values["p_loss_init"],
+                values["p_loss_length"])
+
+    def run(self, points, num_workers=None):
+        """Simulate the missing points of a design and store them.
+
+        Parameters
+        ----------
+        points : list of dict
+            The design.
+        num_workers : int or None, optional
+            Number of worker processes, see :func:`telp.run_experiment`.
+
+        Returns
+        -------
+        int
+            Number of points simulated.
+
+        """
+        from telp import _run_sweep_points
+        missing = self.missing(points)
+        point_args = [self._point_args(point) for point in missing]
+        for index, aggregator in _run_sweep_points(point_args, num_workers):
+            depolar_rate = point_args[index][1]
+            self.store.write(self.params(missing[index]),
+                             {"fidelity": np.array(aggregator.raw_values(depolar_rate))})
+        return len(missing)
+
+    def summary(self, points, column="fidelity"):
+        """Statistics of every stored point of a design.
+
+        Parameters
+        ----------
+        points : list of dict
+            The design, all of it stored.
+        column : str, optional
+            Column to summarise.
+
+        Returns
+        -------
+        :class:`pandas.DataFrame`
+            One row per point, with a column per axis, ``count``, the mean
+            (named after the column), ``var``, ``sem``, ``min`` and ``max``.
+
+        """
+        import pandas
+        from sweep_stats import RunningStats
+        rows = []
+        for point in points:
+            stats = RunningStats()
+            for _, chunk in self.store.iter_chunks([self.params(point)], column):
+                stats.add_many(chunk)
+            rows.append(dict(dict(AXES, **point), count=stats.count, **{column: stats.mean},
+                             var=stats.variance, sem=stats.sem, min=stats.min, max=stats.max))
+        return pandas.DataFrame(rows, columns=list(AXES) + ["count", column, "var", "sem",
+                                                            "min", "max"])
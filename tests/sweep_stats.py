@@ -0,0 +1,591 @@
+"""Streaming statistics for parameter sweeps of the teleportation example.
+
+Sweep results are reduced on the fly to a running count, mean, variance,
+minimum and maximum per sweep key (Welford's online algorithm), so the memory
+needed does not grow with the number of teleportations simulated.
+
+Example
+-------
+
+>>> aggregator = SweepAggregator(key_name="depolar_rate")
+>>> for fidelity in (1.0, 0.9, 0.8):
+...     aggregator.add(1e6, fidelity)
+>>> aggregator.stats(1e6).mean
+0.9
+
+"""
+import math
+
+__all__ = [
+    "RunningStats",
+    "SweepAggregator",
+    "LatencyHistogram",
+    "ThroughputMetrics",
+    "next_chunk_size",
+    "sem_for_ci_width",
+]
+
+
+class RunningStats:
+    """Running count, mean, variance, minimum and maximum of a stream of values.
+
+    Uses Welford's algorithm for single values and the pairwise update of
+    Chan et al. to merge batches or partial results from other processes.
+
+    """
+    __slots__ = ("count", "mean", "_m2", "min", "max")
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.
+        self._m2 = 0.
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value):
+        """Add a single value.
+
+        Parameters
+        ----------
+        value : float
+            Value to add.
+
+        """
+        value = float(value)
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def add_many(self, values):
+        """Add a batch of values at once.
+
+        Parameters
+        ----------
+        values : array_like
+            Values to add.
+
+        """
+        import numpy as np
+        values = np.asarray(values, dtype=float).ravel()
+        if values.size == 0:
+            return
+        batch = RunningStats()
+        batch.count = int(values.size)
+        batch.mean = float(values.mean())
+        batch._m2 = float(((values - batch.mean) ** 2).sum())
+        batch.min = float(values.min())
+        batch.max = float(values.max())
+        self.merge(batch)
+
+    def merge(self, other):
+        """Merge the statistics of another stream into this one.
+
+        Parameters
+        ----------
+        other : :class:`RunningStats`
+            Statistics to merge.
+
+        """
+        if other.count == 0:
+            return
+        if self.count == 0:
+            self.count, self.mean, self._m2 = other.count, other.mean, other._m2
+            self.min, self.max = other.min, other.max
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self._m2 += other._m2 + delta ** 2 * self.count * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @property
+    def variance(self):
+        """float: Sample variance (``ddof=1``), NaN for fewer than two values."""
+        if self.count < 2:
+            return math.nan
+        return self._m2 / (self.count - 1)
+
+    @property
+    def std(self):
+        """float: Sample standard deviation."""
+        return math.sqrt(self.variance)
+
+    @property
+    def sem(self):
+        """float: Standard error of the mean, as computed by :meth:`pandas.Series.sem`."""
+        if self.count < 2:
+            return math.nan
+        return self.std / math.sqrt(self.count)
+
+
+class SweepAggregator:
+    """Per sweep key running statistics of a single measured quantity.
+
+    Parameters
+    ----------
+    key_name : str, optional
+        Name of the swept parameter, used as column name in :attr:`dataframe`.
+    value_name : str, optional
+        Name of the aggregated quantity, used as column name for the mean.
+    keep_raw : bool, optional
+        Whether to also keep every added value, see :attr:`raw_dataframe`.
+        Memory then grows linearly with the number of values.
+
+    Attributes
+    ----------
+    metadata : dict
+        Description of how the values were produced, e.g. the seeds used,
+        merged along with the statistics and copied to ``DataFrame.attrs``.
+
+    """
+
+    def __init__(self, key_name="depolar_rate", value_name="fidelity", keep_raw=False):
+        self.key_name = key_name
+        self.value_name = value_name
+        self.keep_raw = keep_raw
+        self.metadata = {}
+        self._stats = {}
+        self._raw = {}
+
+    def __len__(self):
+        return len(self._stats)
+
+    def keys(self):
+        """Sweep keys in the order they were first added.
+
+        Returns
+        -------
+        list
+            Sweep keys.
+
+        """
+        return list(self._stats)
+
+    def stats(self, key):
+        """Running statistics of a sweep key, created empty if not present.
+
+        Parameters
+        ----------
+        key : hashable
+            Sweep key.
+
+        Returns
+        -------
+        :class:`RunningStats`
+            Statistics for this key.
+
+        """
+        try:
+            return self._stats[key]
+        except KeyError:
+            stats = self._stats[key] = RunningStats()
+            return stats
+
+    def add(self, key, value):
+        """Add a single value for a sweep key.
+
+        Parameters
+        ----------
+        key : hashable
+            Sweep key.
+        value : float
+            Value to add.
+
+        """
+        self.stats(key).add(value)
+        if self.keep_raw:
+            self._raw.setdefault(key, []).append(float(value))
+
+    def add_many(self, key, values):
+        """Add a batch of values for a sweep key.
+
+        Parameters
+        ----------
+        key : hashable
+            Sweep key.
+        values : array_like
+            Values to add.
+
+        """
+        self.stats(key).add_many(values)
+        if self.keep_raw:
+            self._raw.setdefault(key, []).extend(float(value) for value in values)
+
+    def raw_values(self, key):
+        """Raw values added for a sweep key, if ``keep_raw`` was set.
+
+        Parameters
+        ----------
+        key : hashable
+            Sweep key.
+
+        Returns
+        -------
+        list of float
+            The values in the order they were added.
+
+        """
+        if not self.keep_raw:
+            raise RuntimeError("Raw values were not kept, create the aggregator "
+                               "with keep_raw=True")
+        return self._raw.get(key, [])
+
+    def merge(self, other):
+        """Merge another aggregator, e.g. returned by a worker process.
+
+        Parameters
+        ----------
+        other : :class:`SweepAggregator`
+            Aggregator to merge into this one.
+
+        """
+        for key, stats in other._stats.items():
+            self.stats(key).merge(stats)
+        if self.keep_raw:
+            for key, values in other._raw.items():
+                self._raw.setdefault(key, []).extend(values)
+        for name, value in other.metadata.items():
+            if isinstance(value, dict) and isinstance(self.metadata.get(name), dict):
+                self.metadata[name].update(value)
+            else:
+                self.metadata[name] = value
+
+    @property
+    def dataframe(self):
+        """:class:`pandas.DataFrame`: One row of aggregates per sweep key.
+
+        Columns are the key, ``count``, the mean (named after the value),
+        ``var``, ``sem``, ``min`` and ``max``.
+
+        """
+        import pandas
+        rows = [{self.key_name: key, "count": stats.count, self.value_name: stats.mean,
+                 "var": stats.variance, "sem": stats.sem, "min": stats.min, "max": stats.max}
+                for key, stats in self._stats.items()]
+        df = pandas.DataFrame(rows, columns=[self.key_name, "count", self.value_name,
+                                             "var", "sem", "min", "max"])
+        df.attrs.update(self.metadata)
+        return df
+
+    @property
+    def raw_dataframe(self):
+        """:class:`pandas.DataFrame`: Every added value, if ``keep_raw`` was set."""
+        if not self.keep_raw:
+            raise RuntimeError("Raw values were not kept, create the aggregator "
+                               "with keep_raw=True")
+        import pandas
+        frames = [pandas.DataFrame({self.value_name: values, self.key_name: key})
+                  for key, values in self._raw.items()]
+        if not frames:
+            df = pandas.DataFrame(columns=[self.value_name, self.key_name])
+        else:
+            df = pandas.concat(frames, ignore_index=True)
+        df.attrs.update(self.metadata)
+        return df
+
+
+class LatencyHistogram:
+    """Histogram of latencies in fixed log-linear buckets (HDR histogram style).
+
+    Every power of two between ``lowest`` and ``highest`` is split into
+    ``2 ** significant_bits`` linear buckets, so percentiles have a relative
+    error of at most ``2 ** -significant_bits`` and memory is fixed however
+    many values are recorded. Values below ``lowest`` or above ``highest``
+    are counted in the first or last bucket.
+
+    Parameters
+    ----------
+    lowest : float, optional
+        Smallest value to resolve.
+    highest : float, optional
+        Largest value to resolve.
+    significant_bits : int, optional
+        Binary digits of resolution within every power of two.
+
+    >>> histogram = LatencyHistogram()
+    >>> histogram.add_many(range(1, 1001))
+    >>> histogram.count, histogram.min, histogram.max
+    (1000, 1.0, 1000.0)
+    >>> abs(histogram.percentile(50) - 500) / 500 < 2 ** -7
+    True
+    >>> abs(histogram.percentile(99) - 990) / 990 < 2 ** -7
+    True
+
+    """
+
+    def __init__(self, lowest=1., highest=1e12, significant_bits=7):
+        self.lowest = lowest
+        self.highest = highest
+        self.significant_bits = significant_bits
+        self._sub_buckets = 1 << significant_bits
+        self._exponents = math.ceil(math.log2(highest / lowest)) + 1
+        self._counts = [0] * (self._exponents * self._sub_buckets)
+        self.stats = RunningStats()
+
+    @property
+    def count(self):
+        """int: Number of recorded values."""
+        return self.stats.count
+
+    @property
+    def min(self):
+        """float: Smallest recorded value."""
+        return self.stats.min
+
+    @property
+    def max(self):
+        """float: Largest recorded value."""
+        return self.stats.max
+
+    @property
+    def mean(self):
+        """float: Mean of the recorded values, exact rather than from the buckets."""
+        return self.stats.mean
+
+    def _index(self, value):
+        scaled = max(value / self.lowest, 1.)
+        mantissa, exponent = math.frexp(scaled)
+        # scaled = 2 ** (exponent - 1) * (1 + fraction), fraction in [0, 1)
+        fraction = 2. * mantissa - 1.
+        index = (exponent - 1) * self._sub_buckets + int(fraction * self._sub_buckets)
+        return min(index, len(self._counts) - 1)
+
+    def _value(self, index):
+        # Midpoint of a bucket
+        exponent, sub_bucket = divmod(index, self._sub_buckets)
+        return self.lowest * 2. ** exponent * (1. + (sub_bucket + .5) / self._sub_buckets)
+
+    def add(self, value):
+        """Record a single value.
+
+        Parameters
+        ----------
+        value : float
+            Value to record.
+
+        """
+        self._counts[self._index(value)] += 1
+        self.stats.add(value)
+
+    def add_many(self, values):
+        """Record a batch of values.
+
+        Parameters
+        ----------
+        values : array_like
+            Values to record.
+
+        """
+        import numpy as np
+        values = np.asarray(values, dtype=float).ravel()
+        if values.size == 0:
+            return
+        mantissas, exponents = np.frexp(np.maximum(values / self.lowest, 1.))
+        indices = ((exponents - 1) * self._sub_buckets
+                   + ((2. * mantissas - 1.) * self._sub_buckets).astype(int))
+        indices = np.minimum(indices, len(self._counts) - 1)
+        for index, count in zip(*np.unique(indices, return_counts=True)):
+            self._counts[int(index)] += int(count)
+        self.stats.add_many(values)
+
+    def merge(self, other):
+        """Merge a histogram with the same buckets, e.g. from a worker process.
+
+        Parameters
+        ----------
+        other : :class:`LatencyHistogram`
+            Histogram to merge into this one.
+
+        """
+        if (other.lowest, other.highest, other.significant_bits) != \
+                (self.lowest, self.highest, self.significant_bits):
+            raise ValueError("Cannot merge histograms with different buckets")
+        self._counts = [mine + theirs for mine, theirs in zip(self._counts, other._counts)]
+        self.stats.merge(other.stats)
+
+    def percentile(self, q):
+        """Value below which ``q`` percent of the recorded values lie.
+
+        Parameters
+        ----------
+        q : float
+            Percentile, between 0 and 100.
+
+        Returns
+        -------
+        float
+            Midpoint of the bucket of the percentile, within the recorded
+            minimum and maximum. NaN if nothing was recorded.
+
+        """
+        if self.count == 0:
+            return math.nan
+        rank = max(math.ceil(q / 100. * self.count), 1)
+        seen = 0
+        for index, count in enumerate(self._counts):
+            seen += count
+            if seen >= rank:
+                return min(max(self._value(index), self.min), self.max)
+        return self.max
+
+
+class ThroughputMetrics:
+    """Throughput and latency of completed operations, e.g. teleportations.
+
+    Parameters
+    ----------
+    **histogram_kwargs
+        Arguments of the :class:`LatencyHistogram` of latencies [ns].
+
+    Attributes
+    ----------
+    latency : :class:`LatencyHistogram`
+        Latencies of the completed operations [ns].
+    sim_time : float
+        Simulated time the operations completed in [ns].
+    wall_time : float
+        Wall clock time spent simulating [s].
+
+    >>> metrics = ThroughputMetrics()
+    >>> for latency in (40., 50., 60.):
+    ...     metrics.record(latency)
+    >>> metrics.sim_time, metrics.wall_time = 300., 1e-3
+    >>> metrics.per_sim_second, metrics.per_wall_second
+    (10000000.0, 3000.0)
+
+    """
+
+    def __init__(self, **histogram_kwargs):
+        self.latency = LatencyHistogram(**histogram_kwargs)
+        self.sim_time = 0.
+        self.wall_time = 0.
+
+    @property
+    def count(self):
+        """int: Number of completed operations."""
+        return self.latency.count
+
+    def record(self, latency):
+        """Record a completed operation.
+
+        Parameters
+        ----------
+        latency : float
+            Time from its start to its completion [ns].
+
+        """
+        self.latency.add(latency)
+
+    def merge(self, other):
+        """Merge the metrics of a run in parallel, adding up the simulated and wall times.
+
+        Parameters
+        ----------
+        other : :class:`ThroughputMetrics`
+            Metrics to merge into these.
+
+        """
+        self.latency.merge(other.latency)
+        self.sim_time += other.sim_time
+        self.wall_time += other.wall_time
+
+    @property
+    def per_sim_second(self):
+        """float: Completed operations per simulated second."""
+        return self.count * 1e9 / self.sim_time if self.sim_time > 0 else math.nan
+
+    @property
+    def per_wall_second(self):
+        """float: Completed operations per wall clock second."""
+        return self.count / self.wall_time if self.wall_time > 0 else math.nan
+
+    def summary(self):
+        """Metrics as a flat dict, e.g. for a row of a dataframe.
+
+        Returns
+        -------
+        dict
+            ``count``, ``per_sim_second``, ``per_wall_second`` and the mean,
+            p50 and p99 latency [ns].
+
+        """
+        return {"count": self.count, "per_sim_second": self.per_sim_second,
+                "per_wall_second": self.per_wall_second, "latency_mean": self.latency.mean,
+                "latency_p50": self.latency.percentile(50),
+                "latency_p99": self.latency.percentile(99)}
+
+
+def next_chunk_size(stats, target_sem, min_count=100, max_count=None):
+    """Number of values to simulate next to reach a target standard error.
+
+    Used for sequential stopping: simulate a chunk, add its values to
+    ``stats`` and ask again, until 0 is returned. The next chunk is sized from
+    the current variance estimate, but at most doubles the count, so an early
+    overestimate of the variance does not spend too many values.
+
+    Parameters
+    ----------
+    stats : :class:`RunningStats`
+        Statistics of the values so far.
+    target_sem : float
+        Standard error of the mean to reach.
+    min_count : int, optional
+        Minimum number of values before the standard error is trusted, at least 2.
+    max_count : int or None, optional
+        Maximum number of values, unlimited if None.
+
+    Returns
+    -------
+    int
+        Number of values to add, 0 once the target or ``max_count`` is reached.
+
+    >>> stats = RunningStats()
+    >>> next_chunk_size(stats, target_sem=0.01, min_count=10)
+    10
+    >>> stats.add_many([0.5, 1.0] * 5)
+    >>> next_chunk_size(stats, target_sem=0.01, min_count=10)
+    10
+    >>> next_chunk_size(stats, target_sem=0.1, min_count=10)
+    0
+
+    """
+    min_count = max(min_count, 2)
+    remaining = math.inf if max_count is None else max_count - stats.count
+    if remaining <= 0:
+        return 0
+    if stats.count < min_count:
+        return int(min(min_count - stats.count, remaining))
+    if stats.sem <= target_sem:
+        return 0
+    needed = math.ceil(stats.variance / target_sem ** 2) - stats.count
+    return int(min(max(needed, 1), stats.count, remaining))
+
+
+def sem_for_ci_width(width, confidence=0.95):
+    """Standard error of the mean that gives a confidence interval of ``width``.
+
+    Parameters
+    ----------
+    width : float
+        Full width of the normal confidence interval of the mean.
+    confidence : float, optional
+        Confidence level of the interval.
+
+    Returns
+    -------
+    float
+        The standard error of the mean.
+
+    >>> print(f"{sem_for_ci_width(0.02):.5f}")
+    0.00510
+
+    """
+    from statistics import NormalDist
+    return width / (2. * NormalDist().inv_cdf(0.5 + confidence / 2.))
@@ -0,0 +1,241 @@
+"""Command line entry point of the teleportation sweep.
+
+Runs a sweep over depolarization rates with one of three backends and writes
+the statistics per rate as CSV:
+
+* ``netsquid``: the discrete event simulation of :mod:`telp`;
+* ``vectorized``: the NumPy engine of :mod:`telp_vectorized`;
+* ``analytic``: the closed-form model of :mod:`telp_analytic`.
+
+Only the modules of the chosen backend are imported, and only once the
+arguments are parsed, so ``--help``, the vectorized and the analytic backends
+start without loading netsquid, pandas or matplotlib. ``--import-report``
+runs the same command under ``python -X importtime`` and summarises which
+imports its startup time goes to.
+
+Usage
+-----
+
+::
+
+    python teleport_sweep.py --backend vectorized --num-runs 10000 --depolar-rates 1e6 1e7
+    python teleport_sweep.py --backend netsquid --workers 4 --store results
+    python teleport_sweep.py --backend netsquid --distance 20 --p-loss-init 0.83 --p-loss-length 0.2
+    python teleport_sweep.py --backend netsquid --import-report
+
+"""
+import argparse
+import csv
+import os
+import re
+import sys
+
+__all__ = [
+    "BACKENDS",
+    "run_sweep",
+    "import_report",
+    "main",
+]
+
+BACKENDS = ("netsquid", "vectorized", "analytic")
+
+_COLUMNS = ("depolar_rate", "count", "fidelity", "var", "sem", "min", "max",
+            "teleports_per_sim_second", "teleports_per_wall_second", "latency_p50",
+            "latency_p99")
+_IMPORT_TIME_PATTERN = re.compile(r"import time:\s*(\d+)\s*\|\s*(\d+)\s*\|(\s*)(\S+)")
+
+
+def _stats_rows(aggregator):
+    # Rows of the statistics per rate, without going through pandas
+    rows = []
+    nan = float("nan")
+    for key in aggregator.keys():
+        stats = aggregator.stats(key)
+        metrics = aggregator.metadata.get("metrics", {}).get(key)
+        rows.append({"depolar_rate": key, "count": stats.count, "fidelity": stats.mean,
+                     "var": stats.variance, "sem": stats.sem, "min": stats.min,
+                     "max": stats.max,
+                     "teleports_per_sim_second": nan if metrics is None else metrics.per_sim_second,
+                     "teleports_per_wall_second": (nan if metrics is None
+                                                   else metrics.per_wall_second),
+                     "latency_p50": nan if metrics is None else metrics.latency.percentile(50),
+                     "latency_p99": nan if metrics is None else metrics.latency.percentile(99)})
+    return rows
+
+
+def run_sweep(backend, num_runs, depolar_rates, distance=4e-3, dephase_rate=0.0, seed=None,
+              num_workers=None, store=None, formalism=None, target_sem=None, p_loss_init=0.,
+              p_loss_length=0.):
+    """Run a sweep over depolarization rates.
+
+    Parameters
+    ----------
+    backend : str
+        One of :data:`BACKENDS`.
+    num_runs : int
+        Number of teleportations per rate. Not used by the analytic backend.
+    depolar_rates : list of float
+        Depolarization rates [Hz].
+    distance : float, optional
+        Distance between nodes [km].
+    dephase_rate : float, optional
+        Dephasing rate of the measurement instruction.
+    seed : int or None, optional
+        Seed of the simulation.
+    num_workers : int or None, optional
+        Worker processes of the netsquid backend.
+    store : str or None, optional
+        Directory of a :class:`~result_store.ResultStore` for the netsquid backend.
+    formalism : str or None, optional
+        Quantum state formalism of the netsquid backend, a ``QFormalism`` name or "auto".
+    target_sem : float or None, optional
+        Stop every rate once the standard error of its mean fidelity is at most
+        this, with ``num_runs`` as maximum. The shots spent are in ``count``.
+    p_loss_init : float, optional
+        Probability of losing a photon when it enters the fibre, netsquid backend only.
+        With loss ``num_runs`` counts mean times between heralded pairs, see
+        :func:`telp.run_experiment`.
+    p_loss_length : float, optional
+        Attenuation of the fibre [dB/km], netsquid backend only.
+
+    Returns
+    -------
+    list of dict
+        Statistics per rate, with the keys ``depolar_rate``, ``count``,
+        ``fidelity``, ``var``, ``sem``, ``min`` and ``max``, and for the netsquid
+        backend the ``teleports_per_sim_second``, ``teleports_per_wall_second``,
+        ``latency_p50`` and ``latency_p99`` [ns], NaN otherwise.
+
+    """
+    if (p_loss_init > 0 or p_loss_length > 0) and backend != "netsquid":
+        raise ValueError(f"The {backend} backend does not model loss, use the netsquid backend")
+    if backend == "analytic":
+        import telp_analytic
+        nan = float("nan")
+        return [dict(dict.fromkeys(_COLUMNS, nan), depolar_rate=rate, count=0,
+                     fidelity=float(telp_analytic.predict_fidelity(distance, rate, dephase_rate)))
+                for rate in depolar_rates]
+    if backend == "vectorized":
+        import telp_vectorized
+        return _stats_rows(telp_vectorized.run_experiment(
+            num_runs, depolar_rates, distance=distance, dephase_rate=dephase_rate, seed=seed,
+            aggregate=True, target_sem=target_sem))
+    if backend == "netsquid":
+        import telp
+        if store is not None:
+            from result_store import ResultStore
+            store = ResultStore(store)
+        if formalism not in (None, "auto"):
+            import netsquid as ns
+            formalism = ns.QFormalism[formalism.upper()]
+        return _stats_rows(telp.run_experiment(
+            num_runs, depolar_rates, distance=distance, dephase_rate=dephase_rate,
+            num_workers=num_workers, seed=seed, aggregate=True, store=store,
+            formalism=formalism, target_sem=target_sem, p_loss_init=p_loss_init,
+            p_loss_length=p_loss_length))
+    raise ValueError(f"Unknown backend {backend!r}")
+
+
+def import_report(argv, top=15):
+    """Summarise the imports of a run of this command.
+
+    Parameters
+    ----------
+    argv : list of str
+        Arguments of the command to report on.
+    top : int, optional
+        Number of top level packages to report.
+
+    Returns
+    -------
+    str
+        Cumulative import time per top level package, largest first, and the
+        total import time.
+
+    """
+    import subprocess
+    command = [sys.executable, "-X", "importtime", os.path.abspath(__file__)] + list(argv)
+    completed = subprocess.run(command, capture_output=True, text=True,
+                               cwd=os.path.dirname(os.path.abspath(__file__)))
+    if completed.returncode != 0:
+        raise RuntimeError(f"Command failed:\n{completed.stderr}")
+    packages = {}
+    for line in completed.stderr.splitlines():
+        match = _IMPORT_TIME_PATTERN.match(line)
+        # Only top level imports: their cumulative time includes their submodules
+        if match is None or len(match.group(3)) != 1:
+            continue
+        package = match.group(4).split(".")[0]
+        packages[package] = packages.get(package, 0) + int(match.group(2))
+    total = sum(packages.values())
+    lines = [f"{'package':30s} {'cumulative [ms]':>16s} {'share':>7s}"]
+    for package, micros in sorted(packages.items(), key=lambda item: item[1],
+                                  reverse=True)[:top]:
+        lines.append(f"{package:30s} {micros / 1e3:16.1f} {micros / total:7.1%}")
+    lines.append(f"{'total':30s} {total / 1e3:16.1f}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backend", choices=BACKENDS, default="netsquid")
+    parser.add_argument("--num-runs", type=int, default=1000,
+                        help="teleportations per depolarization rate (maximum with --target-sem)")
+    parser.add_argument("--target-sem", type=float, default=None,
+                        help="stop every rate once the SEM of its fidelity is at most this")
+    parser.add_argument("--depolar-rates", type=float, nargs="+",
+                        default=[1e6 * i for i in range(0, 200, 10)],
+                        help="depolarization rates [Hz]")
+    parser.add_argument("--distance", type=float, default=4e-3, help="node distance [km]")
+    parser.add_argument("--dephase-rate", type=float, default=0.0)
+    parser.add_argument("--p-loss-init", type=float, default=0.0,
+                        help="probability of losing a photon entering the fibre (netsquid backend)")
+    parser.add_argument("--p-loss-length", type=float, default=0.0,
+                        help="fibre attenuation [dB/km] (netsquid backend)")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--workers", type=int, default=None,
+                        help="worker processes (netsquid backend)")
+    parser.add_argument("--store", default=None,
+                        help="result store directory to resume from (netsquid backend)")
+    parser.add_argument("--formalism", default=None,
+                        help="KET, DM, STAB or auto (netsquid backend)")
+    parser.add_argument("--output", "-o", default=None, help="CSV file, stdout if not given")
+    parser.add_argument("--plot", default=None, help="save a plot of fidelity to this file")
+    parser.add_argument("--import-report", action="store_true",
+                        help="report import times of this command instead of its results")
+    args = parser.parse_args(argv)
+
+    if args.import_report:
+        argv = list(sys.argv[1:] if argv is None else argv)
+        argv.remove("--import-report")
+        print(import_report(argv))
+        return 0
+    rows = run_sweep(args.backend, args.num_runs, args.depolar_rates, distance=args.distance,
+                     dephase_rate=args.dephase_rate, seed=args.seed, num_workers=args.workers,
+                     store=args.store, formalism=args.formalism, target_sem=args.target_sem,
+                     p_loss_init=args.p_loss_init, p_loss_length=args.p_loss_length)
+    if args.output is None:
+        writer = csv.DictWriter(sys.stdout, fieldnames=_COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+    else:
+        with open(args.output, "w", newline="") as file:
+            writer = csv.DictWriter(file, fieldnames=_COLUMNS)
+            writer.writeheader()
+            writer.writerows(rows)
+    if args.plot is not None:
+        import matplotlib
+        matplotlib.use("Agg")
+        from matplotlib import pyplot as plt
+        plt.errorbar([row["depolar_rate"] for row in rows], [row["fidelity"] for row in rows],
+                     yerr=[row["sem"] for row in rows], fmt="o")
+        plt.grid(True)
+        plt.xlabel("depolar_rate")
+        plt.ylabel("fidelity")
+        plt.title("Fidelity of the teleported quantum state")
+        plt.savefig(args.plot)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
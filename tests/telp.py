@@ -75,7 +75,10 @@ This example module is located at: .../netsquid/examples/teleportation.py
 Mean fidelity of teleported state: 1.000
 
 """
-import pandas
+import time
+from collections import deque
+
+import numpy as np
 from netsquid.components.qprocessor import QuantumProcessor, PhysicalInstruction
 from netsquid.nodes import Node, Connection, Network
 from netsquid.protocols.protocol import Signals
@@ -87,24 +90,36 @@ from netsquid.qubits.state_sampler import StateSampler
 from netsquid.components.qprogram import QuantumProgram
 from netsquid.components.models.qerrormodels import DepolarNoiseModel, DephaseNoiseModel
 from netsquid.components.models.delaymodels import FibreDelayModel, FixedDelayModel
-from netsquid.util.datacollector import DataCollector
 import netsquid as ns
 import pydynaa
 from netsquid.qubits import ketstates as ks
 from netsquid.qubits import qubitapi as qapi
 from netsquid.components import instructions as instr
+from seeding import SeedTree, seed_components, simulator_seed
+from sweep_stats import SweepAggregator, ThroughputMetrics, next_chunk_size, sem_for_ci_width
+from formalism_select import program_instructions, select_formalism
+from lossy_link import GeometricSkipDelayModel, heralding_probability
+from gate_fusion import compile_program
+from pauli_frame import PauliFrame, corrected_reference
 
 __all__ = [
     "EntanglingConnection",
+    "LossyEntanglingConnection",
     "ClassicalConnection",
     "InitStateProgram",
     "BellMeasurementProgram",
     "BellMeasurementProtocol",
     "CorrectionProtocol",
+    "PauliFrameCorrectionProtocol",
+    "FidelityCollector",
+    "ReusableTeleportNetwork",
     "create_processor",
+    "fused_teleport_programs",
+    "select_teleport_formalism",
     "example_network_setup",
     "example_sim_setup",
     "run_experiment",
+    "metrics_dataframe",
     "create_plot",
 ]
 
@@ -123,14 +138,18 @@ class EntanglingConnection(Connection):
         Frequency with which midpoint entanglement source generates entanglement [Hz].
     name : str, optional
         Name of this connection.
+    timing_model : :class:`~netsquid.components.models.delaymodels.DelayModel` or None, optional
+        Timing model of the source, a pair every ``1 / source_frequency`` if None.
 
     """
 
-    def __init__(self, length, source_frequency, name="EntanglingConnection"):
+    def __init__(self, length, source_frequency, name="EntanglingConnection",
+                 timing_model=None):
         super().__init__(name=name)
+        if timing_model is None:
+            timing_model = FixedDelayModel(delay=1e9 / source_frequency)
         qsource = QSource(f"qsource_{name}", StateSampler([ks.b00], [1.0]), num_ports=2,
-                          timing_model=FixedDelayModel(delay=1e9 / source_frequency),
-                          status=SourceStatus.INTERNAL)
+                          timing_model=timing_model, status=SourceStatus.INTERNAL)
         self.add_subcomponent(qsource, name="qsource")
         qchannel_c2a = QuantumChannel("qchannel_C2A", length=length / 2,
                                       models={"delay_model": FibreDelayModel()})
@@ -144,6 +163,37 @@ class EntanglingConnection(Connection):
         qsource.ports["qout1"].connect(qchannel_c2b.ports["send"])
 
 
+class LossyEntanglingConnection(EntanglingConnection):
+    """An entangling connection whose photons are lost as in a ``FibreLossModel``.
+
+    The source attempts entanglement at ``source_frequency``, but only the
+    attempts in which both photons survive their half of the connection are
+    simulated: a :class:`~lossy_link.GeometricSkipDelayModel` draws the number
+    of failed attempts before the next heralded pair and the source skips them.
+
+    Parameters
+    ----------
+    length : float
+        End to end length of the connection [km].
+    source_frequency : float
+        Frequency of entanglement attempts of the midpoint source [Hz].
+    p_loss_init : float, optional
+        Probability of losing a photon when it enters the fibre.
+    p_loss_length : float, optional
+        Attenuation of the fibre [dB/km].
+    name : str, optional
+        Name of this connection.
+
+    """
+
+    def __init__(self, length, source_frequency, p_loss_init=0.83, p_loss_length=0.2,
+                 name="LossyEntanglingConnection"):
+        self.p_success = heralding_probability(length, p_loss_init, p_loss_length)
+        super().__init__(length, source_frequency, name=name,
+                         timing_model=GeometricSkipDelayModel(1e9 / source_frequency,
+                                                              self.p_success))
+
+
 class ClassicalConnection(Connection):
     """A connection that transmits classical messages in one direction, from A to B.
 
@@ -164,7 +214,12 @@ class ClassicalConnection(Connection):
                               forward_output=[("B", "recv")])
 
 
-def create_processor(depolar_rate, dephase_rate):
+#: Duration of the physical instructions of :func:`create_processor` [ns].
+INSTRUCTION_DURATIONS = {instr.INSTR_INIT: 3, instr.INSTR_H: 1, instr.INSTR_X: 1, instr.INSTR_Z: 1,
+                         instr.INSTR_S: 1, instr.INSTR_CNOT: 4, instr.INSTR_MEASURE: 7}
+
+
+def create_processor(depolar_rate, dephase_rate, noise_models=None, fuse_gates=False):
     """Factory to create a quantum processor for each end node.
 
     Has two memory positions and the physical instructions necessary
@@ -176,6 +231,12 @@ def create_processor(depolar_rate, dephase_rate):
         Depolarization rate of qubits in memory.
     dephase_rate : float
         Dephasing rate of physical measurement instruction.
+    noise_models : tuple or None, optional
+        Memory and measurement noise models to use instead of creating them
+        from the rates, e.g. to change their rates later.
+    fuse_gates : bool, optional
+        Whether to add the physical instructions of the fused gates of
+        :func:`fused_teleport_programs`.
 
     Returns
     -------
@@ -184,27 +245,47 @@ def create_processor(depolar_rate, dephase_rate):
 
     """
     # We'll give both Alice and Bob the same kind of processor
-    measure_noise_model = DephaseNoiseModel(dephase_rate=dephase_rate,
-                                            time_independent=True)
+    if noise_models is None:
+        noise_models = _noise_models(depolar_rate, dephase_rate)
+    memory_noise_model, measure_noise_model = noise_models
+    durations = INSTRUCTION_DURATIONS
     physical_instructions = [
-        PhysicalInstruction(instr.INSTR_INIT, duration=3, parallel=True),
-        PhysicalInstruction(instr.INSTR_H, duration=1, parallel=True, topology=[0, 1]),
-        PhysicalInstruction(instr.INSTR_X, duration=1, parallel=True, topology=[0]),
-        PhysicalInstruction(instr.INSTR_Z, duration=1, parallel=True, topology=[0]),
-        PhysicalInstruction(instr.INSTR_S, duration=1, parallel=True, topology=[0]),
-        PhysicalInstruction(instr.INSTR_CNOT, duration=4, parallel=True, topology=[(0, 1)]),
-        PhysicalInstruction(instr.INSTR_MEASURE, duration=7, parallel=False, topology=[0],
+        PhysicalInstruction(instr.INSTR_INIT, duration=durations[instr.INSTR_INIT],
+                            parallel=True),
+        PhysicalInstruction(instr.INSTR_H, duration=durations[instr.INSTR_H], parallel=True,
+                            topology=[0, 1]),
+        PhysicalInstruction(instr.INSTR_X, duration=durations[instr.INSTR_X], parallel=True,
+                            topology=[0]),
+        PhysicalInstruction(instr.INSTR_Z, duration=durations[instr.INSTR_Z], parallel=True,
+                            topology=[0]),
+        PhysicalInstruction(instr.INSTR_S, duration=durations[instr.INSTR_S], parallel=True,
+                            topology=[0]),
+        PhysicalInstruction(instr.INSTR_CNOT, duration=durations[instr.INSTR_CNOT],
+                            parallel=True, topology=[(0, 1)]),
+        PhysicalInstruction(instr.INSTR_MEASURE, duration=durations[instr.INSTR_MEASURE],
+                            parallel=False, topology=[0],
                             quantum_noise_model=measure_noise_model, apply_q_noise_after=False),
-        PhysicalInstruction(instr.INSTR_MEASURE, duration=7, parallel=False, topology=[1])
+        PhysicalInstruction(instr.INSTR_MEASURE, duration=durations[instr.INSTR_MEASURE],
+                            parallel=False, topology=[1])
     ]
-    memory_noise_model = DepolarNoiseModel(depolar_rate=depolar_rate)
+    if fuse_gates:
+        for compiled in fused_teleport_programs():
+            physical_instructions.extend(compiled.physical_instructions())
     processor = QuantumProcessor("quantum_processor", num_positions=2,
                                  memory_noise_models=[memory_noise_model] * 2,
                                  phys_instructions=physical_instructions)
     return processor
 
 
-def example_network_setup(node_distance=4e-3, depolar_rate=1e7, dephase_rate=0.2):
+def _noise_models(depolar_rate, dephase_rate):
+    # Memory and measurement noise models of the processor
+    return (DepolarNoiseModel(depolar_rate=depolar_rate),
+            DephaseNoiseModel(dephase_rate=dephase_rate, time_independent=True))
+
+
+def example_network_setup(node_distance=4e-3, depolar_rate=1e7, dephase_rate=0.2,
+                          source_frequency=None, p_loss_init=0.,
+                          p_loss_length=0., noise_models=None, fuse_gates=False):
     """Setup the physical components of the quantum network.
 
     Parameters
@@ -215,6 +296,21 @@ def example_network_setup(node_distance=4e-3, depolar_rate=1e7, dephase_rate=0.2
         Depolarization rate of qubits in memory.
     dephase_rate : float, optional
         Dephasing rate of physical measurement instruction.
+    source_frequency : float or None, optional
+        Frequency of the entanglement source [Hz]. If None it is chosen such
+        that a pair arrives once per teleportation, ``4e4 / node_distance``.
+        With loss this is the frequency of attempts.
+    p_loss_init : float, optional
+        Probability of losing a photon when it enters the fibre. With loss a
+        :class:`LossyEntanglingConnection` is used.
+    p_loss_length : float, optional
+        Attenuation of the fibre [dB/km].
+    noise_models : tuple or None, optional
+        Memory and measurement noise models shared by both processors, see
+        :func:`create_processor`.
+    fuse_gates : bool, optional
+        Whether the processors support the fused programs of
+        :func:`fused_teleport_programs`, see :func:`example_sim_setup`.
 
     Returns
     -------
@@ -224,8 +320,10 @@ def example_network_setup(node_distance=4e-3, depolar_rate=1e7, dephase_rate=0.2
 
     """
     # Setup nodes Alice and Bob with quantum processor:
-    alice = Node("Alice", qmemory=create_processor(depolar_rate, dephase_rate))
-    bob = Node("Bob", qmemory=create_processor(depolar_rate, dephase_rate))
+    alice = Node("Alice", qmemory=create_processor(depolar_rate, dephase_rate, noise_models,
+                                                   fuse_gates))
+    bob = Node("Bob", qmemory=create_processor(depolar_rate, dephase_rate, noise_models,
+                                               fuse_gates))
     # Create a network
     network = Network("Teleportation_network")
     network.add_nodes([alice, bob])
@@ -234,9 +332,14 @@ def example_network_setup(node_distance=4e-3, depolar_rate=1e7, dephase_rate=0.2
     network.add_connection(alice, bob, connection=c_conn, label="classical",
                            port_name_node1="cout_bob", port_name_node2="cin_alice")
     # Setup entangling connection between nodes:
-    source_frequency = 4e4 / node_distance
-    q_conn = EntanglingConnection(
-        length=node_distance, source_frequency=source_frequency)
+    if source_frequency is None:
+        source_frequency = 4e4 / node_distance
+    if p_loss_init > 0 or p_loss_length > 0:
+        q_conn = LossyEntanglingConnection(node_distance, source_frequency,
+                                           p_loss_init=p_loss_init, p_loss_length=p_loss_length)
+    else:
+        q_conn = EntanglingConnection(
+            length=node_distance, source_frequency=source_frequency)
     port_ac, port_bc = network.add_connection(
         alice, bob, connection=q_conn, label="quantum",
         port_name_node1="qin_charlie", port_name_node2="qin_charlie")
@@ -276,16 +379,74 @@ class BellMeasurementProgram(QuantumProgram):
         yield self.run()
 
 
+def fused_teleport_programs():
+    """:class:`InitStateProgram` and :class:`BellMeasurementProgram` compiled with gate fusion.
+
+    H and S of the state preparation become one gate, and so do the CNOT and H
+    of the Bell measurement. Memory noise is depolarizing and the measurement
+    is noisy, so the measurements are not fused. Use
+    :meth:`~gate_fusion.CompiledProgram.report` to compare with the originals.
+
+    Returns
+    -------
+    tuple of :class:`~gate_fusion.CompiledProgram`
+        The compiled state preparation and Bell measurement programs.
+
+    """
+    return tuple(compile_program(program_class, INSTRUCTION_DURATIONS,
+                                 noisy_instructions=[instr.INSTR_MEASURE], memory_noise="depolar")
+                 for program_class in (InitStateProgram, BellMeasurementProgram))
+
+
 class BellMeasurementProtocol(NodeProtocol):
     """Protocol to perform a Bell measurement when qubits are available.
 
+    Parameters
+    ----------
+    node : :class:`~netsquid.nodes.node.Node`
+        Node to run on.
+    name : str or None, optional
+        Name of the protocol.
+    fuse_gates : bool, optional
+        Whether to run the programs of :func:`fused_teleport_programs`, the
+        node's processor needs their physical instructions.
+    track_latency : bool, optional
+        Whether to record the start time of every teleported qubit in
+        :attr:`start_times`. Whoever sets it has to take them out, as
+        :func:`example_sim_setup` does, or they pile up for the whole run.
+
+    Attributes
+    ----------
+    accountant : :class:`~qstate_accounting.StateAccountant` or None
+        If set, the qubits of the Bell measurement are accounted before and
+        after it, in step "bell_measurement".
+    start_times : :class:`collections.deque`
+        Start time of the :class:`InitStateProgram` of every teleported qubit,
+        in the order the measurement results were sent, until a collector
+        takes it out to compute the latency of the teleportation [ns]. Stays
+        empty unless ``track_latency`` is set.
+
     """
 
+    def __init__(self, node, name=None, fuse_gates=False, track_latency=False):
+        super().__init__(node, name=name)
+        self.start_times = deque()
+        self.fuse_gates = fuse_gates
+        self.track_latency = track_latency
+        self.accountant = None
+
     def run(self):
         qubit_initialised = False
         entanglement_ready = False
-        qubit_init_program = InitStateProgram()
-        measure_program = BellMeasurementProgram()
+        if self.fuse_gates:
+            init_compiled, measure_compiled = fused_teleport_programs()
+            qubit_init_program = init_compiled.program()
+            measure_program = measure_compiled.program()
+        else:
+            qubit_init_program = InitStateProgram()
+            measure_program = BellMeasurementProgram()
+        self.start_times.clear()
+        init_start = ns.sim_time()
         self.node.qmemory.execute_program(qubit_init_program)
         while True:
             expr = yield (self.await_program(self.node.qmemory) |
@@ -296,21 +457,39 @@ class BellMeasurementProtocol(NodeProtocol):
                 entanglement_ready = True
             if qubit_initialised and entanglement_ready:
                 # Once both qubits arrived, do BSM program and send to Bob
+                if self.accountant is not None:
+                    self.accountant.observe_memory(self.node.qmemory, [0, 1],
+                                                   "bell_measurement", merges=True)
                 yield self.node.qmemory.execute_program(measure_program)
+                if self.accountant is not None:
+                    self.accountant.observe_memory(self.node.qmemory, [0, 1],
+                                                   "bell_measurement")
                 m1, = measure_program.output["M1"]
                 m2, = measure_program.output["M2"]
+                if self.track_latency:
+                    self.start_times.append(init_start)
                 self.node.ports["cout_bob"].tx_output((m1, m2))
                 self.send_signal(Signals.SUCCESS)
                 qubit_initialised = False
                 entanglement_ready = False
+                init_start = ns.sim_time()
                 self.node.qmemory.execute_program(qubit_init_program)
 
 
 class CorrectionProtocol(NodeProtocol):
     """Protocol to perform corrections on Bobs qubit when available and measurements received
 
+    Attributes
+    ----------
+    accountant : :class:`~qstate_accounting.StateAccountant` or None
+        If set, Bob's qubit is accounted before the corrections, in step "correction".
+
     """
 
+    def __init__(self, node, name=None):
+        super().__init__(node, name=name)
+        self.accountant = None
+
     def run(self):
         port_alice = self.node.ports["cin_alice"]
         port_charlie = self.node.ports["qin_charlie"]
@@ -325,6 +504,8 @@ class CorrectionProtocol(NodeProtocol):
             else:
                 entanglement_ready = True
             if meas_results is not None and entanglement_ready:
+                if self.accountant is not None:
+                    self.accountant.observe_memory(self.node.qmemory, [0], "correction")
                 # Do corrections (blocking)
                 if meas_results[0] == 1:
                     self.node.qmemory.execute_instruction(instr.INSTR_Z)
@@ -337,7 +518,138 @@ class CorrectionProtocol(NodeProtocol):
                 meas_results = None
 
 
-def example_sim_setup(node_A, node_B):
+class PauliFrameCorrectionProtocol(NodeProtocol):
+    """Protocol that records Bob's corrections in a Pauli frame instead of applying them.
+
+    No correction instructions are executed, so Bob signals success as soon
+    as both the measurement results and his qubit arrived. The correction is
+    folded into the fidelity evaluation, see :func:`_teleport_data`.
+
+    Attributes
+    ----------
+    pauli_frame : :class:`~pauli_frame.PauliFrame`
+        Pending corrections per memory position of Bob's processor.
+    accountant : :class:`~qstate_accounting.StateAccountant` or None
+        If set, Bob's qubit is accounted when the corrections are recorded, in
+        step "correction".
+
+    """
+
+    def __init__(self, node, name=None):
+        super().__init__(node, name=name)
+        self.pauli_frame = PauliFrame()
+        self.accountant = None
+
+    def run(self):
+        port_alice = self.node.ports["cin_alice"]
+        port_charlie = self.node.ports["qin_charlie"]
+        entanglement_ready = False
+        meas_results = None
+        self.pauli_frame.clear()
+        while True:
+            expr = yield (self.await_port_input(port_alice) |
+                          self.await_port_input(port_charlie))
+            if expr.first_term.value:
+                meas_results, = port_alice.rx_input().items
+            else:
+                entanglement_ready = True
+            if meas_results is not None and entanglement_ready:
+                if self.accountant is not None:
+                    self.accountant.observe_memory(self.node.qmemory, [0], "correction")
+                self.pauli_frame.record_teleport(0, *meas_results)
+                self.send_signal(Signals.SUCCESS, 0)
+                entanglement_ready = False
+                meas_results = None
+
+
+class FidelityCollector(pydynaa.Entity):
+    """Collector that streams data into a :class:`~sweep_stats.SweepAggregator`.
+
+    Unlike :class:`~netsquid.util.datacollector.DataCollector` no rows are
+    stored by default, so memory stays constant however many events are collected.
+
+    Parameters
+    ----------
+    get_data_function : callable
+        Function called with the triggering event expression, returning a dict
+        with the value to aggregate under the aggregator's ``value_name``.
+    aggregator : :class:`~sweep_stats.SweepAggregator`
+        Aggregator to feed.
+    sweep_key : hashable
+        Sweep key the collected values are added under.
+    keep_rows : bool, optional
+        Whether to also keep every collected dict as a row of :attr:`dataframe`.
+
+    Attributes
+    ----------
+    rows : list of dict or None
+        Collected rows with their ``time_stamp`` and ``entity_name``, as a
+        ``DataCollector`` records them, or None if rows are not kept.
+
+    """
+
+    def __init__(self, get_data_function, aggregator, sweep_key, keep_rows=False):
+        self._get_data_function = get_data_function
+        self.aggregator = aggregator
+        self.sweep_key = sweep_key
+        self.rows = [] if keep_rows else None
+        self._waits = []
+
+    @property
+    def dataframe(self):
+        """:class:`pandas.DataFrame`: The kept rows, in the layout of a ``DataCollector``."""
+        if self.rows is None:
+            raise RuntimeError("Rows are only kept by a FidelityCollector created "
+                               "with keep_rows=True")
+        import pandas
+        return pandas.DataFrame(self.rows)
+
+    def collect_on(self, event_expression):
+        """Collect data every time the event expression triggers.
+
+        Parameters
+        ----------
+        event_expression : :class:`pydynaa.EventExpression`
+            Expression to collect on.
+
+        """
+        handler = pydynaa.ExpressionHandler(self._collect)
+        self._wait(handler, expression=event_expression)
+        self._waits.append((handler, event_expression))
+
+    def dismiss(self):
+        """Stop collecting on all expressions, e.g. to collect on new ones after a reset."""
+        for handler, event_expression in self._waits:
+            self._dismiss(handler, expression=event_expression)
+        self._waits = []
+
+    def _collect(self, event_expression):
+        data = self._get_data_function(event_expression)
+        self.aggregator.add(self.sweep_key, data[self.aggregator.value_name])
+        if self.rows is not None:
+            self.rows.append(dict(data, time_stamp=ns.sim_time(),
+                                  entity_name=event_expression.triggered_events[-1].source.name))
+
+
+def _teleport_data(evexpr, protocol_alice, metrics=None):
+    # Fidelity of the qubit Bob signalled success for, and its latency since
+    # Alice started initialising the teleported qubit
+    protocol = evexpr.triggered_events[-1].source
+    mem_pos = protocol.get_signal_result(Signals.SUCCESS)
+    qubit, = protocol.node.qmemory.pop(mem_pos)
+    reference = ns.y0
+    if isinstance(protocol, PauliFrameCorrectionProtocol):
+        reference = corrected_reference(reference, *protocol.pauli_frame.pop(mem_pos))
+    fidelity = qapi.fidelity(qubit, reference, squared=True)
+    qapi.discard(qubit)
+    latency = ns.sim_time() - protocol_alice.start_times.popleft()
+    if metrics is not None:
+        metrics.record(latency)
+    return {"fidelity": fidelity, "latency": latency}
+
+
+def example_sim_setup(node_A, node_B, aggregator=None, sweep_key=None, metrics=None,
+                      fuse_gates=False, pauli_frame=False, keep_rows=False):
     """Example simulation setup with data collector for teleportation protocol.
 
     Parameters
@@ -346,6 +658,22 @@ def example_sim_setup(node_A, node_B):
         Node corresponding to Alice.
     node_B : :class:`~netsquid.nodes.node.Node`
         Node corresponding to Bob.
+    aggregator : :class:`~sweep_stats.SweepAggregator` or None, optional
+        If given, fidelities are streamed into this aggregator under ``sweep_key``
+        instead of being stored row by row in a data collector.
+    sweep_key : hashable, optional
+        Sweep key to aggregate fidelities under.
+    metrics : :class:`~sweep_stats.ThroughputMetrics` or None, optional
+        If given, the latency of every teleportation is recorded in it.
+    fuse_gates : bool, optional
+        Whether Alice runs the programs of :func:`fused_teleport_programs`, the
+        network must be set up with ``fuse_gates`` too.
+    pauli_frame : bool, optional
+        Whether Bob defers his corrections with a
+        :class:`PauliFrameCorrectionProtocol` instead of executing them.
+    keep_rows : bool, optional
+        Whether the :class:`FidelityCollector` also keeps the rows a data
+        collector would, only used with an aggregator.
 
     Returns
     -------
@@ -353,82 +681,670 @@ def example_sim_setup(node_A, node_B):
         Alice's protocol.
     :class:`~netsquid.protocols.protocol.Protocol`
         Bob's protocol.
-    :class:`~netsquid.util.datacollector.DataCollector`
-        Data collector to record fidelity.
+    :class:`~netsquid.util.datacollector.DataCollector` or :class:`FidelityCollector`
+        Data collector to record fidelity and latency, from the start of
+        Alice's :class:`InitStateProgram` to Bob's success [ns], a
+        :class:`FidelityCollector` of the fidelity only if an aggregator was given.
 
     """
+    protocol_alice = BellMeasurementProtocol(node_A, fuse_gates=fuse_gates, track_latency=True)
+    if pauli_frame:
+        protocol_bob = PauliFrameCorrectionProtocol(node_B)
+    else:
+        protocol_bob = CorrectionProtocol(node_B)
 
     def collect_fidelity_data(evexpr):
-        protocol = evexpr.triggered_events[-1].source
-        mem_pos = protocol.get_signal_result(Signals.SUCCESS)
-        qubit, = protocol.node.qmemory.pop(mem_pos)
-        fidelity = qapi.fidelity(qubit, ns.y0, squared=True)
-        qapi.discard(qubit)
-        return {"fidelity": fidelity}
-
-    protocol_alice = BellMeasurementProtocol(node_A)
-    protocol_bob = CorrectionProtocol(node_B)
-    dc = DataCollector(collect_fidelity_data)
+        return _teleport_data(evexpr, protocol_alice, metrics)
+
+    if aggregator is None:
+        # The data collector pulls in pandas, which aggregated runs do not need
+        from netsquid.util.datacollector import DataCollector
+        dc = DataCollector(collect_fidelity_data)
+    else:
+        dc = FidelityCollector(collect_fidelity_data, aggregator, sweep_key, keep_rows=keep_rows)
     dc.collect_on(pydynaa.EventExpression(source=protocol_bob,
                                           event_type=Signals.SUCCESS.value))
     return protocol_alice, protocol_bob, dc
 
 
-def run_experiment(num_runs, depolar_rates, distance=4e-3, dephase_rate=0.0):
+class ReusableTeleportNetwork:
+    """Teleportation network and protocols, built once and reconfigured per sweep point.
+
+    Rebuilding the network for every point creates both processors with their
+    physical instructions, the source, the channels and the port forwarding
+    again. Here the network of :func:`example_network_setup` and the
+    protocols of :func:`example_sim_setup` are built once, and between points
+    only the rates of the noise models shared by both processors, the channel
+    lengths and the source period change, followed by a reset of the
+    components and a restart of the protocols. Fidelities are always streamed
+    into an aggregator. Lossy connections are not supported.
+
+    Parameters
+    ----------
+    distance : float, optional
+        Initial distance between nodes [km].
+    depolar_rate : float, optional
+        Initial depolarization rate of qubits in memory.
+    dephase_rate : float, optional
+        Initial dephasing rate of physical measurement instruction.
+
+    """
+
+    def __init__(self, distance=4e-3, depolar_rate=1e7, dephase_rate=0.0):
+        self.noise_models = _noise_models(depolar_rate, dephase_rate)
+        self.network = example_network_setup(distance, depolar_rate, dephase_rate,
+                                             noise_models=self.noise_models)
+        self.node_a = self.network.get_node("Alice")
+        self.node_b = self.network.get_node("Bob")
+        self.protocol_alice = BellMeasurementProtocol(self.node_a, track_latency=True)
+        self.protocol_bob = CorrectionProtocol(self.node_b)
+        self.metrics = None
+        self.collector = FidelityCollector(self._collect_fidelity_data, None, None)
+
+    def _collect_fidelity_data(self, evexpr):
+        return _teleport_data(evexpr, self.protocol_alice, self.metrics)
+
+    def _components(self):
+        # Every component of the network, to reset
+        stack = list(self.network.nodes.values()) + list(self.network.connections.values())
+        while stack:
+            component = stack.pop()
+            yield component
+            stack.extend(component.subcomponents.values())
+
+    def stop(self):
+        """Stop the protocols and the collector, before resetting the simulator."""
+        self.collector.dismiss()
+        self.protocol_alice.stop()
+        self.protocol_bob.stop()
+
+    def reconfigure(self, distance, depolar_rate, dephase_rate, source_frequency=None):
+        """Change the parameters of the network in place and reset its components.
+
+        Parameters
+        ----------
+        distance : float
+            Distance between nodes [km].
+        depolar_rate : float
+            Depolarization rate of qubits in memory.
+        dephase_rate : float
+            Dephasing rate of physical measurement instruction.
+        source_frequency : float or None, optional
+            Frequency of the entanglement source [Hz], see :func:`example_network_setup`.
+
+        Returns
+        -------
+        :class:`~netsquid.nodes.node.Network`
+            The reconfigured network.
+
+        """
+        memory_noise_model, measure_noise_model = self.noise_models
+        memory_noise_model.depolar_rate = depolar_rate
+        measure_noise_model.dephase_rate = dephase_rate
+        q_conn = self.network.get_connection(self.node_a, self.node_b, label="quantum")
+        c_conn = self.network.get_connection(self.node_a, self.node_b, label="classical")
+        for name in ("qchannel_C2A", "qchannel_C2B"):
+            q_conn.subcomponents[name].properties["length"] = distance / 2
+        c_conn.subcomponents["Channel_A2B"].properties["length"] = distance
+        if source_frequency is None:
+            source_frequency = 4e4 / distance
+        (q_conn.subcomponents["qsource"].subcomponents["internal_clock"]
+         .models["timing_model"].properties["delay"]) = 1e9 / source_frequency
+        for component in self._components():
+            component.reset()
+        return self.network
+
+    def restart(self, aggregator, sweep_key, metrics=None, keep_rows=False):
+        """Collect the next point into an aggregator, the protocols still have to be started.
+
+        Parameters
+        ----------
+        aggregator : :class:`~sweep_stats.SweepAggregator`
+            Aggregator to stream fidelities into.
+        sweep_key : hashable
+            Sweep key to aggregate fidelities under.
+        metrics : :class:`~sweep_stats.ThroughputMetrics` or None, optional
+            If given, the latency of every teleportation is recorded in it.
+        keep_rows : bool, optional
+            Whether the collector also keeps every row, see :class:`FidelityCollector`.
+
+        Returns
+        -------
+        :class:`BellMeasurementProtocol`
+            Alice's protocol.
+        :class:`CorrectionProtocol`
+            Bob's protocol.
+        :class:`FidelityCollector`
+            The collector.
+
+        """
+        self.metrics = metrics
+        self.collector.aggregator = aggregator
+        self.collector.sweep_key = sweep_key
+        self.collector.rows = [] if keep_rows else None
+        self.collector.collect_on(pydynaa.EventExpression(source=self.protocol_bob,
+                                                          event_type=Signals.SUCCESS.value))
+        return self.protocol_alice, self.protocol_bob, self.collector
+
+
+# Network reused by all points run in this process, see _simulate_sweep_point
+_reusable_network = None
+
+
+def select_teleport_formalism(depolar_rate, dephase_rate, default=None, fuse_gates=False,
+                              pauli_frame=False):
+    """Choose the quantum state formalism for the teleportation simulation.
+
+    The programs that will run, Bob's corrections, the noise models of
+    :func:`create_processor` and the source and target states are checked with
+    :func:`~formalism_select.select_formalism`, so the stabilizer formalism is
+    chosen as long as the protocol stays Clifford with Pauli noise.
+
+    Parameters
+    ----------
+    depolar_rate : float
+        Depolarization rate of qubits in memory.
+    dephase_rate : float
+        Dephasing rate of physical measurement instruction.
+    default : :class:`~netsquid.qubits.qformalism.QFormalism` or None, optional
+        Formalism if the stabilizer formalism can not be used, defaults to the
+        current formalism.
+    fuse_gates : bool, optional
+        Whether Alice runs the fused programs of :func:`fused_teleport_programs`,
+        whose fused gates are not known Clifford instructions.
+    pauli_frame : bool, optional
+        Whether Bob defers his corrections, see :class:`PauliFrameCorrectionProtocol`.
+
+    Returns
+    -------
+    :class:`~netsquid.qubits.qformalism.QFormalism`
+        The formalism to simulate in.
+
+    """
+    if fuse_gates:
+        programs = [compiled.program() for compiled in fused_teleport_programs()]
+    else:
+        programs = [InitStateProgram(), BellMeasurementProgram()]
+    instructions = []
+    for program in programs:
+        instructions.extend(program_instructions(program) or [None])
+    if not pauli_frame:
+        # Corrections applied by CorrectionProtocol
+        instructions.extend([instr.INSTR_Z, instr.INSTR_X])
+    return select_formalism(instructions, noise_models=_noise_models(depolar_rate, dephase_rate),
+                            states=[ks.b00, ks.y0], default=default)
+
+
+def _run_sweep_point(num_runs, depolar_rate, distance, dephase_rate, seed=None,
+                     aggregate=False, keep_raw=False, formalism=None, target_sem=None,
+                     min_runs=100, source_frequency=None, p_loss_init=0., p_loss_length=0.,
+                     reuse_network=False, accountant=None):
+    """Run the teleportation simulation for a single depolarization rate.
+
+    Resets the simulator, so it is safe to call repeatedly in one process
+    or once per worker process.
+
+    Parameters
+    ----------
+    num_runs : int
+        Number of cycles to run teleportation for. With loss a cycle is the
+        mean time between heralded pairs, so about ``num_runs`` pairs are
+        heralded out of ``num_runs / p_success`` attempts.
+    depolar_rate : float
+        Depolarization rate of qubits in memory.
+    distance : float
+        Distance between nodes [km].
+    dephase_rate : float
+        Dephasing rate of physical measurement instruction.
+    seed : int, :class:`numpy.random.SeedSequence` or None, optional
+        Seed for the simulator random state. A seed sequence, see
+        :meth:`~seeding.SeedTree.point`, also gives every random delay model of
+        the network its own random state, while noise models draw from the
+        simulator random state of the point, and the seeds used are recorded
+        under "seeds" in the ``metadata`` of the aggregator or the ``attrs`` of
+        the dataframe. If None the state is left untouched.
+    aggregate : bool, optional
+        Whether to stream fidelities into an aggregator instead of a dataframe.
+    keep_raw : bool, optional
+        Whether the aggregator also keeps the raw fidelities.
+    formalism : :class:`~netsquid.qubits.qformalism.QFormalism`, str or None, optional
+        Formalism to simulate in, restored afterwards. If "auto" it is chosen
+        by :func:`select_teleport_formalism`. If None the current formalism is used.
+    target_sem : float or None, optional
+        If given, simulate in chunks and stop as soon as the standard error of
+        the mean fidelity is at most ``target_sem``, with ``num_runs`` as the
+        maximum number of cycles.
+    min_runs : int, optional
+        Minimum number of teleportations before stopping on ``target_sem``.
+    source_frequency : float or None, optional
+        Frequency of the entanglement source [Hz], see :func:`example_network_setup`.
+    p_loss_init : float, optional
+        Probability of losing a photon when it enters the fibre. With loss
+        the failed attempts are skipped, see :class:`LossyEntanglingConnection`.
+    p_loss_length : float, optional
+        Attenuation of the fibre [dB/km].
+    reuse_network : bool, optional
+        Whether to reconfigure the :class:`ReusableTeleportNetwork` of this
+        process instead of building a new network. Not supported with loss.
+    accountant : :class:`~qstate_accounting.StateAccountant` or None, optional
+        If given, a run labelled by the depolarization rate is started in it
+        and the protocols account the states of the qubits they hold.
+
+    Returns
+    -------
+    :class:`pandas.DataFrame` or :class:`~sweep_stats.SweepAggregator`
+        Dataframe with recorded fidelity data for this rate,
+        or the aggregator if ``aggregate`` is set.
+
+    """
+    previous_formalism = ns.get_qstate_formalism()
+    if formalism == "auto":
+        formalism = select_teleport_formalism(depolar_rate, dephase_rate)
+    if formalism is not None:
+        ns.set_qstate_formalism(formalism)
+    try:
+        return _simulate_sweep_point(num_runs, depolar_rate, distance, dephase_rate, seed,
+                                     aggregate, keep_raw, target_sem, min_runs,
+                                     source_frequency, p_loss_init, p_loss_length,
+                                     reuse_network, accountant)
+    finally:
+        ns.set_qstate_formalism(previous_formalism)
+
+
+def _simulate_sweep_point(num_runs, depolar_rate, distance, dephase_rate, seed, aggregate,
+                          keep_raw, target_sem=None, min_runs=100, source_frequency=None,
+                          p_loss_init=0., p_loss_length=0., reuse_network=False,
+                          accountant=None):
+    global _reusable_network
+    setup = None
+    lossy = p_loss_init > 0 or p_loss_length > 0
+    if reuse_network and lossy:
+        raise ValueError("The reusable network has no lossy connection, use "
+                         "reuse_network=False with loss")
+    if reuse_network:
+        if _reusable_network is None:
+            _reusable_network = ReusableTeleportNetwork()
+        setup = _reusable_network
+        setup.stop()
+    ns.sim_reset()
+    seeds = None
+    if isinstance(seed, np.random.SeedSequence):
+        seeds = {"spawn_key": list(seed.spawn_key), "simulator_seed": simulator_seed(seed)}
+        ns.set_random_state(seed=seeds["simulator_seed"])
+    elif seed is not None:
+        ns.set_random_state(seed=seed)
+    if setup is None:
+        network = example_network_setup(distance, depolar_rate, dephase_rate,
+                                        source_frequency=source_frequency,
+                                        p_loss_init=p_loss_init, p_loss_length=p_loss_length)
+    else:
+        network = setup.reconfigure(distance, depolar_rate, dephase_rate, source_frequency)
+    if seeds is not None:
+        seeds["components"] = seed_components(
+            seed, list(network.nodes.values()) + list(network.connections.values()))
+    node_a = network.get_node("Alice")
+    node_b = network.get_node("Bob")
+    adaptive = target_sem is not None
+    if aggregate or adaptive or setup is not None:
+        # Stopping needs the running statistics; without aggregation the collector
+        # also keeps the rows a data collector would
+        aggregator = SweepAggregator(keep_raw=keep_raw)
+    else:
+        aggregator = None
+    keep_rows = aggregator is not None and not aggregate
+    metrics = ThroughputMetrics()
+    if setup is None:
+        protocol_alice, protocol_bob, dc = example_sim_setup(
+            node_a, node_b, aggregator=aggregator, sweep_key=depolar_rate, metrics=metrics,
+            keep_rows=keep_rows)
+    else:
+        protocol_alice, protocol_bob, dc = setup.restart(aggregator, depolar_rate, metrics,
+                                                         keep_rows=keep_rows)
+    protocol_alice.accountant = protocol_bob.accountant = accountant
+    if accountant is not None:
+        accountant.start_run(depolar_rate)
+    protocol_alice.start()
+    protocol_bob.start()
+    q_conn = network.get_connection(node_a, node_b, label="quantum")
+    # With loss this is the mean time between heralded pairs, not between attempts
+    cycle_runtime = (q_conn.subcomponents["qsource"].subcomponents["internal_clock"]
+                     .models["timing_model"].delay)
+    wall_start = time.perf_counter()
+    if not adaptive:
+        ns.sim_run(cycle_runtime * num_runs + 1)
+    else:
+        stats = aggregator.stats(depolar_rate)
+        runs = 0
+        while True:
+            chunk = next_chunk_size(stats, target_sem, min_count=min_runs,
+                                    max_count=num_runs)
+            # A cycle does not always complete a teleportation, so also stop on cycles
+            chunk = min(chunk, num_runs - runs)
+            if chunk <= 0:
+                break
+            runs += chunk
+            ns.sim_run(end_time=cycle_runtime * runs + 1)
+    metrics.wall_time = time.perf_counter() - wall_start
+    metrics.sim_time = ns.sim_time()
+    if aggregator is not None:
+        aggregator.metadata["metrics"] = {depolar_rate: metrics}
+        if seeds is not None:
+            aggregator.metadata["seeds"] = {depolar_rate: seeds}
+    if aggregate:
+        return aggregator
+    df = dc.dataframe
+    df['depolar_rate'] = depolar_rate
+    df.attrs["metrics"] = {depolar_rate: metrics}
+    if seeds is not None:
+        df.attrs["seeds"] = {depolar_rate: seeds}
+    return df
+
+
+def _run_sweep_points(point_args, num_workers):
+    """Run sweep points, yielding ``(index, result)`` as soon as each completes.
+
+    Parameters
+    ----------
+    point_args : list of tuple
+        Arguments of :func:`_run_sweep_point` for every point.
+    num_workers : int or None
+        Number of worker processes, points run in this process if None or 1.
+
+    Yields
+    ------
+    tuple of (int, object)
+        Index of the point in ``point_args`` and its result.
+
+    """
+    if num_workers is None or num_workers <= 1:
+        for index, args in enumerate(point_args):
+            yield index, _run_sweep_point(*args)
+        return
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        futures = {executor.submit(_run_sweep_point, *args): index
+                   for index, args in enumerate(point_args)}
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+
+
+# Per-teleport columns stored for every point, the rows a run without aggregation returns
+_STORED_COLUMNS = ("fidelity", "latency", "time_stamp", "entity_name")
+
+
+def _store_point(store, params, df, depolar_rate):
+    # Write the rows of a point and the times its throughput is computed from
+    metrics = df.attrs["metrics"][depolar_rate]
+    columns = {}
+    for column in _STORED_COLUMNS:
+        values = df[column].to_numpy()
+        # Names are stored as fixed width strings, object arrays can not be memory-mapped
+        columns[column] = values.astype(str) if values.dtype == object else values
+    store.write(params, columns, metadata={"sim_time": metrics.sim_time,
+                                           "wall_time": metrics.wall_time})
+
+
+def _stored_metrics(store, params):
+    # Throughput metrics of a stored point, None if it was stored without them
+    metadata = store.metadata(params)
+    if "latency" not in store.columns(params) or "sim_time" not in metadata:
+        return None
+    metrics = ThroughputMetrics()
+    for _, chunk in store.iter_chunks([params], "latency"):
+        metrics.latency.add_many(chunk)
+    metrics.sim_time = metadata["sim_time"]
+    metrics.wall_time = metadata["wall_time"]
+    return metrics
+
+
+def _point_params(num_runs, depolar_rate, distance, dephase_rate, formalism=None,
+                  target_sem=None, source_frequency=None, seed=None, p_loss_init=0.,
+                  p_loss_length=0., version=None):
+    # Parameters identifying a sweep point in a result store, shared with
+    # sweep_planner.SweepPlanner so both reuse each other's points
+    params = {"num_runs": num_runs, "depolar_rate": depolar_rate, "distance": distance,
+              "dephase_rate": dephase_rate}
+    if formalism is not None:
+        # Formalisms agree on the mean fidelity but not on its spread
+        params["formalism"] = getattr(formalism, "name", formalism)
+    if target_sem is not None:
+        params["target_sem"] = target_sem
+    if source_frequency is not None:
+        params["source_frequency"] = source_frequency
+    if seed is not None:
+        # Points of different root seeds are different samples
+        params["seed"] = seed
+    # Lossless points keep the keys they were stored under before loss was added
+    if p_loss_init > 0:
+        params["p_loss_init"] = p_loss_init
+    if p_loss_length > 0:
+        params["p_loss_length"] = p_loss_length
+    if version is not None:
+        # Results of other simulation code are not reused
+        params["code_version"] = version
+    return params
+
+
+def run_experiment(num_runs, depolar_rates, distance=4e-3, dephase_rate=0.0,
+                   num_workers=None, seed=None, aggregate=False, keep_raw=False,
+                   store=None, formalism=None, target_sem=None, target_ci_width=None,
+                   confidence=0.95, min_runs=100, source_frequency=None, p_loss_init=0.,
+                   p_loss_length=0., reuse_network=False, accountant=None):
     """Setup and run the simulation experiment.
 
     Parameters
     ----------
     num_runs : int
-        Number of cycles to run teleportation for.
+        Number of cycles to run teleportation for. With loss a cycle is the
+        mean time between heralded pairs, see :func:`_run_sweep_point`.
     depolar_rates : list of float
         List of depolarization rates to repeat experiment for.
     distance : float, optional
         Distance between nodes [km].
     dephase_rate : float, optional
         Dephasing rate of physical measurement instruction.
+    num_workers : int or None, optional
+        Number of worker processes to spread the depolarization rates over.
+        Each rate runs in its own process with its own simulator state.
+        If None or 1 the rates run one after another in this process.
+    seed : int or None, optional
+        Root seed of a :class:`~seeding.SeedTree`. Rate ``i`` gets the ``i``-th
+        child, from which its simulator and every delay and noise model get
+        independent random states, so results are identical for any
+        ``num_workers``. If None the simulator is not reseeded when running
+        serially, while parallel runs draw fresh root entropy so forked workers
+        do not share one stream. The root entropy and the seeds of every rate
+        are recorded under "seed_tree" and "seeds" in the ``metadata`` of the
+        aggregator or the ``attrs`` of the dataframe, except when read back
+        from a ``store``.
+    aggregate : bool, optional
+        Whether to keep only running statistics per depolarization rate
+        instead of one row per teleportation, so memory does not grow with
+        ``num_runs``.
+    keep_raw : bool, optional
+        Whether the aggregator should also keep the raw fidelities.
+        Only used if ``aggregate`` is set.
+    store : :class:`~result_store.ResultStore` or None, optional
+        Store to write every completed point to as soon as it is done, with
+        the fidelity, latency, time stamp and entity name of every
+        teleportation. Points are keyed by their parameters and the
+        :func:`~sweep_planner.code_version`, as a :class:`~sweep_planner.SweepPlanner`
+        keys them. Points already in the store are not simulated again,
+        and the results are read back from the store in the same layout as
+        without a store. Points stored with their fidelities only are
+        simulated again if ``aggregate`` is not set.
+    formalism : :class:`~netsquid.qubits.qformalism.QFormalism`, str or None, optional
+        Formalism to simulate in. If "auto" the stabilizer formalism is used
+        whenever :func:`select_teleport_formalism` allows it, which is much
+        faster than the ket and density matrix formalisms. If None the
+        current formalism is used.
+    target_sem : float or None, optional
+        If given, every rate is simulated in chunks until the standard error
+        of its mean fidelity is at most ``target_sem``, with ``num_runs`` as
+        the maximum number of cycles. Shots go to the noisy rates that need
+        them, and the shots spent per rate are the ``count`` of the aggregated
+        statistics.
+    target_ci_width : float or None, optional
+        Alternative to ``target_sem``: the full width of the normal confidence
+        interval of the mean fidelity to reach.
+    confidence : float, optional
+        Confidence level of ``target_ci_width``.
+    min_runs : int, optional
+        Minimum number of teleportations per rate before stopping early.
+    source_frequency : float or None, optional
+        Frequency of the entanglement source [Hz], see :func:`example_network_setup`.
+        For sweeps over it and the other parameters see :mod:`sweep_planner`.
+        With loss this is the frequency of attempts.
+    p_loss_init : float, optional
+        Probability of losing a photon when it enters the fibre, see
+        :class:`LossyEntanglingConnection`.
+    p_loss_length : float, optional
+        Attenuation of the fibre [dB/km].
+    reuse_network : bool, optional
+        Whether to build the network and protocols once per process, see
+        :class:`ReusableTeleportNetwork`, and only reconfigure them between
+        rates. Saves the setup time of every rate, which dominates sweeps of
+        many cheap points. Not supported with loss.
+    accountant : :class:`~qstate_accounting.StateAccountant` or None, optional
+        If given, the sizes of the quantum states are accounted in it with one
+        run per simulated rate, see :func:`_run_sweep_point`. Needs the rates
+        to run in this process.
+
+    Returns
+    -------
+    :class:`pandas.DataFrame` or :class:`~sweep_stats.SweepAggregator`
+        Dataframe with recorded fidelity data, or if ``aggregate`` is set an
+        aggregator whose ``dataframe`` holds the statistics per rate. The
+        throughput and latency of every rate are recorded under "metrics",
+        see :func:`metrics_dataframe`, except for points a ``store`` holds the
+        fidelities of only.
+
+    """
+    if target_ci_width is not None:
+        target_sem = sem_for_ci_width(target_ci_width, confidence)
+    parallel = num_workers is not None and num_workers > 1
+    if parallel and accountant is not None:
+        raise ValueError("A state accountant only sees the rates run in this process, "
+                         "use num_workers=None")
+    seed_tree = SeedTree(seed) if seed is not None or parallel else None
+    seeds = [None if seed_tree is None else seed_tree.point(index)
+             for index in range(len(depolar_rates))]
+    point_args = [(num_runs, depolar_rate, distance, dephase_rate, point_seed,
+                   aggregate, keep_raw, formalism, target_sem, min_runs, source_frequency,
+                   p_loss_init, p_loss_length, reuse_network, accountant)
+                  for depolar_rate, point_seed in zip(depolar_rates, seeds)]
+    if store is not None:
+        from sweep_planner import code_version
+        version = code_version()
+        points = [_point_params(num_runs, depolar_rate, distance, dephase_rate, formalism,
+                                target_sem, source_frequency, seed, p_loss_init, p_loss_length,
+                                version)
+                  for depolar_rate in depolar_rates]
+        # Points stored with fidelities only are simulated again to return their rows
+        missing = [index for index, params in enumerate(points)
+                   if params not in store or
+                   (not aggregate and not set(_STORED_COLUMNS) <= set(store.columns(params)))]
+        # Storing a point needs its rows
+        missing_args = [point_args[index][:5] + (False, False) + point_args[index][7:]
+                        for index in missing]
+        metadata = {}
+        for index, df in _run_sweep_points(missing_args, num_workers):
+            _store_point(store, points[missing[index]], df, depolar_rates[missing[index]])
+            # Seeds of the points simulated now, stored points do not keep them
+            for name, value in df.attrs.items():
+                if name != "metrics":
+                    metadata.setdefault(name, {}).update(value)
+        metadata["metrics"] = {}
+        for depolar_rate, params in zip(depolar_rates, points):
+            metrics = _stored_metrics(store, params)
+            if metrics is not None:
+                metadata["metrics"][depolar_rate] = metrics
+        if aggregate:
+            result = store.aggregate(points, keep_raw=keep_raw)
+            result.metadata.update(metadata)
+            return result
+        df = store.dataframe(points, column=_STORED_COLUMNS)
+        df.attrs = metadata
+        return df
+    frames = [None] * len(point_args)
+    for index, result in _run_sweep_points(point_args, num_workers):
+        frames[index] = result
+    if aggregate:
+        aggregator = SweepAggregator(keep_raw=keep_raw)
+        if seed_tree is not None:
+            aggregator.metadata["seed_tree"] = {"root_entropy": seed_tree.entropy}
+        for point_aggregator in frames:
+            aggregator.merge(point_aggregator)
+        return aggregator
+    # pandas is only needed here, not when running single aggregated points
+    import pandas
+    if not frames:
+        return pandas.DataFrame()
+    df = pandas.concat(frames)
+    attrs = {}
+    for frame in frames:
+        for name, values in frame.attrs.items():
+            attrs.setdefault(name, {}).update(values)
+    if seed_tree is not None:
+        attrs["seed_tree"] = {"root_entropy": seed_tree.entropy}
+    df.attrs = attrs
+    return df
+
+
+def metrics_dataframe(result):
+    """Throughput and latency per depolarization rate of an experiment.
+
+    Parameters
+    ----------
+    result : :class:`pandas.DataFrame` or :class:`~sweep_stats.SweepAggregator`
+        Result of :func:`run_experiment`.
 
     Returns
     -------
     :class:`pandas.DataFrame`
-        Dataframe with recorded fidelity data.
+        One row per rate with the teleportations ``count``, teleportations
+        ``per_sim_second`` and ``per_wall_second``, and the mean, p50 and p99
+        latency [ns] from the start of Alice's :class:`InitStateProgram` to
+        Bob's success.
 
     """
-    fidelity_data = pandas.DataFrame()
-    for i, depolar_rate in enumerate(depolar_rates):
-        ns.sim_reset()
-        network = example_network_setup(distance, depolar_rate, dephase_rate)
-        node_a = network.get_node("Alice")
-        node_b = network.get_node("Bob")
-        protocol_alice, protocol_bob, dc = example_sim_setup(node_a, node_b)
-        protocol_alice.start()
-        protocol_bob.start()
-        q_conn = network.get_connection(node_a, node_b, label="quantum")
-        cycle_runtime = (q_conn.subcomponents["qsource"].subcomponents["internal_clock"]
-                         .models["timing_model"].delay)
-        ns.sim_run(cycle_runtime * num_runs + 1)
-        df = dc.dataframe
-        df['depolar_rate'] = depolar_rate
-        fidelity_data = fidelity_data.append(df)
-    return fidelity_data
+    import pandas
+    metadata = result.metadata if isinstance(result, SweepAggregator) else result.attrs
+    rows = [dict(depolar_rate=depolar_rate, **metrics.summary())
+            for depolar_rate, metrics in metadata.get("metrics", {}).items()]
+    return pandas.DataFrame(rows, columns=["depolar_rate", "count", "per_sim_second",
+                                           "per_wall_second", "latency_mean", "latency_p50",
+                                           "latency_p99"])
 
 
-def create_plot():
+def create_plot(num_workers=None, target_sem=None):
     """Show a plot of fidelity verus depolarization rate.
 
+    Parameters
+    ----------
+    num_workers : int or None, optional
+        Number of worker processes used to run the sweep, see :func:`run_experiment`.
+    target_sem : float or None, optional
+        Stop every rate once its mean fidelity has this standard error,
+        spending at most 1000 cycles per rate, see :func:`run_experiment`.
+
     """
     from matplotlib import pyplot as plt
     depolar_rates = [1e6 * i for i in range(0, 200, 10)]
     fidelities = run_experiment(num_runs=1000, distance=4e-3,
-                                depolar_rates=depolar_rates, dephase_rate=0.0)
+                                depolar_rates=depolar_rates, dephase_rate=0.0,
+                                num_workers=num_workers, aggregate=True,
+                                target_sem=target_sem)
     plot_style = {'kind': 'scatter', 'grid': True,
                   'title': "Fidelity of the teleported quantum state"}
-    data = fidelities.groupby("depolar_rate")['fidelity'].agg(
-        fidelity='mean', sem='sem').reset_index()
+    data = fidelities.dataframe
+    if target_sem is not None:
+        print(f"Shots spent: {data['count'].sum()} of {1000 * len(depolar_rates)}")
     data.plot(x='depolar_rate', y='fidelity', yerr='sem', **plot_style)
     plt.savefig('fig.png')
     plt.show()
 
 
 if __name__ == '__main__':
-    create_plot()
+    import os
+    create_plot(num_workers=os.cpu_count())
@@ -0,0 +1,203 @@
+"""Closed-form fidelity model of the teleportation network of :mod:`telp`.
+
+Predicts the mean fidelity of the teleported y0 state without running a
+simulation, from the same quantities that set it in the simulation: the
+depolarizing memory noise acting over the idle times given by the fibre delays,
+the source period and the instruction durations of ``telp.create_processor``.
+
+Every noise source of the protocol is a Pauli channel, which teleportation
+maps to Pauli channels on Bob's qubit:
+
+* depolarization of y0 before the CNOT and of Bob's qubit until it is
+  evaluated shrinks the Bloch vector of the teleported state;
+* depolarization of Alice's qubits between CNOT and measurement flips the
+  measurement outcomes, which makes Bob apply a wrong Z (first outcome) or
+  X (second outcome) correction;
+* the dephasing noise on the measurement instruction is a Z error applied
+  right before a measurement in the Z (standard) basis. It commutes with the
+  measurement and leaves the outcomes unchanged, so the fidelity does not
+  depend on the dephasing rate.
+
+Each correction instruction that is applied adds its duration to the idle
+time of Bob's qubit, and the outcomes are uniformly distributed, which gives
+
+    F = (1 + exp(-r T) ((1 + exp(-r t_c)) / 2) ** 2) / 2
+
+with ``r`` the depolarization rate, ``T`` the total fixed idle time and
+``t_c`` the duration of a correction. As in :mod:`telp_vectorized` the steady
+state of the protocol is assumed.
+
+Example
+-------
+
+>>> print(f"{predict_fidelity(node_distance=4e-3, depolar_rate=1e7):.4f}")
+0.6309
+
+"""
+import numpy as np
+
+from telp_vectorized import INSTRUCTION_DURATIONS, SPEED_OF_LIGHT_FIBRE
+
+__all__ = [
+    "idle_time",
+    "predict_fidelity",
+    "validate",
+]
+
+
+def idle_time(node_distance=4e-3, source_frequency=None, durations=None):
+    """Total fixed idle time of the qubits involved in one teleportation.
+
+    Broadcasts over array arguments.
+
+    Parameters
+    ----------
+    node_distance : float or array_like, optional
+        Distance between nodes [km].
+    source_frequency : float, array_like or None, optional
+        Frequency of the entanglement source [Hz]. If None the frequency
+        used by ``telp.example_network_setup`` is taken.
+    durations : dict or None, optional
+        Instruction durations [ns], defaults to
+        :data:`~telp_vectorized.INSTRUCTION_DURATIONS`.
+
+    Returns
+    -------
+    :class:`numpy.ndarray`
+        Idle time [ns], NaN where the source period is too short for the
+        protocol to keep up.
+
+    """
+    durations = dict(INSTRUCTION_DURATIONS, **(durations or {}))
+    node_distance = np.asarray(node_distance, dtype=float)
+    if source_frequency is None:
+        source_frequency = 4e4 / node_distance
+    period = 1e9 / np.asarray(source_frequency, dtype=float)
+    classical_delay = 1e9 * node_distance / SPEED_OF_LIGHT_FIBRE
+    init_duration = durations["init"] + durations["h"] + durations["s"]
+    bsm_duration = durations["cnot"] + durations["h"] + 2 * durations["measure"]
+    input_idle = period - bsm_duration - (init_duration - durations["s"])
+    alice_idle = 2 * (durations["cnot"] + durations["h"]) + durations["measure"]
+    bob_idle = bsm_duration + classical_delay
+    valid = ((period >= bsm_duration + init_duration) &
+             (period >= bsm_duration + classical_delay + durations["z"] + durations["x"]))
+    return np.where(valid, input_idle + alice_idle + bob_idle, np.nan)
+
+
+def predict_fidelity(node_distance=4e-3, depolar_rate=1e7, dephase_rate=0.2,
+                     source_frequency=None, durations=None):
+    """Predicted mean fidelity of the teleported state.
+
+    Broadcasts over array arguments, so whole parameter grids are evaluated
+    in one call.
+
+    Parameters
+    ----------
+    node_distance : float or array_like, optional
+        Distance between nodes [km].
+    depolar_rate : float or array_like, optional
+        Depolarization rate of qubits in memory [Hz].
+    dephase_rate : float or array_like, optional
+        Dephasing rate of physical measurement instruction. Z-dephasing before
+        a Z measurement leaves the fidelity unchanged, so it only sets the
+        shape of the result.
+    source_frequency : float, array_like or None, optional
+        Frequency of the entanglement source [Hz]. If None the frequency
+        used by ``telp.example_network_setup`` is taken.
+    durations : dict or None, optional
+        Instruction durations [ns].
+
+    Returns
+    -------
+    float or :class:`numpy.ndarray`
+        Mean squared fidelity with y0, NaN where the protocol cannot keep up.
+
+    """
+    durations = dict(INSTRUCTION_DURATIONS, **(durations or {}))
+    depolar_rate = np.asarray(depolar_rate, dtype=float)
+    total_idle = idle_time(node_distance, source_frequency, durations)
+    correction_survival = np.exp(-depolar_rate * 1e-9 * durations["z"])
+    shrink = np.exp(-depolar_rate * 1e-9 * total_idle) * ((1. + correction_survival) / 2.) ** 2
+    fidelity = (1. + shrink) / 2.
+    # Independent of the dephasing rate, which only broadcasts the result
+    fidelity = np.array(np.broadcast_arrays(fidelity, np.asarray(dephase_rate, dtype=float))[0])
+    return fidelity[()] if fidelity.ndim == 0 else fidelity
+
+
+def validate(points, num_runs=1000, simulator=None, seed=42, max_z_score=4.0):
+    """Check predictions against simulated fidelities.
+
+    Only the discrete event simulation of :mod:`telp` is an independent check
+    of the model. :mod:`telp_vectorized` follows the same timeline and noise
+    channels as the model, and its per-shot values are the expected fidelity
+    given the sampled outcomes, not sampled fidelities, so its SEM is small
+    and a vectorized check only confirms that the two implementations agree.
+
+    Parameters
+    ----------
+    points : :class:`pandas.DataFrame` or list of dict
+        Parameter points with ``node_distance``, ``depolar_rate`` and
+        ``dephase_rate``.
+    num_runs : int, optional
+        Number of teleportations simulated per point.
+    simulator : {"netsquid", "vectorized"} or None, optional
+        Simulate with the discrete event simulation of :mod:`telp` (requires
+        netsquid) or with :mod:`telp_vectorized`. If None netsquid is used
+        when it is installed and the vectorized engine otherwise.
+    seed : int, optional
+        Seed of the simulations, point ``i`` is seeded with ``seed + i``.
+    max_z_score : float, optional
+        Largest accepted difference between prediction and simulated mean,
+        in units of the standard error of the simulated mean.
+
+    Returns
+    -------
+    :class:`pandas.DataFrame`
+        The points with the predicted fidelity, the simulated mean fidelity
+        and its SEM, the z-score of the difference and whether it is
+        acceptable (column ``ok``). The simulator used is in ``attrs["simulator"]``.
+
+    """
+    import importlib.util
+    import pandas
+    if simulator is None:
+        simulator = "netsquid" if importlib.util.find_spec("netsquid") else "vectorized"
+    data = pandas.DataFrame(points).reset_index(drop=True)
+    means, sems = [], []
+    for i, point in data.iterrows():
+        if simulator == "vectorized":
+            import telp_vectorized
+            from sweep_stats import RunningStats
+            stats = RunningStats()
+            stats.add_many(telp_vectorized.simulate_fidelities(
+                num_runs, point["depolar_rate"], point["dephase_rate"],
+                point["node_distance"], rng=seed + i))
+        elif simulator == "netsquid":
+            import telp
+            aggregator = telp._run_sweep_point(num_runs, point["depolar_rate"],
+                                               point["node_distance"], point["dephase_rate"],
+                                               seed=seed + i, aggregate=True)
+            stats = aggregator.stats(point["depolar_rate"])
+        else:
+            raise ValueError(f"Unknown simulator {simulator!r}")
+        means.append(stats.mean)
+        sems.append(stats.sem)
+    data["predicted"] = predict_fidelity(data["node_distance"].to_numpy(),
+                                         data["depolar_rate"].to_numpy(),
+                                         data["dephase_rate"].to_numpy())
+    data["fidelity"] = means
+    data["sem"] = sems
+    difference = (data["fidelity"] - data["predicted"]).abs()
+    sem = data["sem"].fillna(0.)
+    # Points without spread (e.g. no noise at all) must agree up to rounding
+    data["z_score"] = np.where(sem > 1e-12, difference / sem.where(sem > 1e-12, 1.),
+                               np.where(difference > 1e-9, np.inf, 0.))
+    data["ok"] = data["z_score"] <= max_z_score
+    data.attrs["simulator"] = simulator
+    return data
+
+
+if __name__ == '__main__':
+    grid = [{"node_distance": node_distance, "depolar_rate": depolar_rate, "dephase_rate": 0.2}
+            for node_distance in (4e-3, 1e-2) for depolar_rate in (0., 1e6, 1e7, 5e7)]
+    print(validate(grid))
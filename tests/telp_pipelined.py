@@ -0,0 +1,468 @@
+"""Pipelined teleportation with several teleports in flight.
+
+:mod:`telp` teleports one state at a time: Bob keeps his half of the pair in
+memory position 0 until Alice's measurement results arrived, so a new pair
+can only be used once the previous corrections are done, and the link idles
+for the classical delay of every teleport. Here both nodes have ``num_slots``
+memory slots:
+
+* every pair from the source gets a sequence number, counted independently
+  but identically by both nodes since the channels deliver in order;
+* Alice initialises a data qubit per slot, puts the next pair's qubit next to
+  it and measures as soon as the processor is free, sending
+  ``(seq, m1, m2)``, or ``(seq, None, None)`` if she had no slot and dropped
+  her qubit of pair ``seq``;
+* Bob stores his qubit of pair ``seq`` in any free slot and applies the
+  corrections of a message to the qubit with its sequence number, in the
+  order they arrive.
+
+With ``L`` the time a pair is held by Bob, roughly the measurement time plus
+the classical delay, at most ``num_slots / L`` teleports per second complete,
+so the throughput grows with the slot count until the source or Alice's
+processor limits it. :func:`throughput_study` measures this.
+
+Example
+-------
+
+>>> import netsquid as ns
+>>> ns.sim_reset()
+>>> network = pipelined_network_setup(num_slots=4, node_distance=4e-2, depolar_rate=1e6)
+>>> protocol_alice, protocol_bob, dc = pipelined_sim_setup(network.get_node("Alice"),
+...                                                        network.get_node("Bob"))
+>>> protocol_alice.start()
+>>> protocol_bob.start()
+>>> ns.sim_run(1e5)
+>>> dc.dataframe["fidelity"].mean() > 0.9
+True
+
+"""
+from collections import deque
+
+from netsquid.components.qprocessor import QuantumProcessor, PhysicalInstruction
+from netsquid.components.qprogram import QuantumProgram
+from netsquid.nodes import Node, Network
+from netsquid.protocols.protocol import Signals
+from netsquid.protocols.nodeprotocols import NodeProtocol
+import netsquid as ns
+from netsquid.qubits import qubitapi as qapi
+from netsquid.components import instructions as instr
+from telp import (ClassicalConnection, EntanglingConnection, FidelityCollector,
+                  InitStateProgram, BellMeasurementProgram, _noise_models)
+
+__all__ = [
+    "PIPELINE_SOURCE_FREQUENCY",
+    "CorrectionProgram",
+    "PipelinedBellMeasurementProtocol",
+    "PipelinedCorrectionProtocol",
+    "create_pipelined_processor",
+    "pipelined_network_setup",
+    "pipelined_sim_setup",
+    "throughput_study",
+]
+
+#: Default source frequency [Hz]: a pair every 25 ns, about the time Alice's
+#: processor needs per teleport (INIT 3, CNOT 4, H 1 and two MEASURE 7 ns).
+PIPELINE_SOURCE_FREQUENCY = 4e7
+
+
+class CorrectionProgram(QuantumProgram):
+    """Program applying Bob's corrections for measurement results ``(m1, m2)``.
+
+    Parameters
+    ----------
+    m1 : int
+        Result of measuring Alice's data qubit, a Z correction if 1.
+    m2 : int
+        Result of measuring Alice's half of the pair, an X correction if 1.
+
+    """
+    default_num_qubits = 1
+
+    def __init__(self, m1, m2, **kwargs):
+        super().__init__(**kwargs)
+        self.m1 = m1
+        self.m2 = m2
+
+    def program(self):
+        q1, = self.get_qubit_indices(1)
+        if self.m1 == 1:
+            self.apply(instr.INSTR_Z, q1)
+        if self.m2 == 1:
+            self.apply(instr.INSTR_X, q1)
+        yield self.run()
+
+
+def create_pipelined_processor(num_positions, depolar_rate, dephase_rate):
+    """Factory to create a quantum processor with ``num_positions`` memory positions.
+
+    Position ``2k`` holds a data qubit and ``2k + 1`` the half of a pair it is
+    measured with, as positions 0 and 1 of :func:`telp.create_processor`;
+    corrections can be applied at every position.
+
+    Parameters
+    ----------
+    num_positions : int
+        Number of memory positions.
+    depolar_rate : float
+        Depolarization rate of qubits in memory.
+    dephase_rate : float
+        Dephasing rate of physical measurement instruction.
+
+    Returns
+    -------
+    :class:`~netsquid.components.qprocessor.QuantumProcessor`
+        A quantum processor to specification.
+
+    """
+    memory_noise_model, measure_noise_model = _noise_models(depolar_rate, dephase_rate)
+    data_positions = list(range(0, num_positions, 2))
+    pair_positions = list(range(1, num_positions, 2))
+    physical_instructions = [
+        PhysicalInstruction(instr.INSTR_INIT, duration=3, parallel=True),
+        PhysicalInstruction(instr.INSTR_H, duration=1, parallel=True),
+        PhysicalInstruction(instr.INSTR_X, duration=1, parallel=True),
+        PhysicalInstruction(instr.INSTR_Z, duration=1, parallel=True),
+        PhysicalInstruction(instr.INSTR_S, duration=1, parallel=True),
+        PhysicalInstruction(instr.INSTR_CNOT, duration=4, parallel=True,
+                            topology=[(data, data + 1) for data in data_positions
+                                      if data + 1 < num_positions]),
+        PhysicalInstruction(instr.INSTR_MEASURE, duration=7, parallel=False,
+                            topology=data_positions, quantum_noise_model=measure_noise_model,
+                            apply_q_noise_after=False),
+        PhysicalInstruction(instr.INSTR_MEASURE, duration=7, parallel=False,
+                            topology=pair_positions)
+    ]
+    return QuantumProcessor("quantum_processor", num_positions=num_positions,
+                            memory_noise_models=[memory_noise_model] * num_positions,
+                            phys_instructions=physical_instructions)
+
+
+def pipelined_network_setup(num_slots=4, node_distance=4e-3, depolar_rate=1e7,
+                            dephase_rate=0.2, source_frequency=PIPELINE_SOURCE_FREQUENCY):
+    """Setup the network of :func:`telp.example_network_setup` with ``num_slots`` slots.
+
+    Alice gets ``2 * num_slots`` memory positions, a data qubit and a pair
+    qubit per slot, and Bob ``num_slots``. Qubits from the source are not
+    forwarded to a fixed memory position, the protocols place them.
+
+    Parameters
+    ----------
+    num_slots : int, optional
+        Number of teleports each node can hold at once.
+    node_distance : float, optional
+        Distance between nodes [km].
+    depolar_rate : float, optional
+        Depolarization rate of qubits in memory.
+    dephase_rate : float, optional
+        Dephasing rate of physical measurement instruction.
+    source_frequency : float, optional
+        Frequency of the entanglement source [Hz].
+
+    Returns
+    -------
+    :class:`~netsquid.nodes.node.Network`
+        A Network with nodes "Alice" and "Bob",
+        connected by an entangling connection and a classical connection
+
+    """
+    alice = Node("Alice", qmemory=create_pipelined_processor(2 * num_slots, depolar_rate,
+                                                             dephase_rate))
+    bob = Node("Bob", qmemory=create_pipelined_processor(num_slots, depolar_rate,
+                                                         dephase_rate))
+    network = Network("Pipelined_teleportation_network")
+    network.add_nodes([alice, bob])
+    c_conn = ClassicalConnection(length=node_distance)
+    network.add_connection(alice, bob, connection=c_conn, label="classical",
+                           port_name_node1="cout_bob", port_name_node2="cin_alice")
+    q_conn = EntanglingConnection(length=node_distance, source_frequency=source_frequency)
+    network.add_connection(alice, bob, connection=q_conn, label="quantum",
+                           port_name_node1="qin_charlie", port_name_node2="qin_charlie")
+    return network
+
+
+class PipelinedBellMeasurementProtocol(NodeProtocol):
+    """Alice's protocol: Bell measurements on every slot with a data qubit and a pair.
+
+    Parameters
+    ----------
+    node : :class:`~netsquid.nodes.node.Node`
+        Alice, with ``2 * num_slots`` memory positions.
+    num_slots : int
+        Number of slots.
+
+    Attributes
+    ----------
+    dropped : int
+        Number of pairs whose qubit was discarded because no slot was ready.
+
+    """
+
+    def __init__(self, node, num_slots, name=None):
+        super().__init__(node, name=name)
+        self.num_slots = num_slots
+        self.dropped = 0
+
+    def run(self):
+        qmemory = self.node.qmemory
+        port_charlie = self.node.ports["qin_charlie"]
+        port_bob = self.node.ports["cout_bob"]
+        qubit_init_program = InitStateProgram()
+        measure_program = BellMeasurementProgram()
+        to_initialise = deque(range(self.num_slots))
+        initialised = deque()
+        to_measure = deque()
+        next_seq = 0
+        running = None
+        while True:
+            # Measurements first, so pairs are not held longer than needed
+            if running is None and to_measure:
+                running = ("measure",) + to_measure.popleft()
+                slot = running[2]
+                qmemory.execute_program(measure_program, qubit_mapping=[2 * slot, 2 * slot + 1])
+            elif running is None and to_initialise:
+                running = ("init", None, to_initialise.popleft())
+                qmemory.execute_program(qubit_init_program, qubit_mapping=[2 * running[2]])
+            expr = yield (self.await_program(qmemory) | self.await_port_input(port_charlie))
+            if expr.first_term.value:
+                kind, seq, slot = running
+                running = None
+                if kind == "init":
+                    initialised.append(slot)
+                else:
+                    m1, = measure_program.output["M1"]
+                    m2, = measure_program.output["M2"]
+                    port_bob.tx_output((seq, m1, m2))
+                    self.send_signal(Signals.SUCCESS)
+                    to_initialise.append(slot)
+            message = port_charlie.rx_input()
+            if message is None:
+                continue
+            for qubit in message.items:
+                seq = next_seq
+                next_seq += 1
+                if initialised:
+                    slot = initialised.popleft()
+                    qmemory.put(qubit, positions=[2 * slot + 1])
+                    to_measure.append((seq, slot))
+                else:
+                    # Bob has to free the slot of his half of this pair
+                    qapi.discard(qubit)
+                    self.dropped += 1
+                    port_bob.tx_output((seq, None, None))
+
+
+class PipelinedCorrectionProtocol(NodeProtocol):
+    """Bob's protocol: corrections of every stored qubit, matched by sequence number.
+
+    The memory position of every corrected qubit is appended to
+    :attr:`completed` before signalling success, so collectors can pop one
+    entry per signal even when several teleports complete at the same time.
+    A slot is reused once its qubit was popped from memory, so a collector
+    has to take every completed qubit out.
+
+    Parameters
+    ----------
+    node : :class:`~netsquid.nodes.node.Node`
+        Bob, with ``num_slots`` memory positions.
+    num_slots : int
+        Number of slots.
+
+    Attributes
+    ----------
+    completed : :class:`collections.deque`
+        ``(seq, position)`` of every corrected qubit not yet collected.
+    dropped : int
+        Number of pairs whose qubit was discarded because no slot was free.
+
+    """
+
+    def __init__(self, node, num_slots, name=None):
+        super().__init__(node, name=name)
+        self.num_slots = num_slots
+        self.completed = deque()
+        self.dropped = 0
+
+    def _free_slot(self, stored):
+        # A slot is free once its qubit was collected after the corrections
+        in_use = set(stored.values())
+        for slot in range(self.num_slots):
+            if slot not in in_use and self.node.qmemory.peek([slot])[0] is None:
+                return slot
+        return None
+
+    def _complete(self, stored, seq):
+        slot = stored.pop(seq)
+        self.completed.append((seq, slot))
+        self.send_signal(Signals.SUCCESS, slot)
+
+    def run(self):
+        qmemory = self.node.qmemory
+        port_alice = self.node.ports["cin_alice"]
+        port_charlie = self.node.ports["qin_charlie"]
+        stored = {}
+        # Results of pairs not stored yet, and pairs Bob discarded
+        early_results = {}
+        discarded = set()
+        to_correct = deque()
+        next_seq = 0
+        running = None
+        while True:
+            while running is None and to_correct:
+                seq, m1, m2 = to_correct.popleft()
+                if m1 == 0 and m2 == 0:
+                    self._complete(stored, seq)
+                else:
+                    running = seq
+                    qmemory.execute_program(CorrectionProgram(m1, m2),
+                                            qubit_mapping=[stored[seq]])
+            expr = yield (self.await_program(qmemory) |
+                          self.await_port_input(port_alice) |
+                          self.await_port_input(port_charlie))
+            if running is not None and expr.first_term.first_term.value:
+                self._complete(stored, running)
+                running = None
+            message = port_charlie.rx_input()
+            if message is not None:
+                for qubit in message.items:
+                    seq = next_seq
+                    next_seq += 1
+                    if seq in early_results and early_results[seq] is None:
+                        # Alice already dropped her qubit of this pair
+                        del early_results[seq]
+                        qapi.discard(qubit)
+                        continue
+                    slot = self._free_slot(stored)
+                    if slot is None:
+                        qapi.discard(qubit)
+                        self.dropped += 1
+                        if early_results.pop(seq, None) is None:
+                            discarded.add(seq)
+                        continue
+                    qmemory.put(qubit, positions=[slot])
+                    stored[seq] = slot
+                    if seq in early_results:
+                        to_correct.append((seq,) + early_results.pop(seq))
+            message = port_alice.rx_input()
+            if message is not None:
+                for seq, m1, m2 in message.items:
+                    if seq in discarded:
+                        discarded.remove(seq)
+                    elif seq not in stored:
+                        early_results[seq] = None if m1 is None else (m1, m2)
+                    elif m1 is None:
+                        # Alice dropped her qubit of this pair
+                        qapi.discard(qmemory.pop(stored.pop(seq))[0])
+                    else:
+                        to_correct.append((seq, m1, m2))
+
+
+def _collect_fidelity_data(evexpr):
+    # Fidelity of the qubit of the completed teleport the signal belongs to
+    protocol = evexpr.triggered_events[-1].source
+    seq, mem_pos = protocol.completed.popleft()
+    qubit, = protocol.node.qmemory.pop(mem_pos)
+    fidelity = qapi.fidelity(qubit, ns.y0, squared=True)
+    qapi.discard(qubit)
+    return {"fidelity": fidelity}
+
+
+def pipelined_sim_setup(node_A, node_B, num_slots=None, aggregator=None, sweep_key=None):
+    """Pipelined counterpart of :func:`telp.example_sim_setup`.
+
+    Parameters
+    ----------
+    node_A : :class:`~netsquid.nodes.node.Node`
+        Node corresponding to Alice.
+    node_B : :class:`~netsquid.nodes.node.Node`
+        Node corresponding to Bob.
+    num_slots : int or None, optional
+        Number of slots, Bob's number of memory positions if None.
+    aggregator : :class:`~sweep_stats.SweepAggregator` or None, optional
+        If given, fidelities are streamed into this aggregator under ``sweep_key``.
+    sweep_key : hashable, optional
+        Sweep key to aggregate fidelities under.
+
+    Returns
+    -------
+    :class:`PipelinedBellMeasurementProtocol`
+        Alice's protocol.
+    :class:`PipelinedCorrectionProtocol`
+        Bob's protocol.
+    :class:`~netsquid.util.datacollector.DataCollector` or :class:`~telp.FidelityCollector`
+        Data collector to record fidelity.
+
+    """
+    import pydynaa
+    if num_slots is None:
+        num_slots = node_B.qmemory.num_positions
+    protocol_alice = PipelinedBellMeasurementProtocol(node_A, num_slots)
+    protocol_bob = PipelinedCorrectionProtocol(node_B, num_slots)
+    if aggregator is None:
+        from netsquid.util.datacollector import DataCollector
+        dc = DataCollector(_collect_fidelity_data)
+    else:
+        dc = FidelityCollector(_collect_fidelity_data, aggregator, sweep_key)
+    dc.collect_on(pydynaa.EventExpression(source=protocol_bob,
+                                          event_type=Signals.SUCCESS.value))
+    return protocol_alice, protocol_bob, dc
+
+
+def throughput_study(slot_counts, distances, duration=1e6, depolar_rate=1e6, dephase_rate=0.0,
+                     source_frequency=PIPELINE_SOURCE_FREQUENCY, seed=None):
+    """Teleportation throughput as a function of slot count and distance.
+
+    Parameters
+    ----------
+    slot_counts : list of int
+        Numbers of slots per node.
+    distances : list of float
+        Distances between nodes [km].
+    duration : float, optional
+        Simulated time per point [ns].
+    depolar_rate : float, optional
+        Depolarization rate of qubits in memory.
+    dephase_rate : float, optional
+        Dephasing rate of physical measurement instruction.
+    source_frequency : float, optional
+        Frequency of the entanglement source [Hz].
+    seed : int or None, optional
+        Seed of the simulator random state, set before every point.
+
+    Returns
+    -------
+    list of dict
+        Per point ``num_slots``, ``distance``, ``teleports``, ``throughput``
+        [teleports per simulated second], mean ``fidelity`` and the pairs
+        dropped by Alice and by Bob.
+
+    """
+    from sweep_stats import SweepAggregator
+    rows = []
+    for distance in distances:
+        for num_slots in slot_counts:
+            ns.sim_reset()
+            if seed is not None:
+                ns.set_random_state(seed=seed)
+            network = pipelined_network_setup(num_slots, distance, depolar_rate, dephase_rate,
+                                              source_frequency)
+            aggregator = SweepAggregator(key_name="num_slots")
+            protocol_alice, protocol_bob, _ = pipelined_sim_setup(
+                network.get_node("Alice"), network.get_node("Bob"), num_slots,
+                aggregator=aggregator, sweep_key=num_slots)
+            protocol_alice.start()
+            protocol_bob.start()
+            ns.sim_run(duration=duration)
+            stats = aggregator.stats(num_slots)
+            rows.append({"num_slots": num_slots, "distance": distance,
+                         "teleports": stats.count, "throughput": stats.count / (duration * 1e-9),
+                         "fidelity": stats.mean, "dropped_alice": protocol_alice.dropped,
+                         "dropped_bob": protocol_bob.dropped})
+    return rows
+
+
+if __name__ == '__main__':
+    rows = throughput_study(slot_counts=[1, 2, 4, 8, 16], distances=[4e-3, 2e-2, 1e-1])
+    print(f"{'distance [km]':>14s} {'slots':>6s} {'teleports/s':>12s} {'fidelity':>9s}")
+    for row in rows:
+        print(f"{row['distance']:14g} {row['num_slots']:6d} {row['throughput']:12.4g} "
+              f"{row['fidelity']:9.4f}")
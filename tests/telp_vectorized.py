@@ -0,0 +1,333 @@
+"""Vectorized NumPy engine for the teleportation protocol of :mod:`telp`.
+
+Simulates many teleportations of the ``telp`` protocol at once as stacked
+density matrices, instead of running every shot through the discrete event
+machinery. Only the Monte-Carlo statistics differ between shots of the
+discrete event simulation, so the engine follows the same timeline:
+
+1. Alice prepares y0 with ``InitStateProgram`` (INIT, H, S) right after her
+   previous Bell measurement and the qubit idles until the next pair arrives.
+2. The pair from the midpoint source arrives at Alice and Bob at the same time,
+   after which Alice runs ``BellMeasurementProgram`` (CNOT, H, MEASURE, MEASURE),
+   with the dephasing noise of the first measurement instruction.
+3. Bob's qubit idles until Alice's results arrive over the classical channel and
+   the Z and X corrections are applied, one instruction after the other.
+
+Memory noise is applied the way the quantum processor applies it: lazily, when
+a memory position is accessed, for the time since it was last accessed.
+The engine assumes the steady state of the protocol, i.e. it does not model
+the different idle time of the very first teleportation.
+
+Example
+-------
+
+>>> fidelities = simulate_fidelities(1000, depolar_rate=0, rng=42)
+>>> print(f"{fidelities.mean():.3f}")
+1.000
+
+"""
+import numpy as np
+
+__all__ = [
+    "SPEED_OF_LIGHT_FIBRE",
+    "INSTRUCTION_DURATIONS",
+    "teleport_timing",
+    "simulate_fidelities",
+    "run_experiment",
+    "cross_check",
+]
+
+# Default speed of light in fibre of FibreDelayModel [km/s]
+SPEED_OF_LIGHT_FIBRE = 200000.
+# Instruction durations [ns], as given to the physical instructions in telp.create_processor
+INSTRUCTION_DURATIONS = {"init": 3., "h": 1., "x": 1., "z": 1., "s": 1., "cnot": 4.,
+                         "measure": 7.}
+
+_KET_Y0 = np.array([1, 1j], dtype=complex) / np.sqrt(2)
+_DM_Y0 = np.outer(_KET_Y0, _KET_Y0.conj())
+_KET_B00 = np.array([1, 0, 0, 1], dtype=complex) / np.sqrt(2)
+_DM_B00 = np.outer(_KET_B00, _KET_B00.conj())
+_X = np.array([[0, 1], [1, 0]], dtype=complex)
+_Z = np.array([[1, 0], [0, -1]], dtype=complex)
+_H = np.array([[1, 1], [1, -1]], dtype=complex) / np.sqrt(2)
+_CNOT = np.array([[1, 0, 0, 0], [0, 1, 0, 0], [0, 0, 0, 1], [0, 0, 1, 0]], dtype=complex)
+# CNOT on (a0, a1) followed by H on a0, with Bob's qubit left untouched
+_BSM_UNITARY = np.kron(np.kron(_H, np.eye(2)) @ _CNOT, np.eye(2))
+# Correction operators X^m2 Z^m1, indexed by the outcome 2 * m1 + m2
+_CORRECTIONS = np.array([np.eye(2), _X, _Z, _X @ _Z], dtype=complex)
+
+
+def teleport_timing(node_distance=4e-3, source_frequency=None, durations=None):
+    """Idle times of the qubits in memory during one teleportation.
+
+    Parameters
+    ----------
+    node_distance : float, optional
+        Distance between nodes [km].
+    source_frequency : float or None, optional
+        Frequency of the entanglement source [Hz]. If None the frequency
+        used by ``telp.example_network_setup`` is taken.
+    durations : dict or None, optional
+        Instruction durations [ns], defaults to :data:`INSTRUCTION_DURATIONS`.
+
+    Returns
+    -------
+    dict
+        Times [ns] with keys ``period`` (source period), ``quantum_delay``
+        (midpoint to node), ``classical_delay`` (Alice to Bob), ``input_idle``
+        (y0 waiting for the pair), ``alice_idle_m1`` and ``alice_idle_m2``
+        (Alice's qubits between CNOT and their measurement), ``bob_idle``
+        (Bob's qubit until the first correction) and ``correction`` (duration
+        of each correction instruction).
+
+    Raises
+    ------
+    ValueError
+        If the source period is too short for the protocol to keep up.
+
+    """
+    durations = dict(INSTRUCTION_DURATIONS, **(durations or {}))
+    if source_frequency is None:
+        source_frequency = 4e4 / node_distance
+    period = 1e9 / source_frequency
+    quantum_delay = 1e9 * node_distance / 2 / SPEED_OF_LIGHT_FIBRE
+    classical_delay = 1e9 * node_distance / SPEED_OF_LIGHT_FIBRE
+    init_duration = durations["init"] + durations["h"] + durations["s"]
+    bsm_duration = durations["cnot"] + durations["h"] + 2 * durations["measure"]
+    if period < bsm_duration + init_duration:
+        raise ValueError(f"Source period {period} ns is shorter than Alice's cycle of "
+                         f"{bsm_duration + init_duration} ns")
+    if period < bsm_duration + classical_delay + durations["z"] + durations["x"]:
+        raise ValueError(f"Source period {period} ns is shorter than Bob's cycle")
+    return {
+        "period": period,
+        "quantum_delay": quantum_delay,
+        "classical_delay": classical_delay,
+        # The S gate is the last access of the prepared qubit before the CNOT
+        "input_idle": period - bsm_duration - (init_duration - durations["s"]),
+        "alice_idle_m1": durations["cnot"] + durations["h"],
+        "alice_idle_m2": durations["cnot"] + durations["h"] + durations["measure"],
+        "bob_idle": bsm_duration + classical_delay,
+        "correction": durations["z"],
+    }
+
+
+def _depolar_probability(depolar_rate, delta_time):
+    # Same probability as DepolarNoiseModel for a qubit idling delta_time [ns]
+    return 1. - np.exp(-np.asarray(delta_time, dtype=float) * 1e-9 * depolar_rate)
+
+
+def _depolarize(rho, qubit, num_qubits, prob):
+    # rho -> (1 - p) rho + p I/2 (x) Tr_qubit(rho), for a stack of probabilities
+    prob = np.broadcast_to(np.asarray(prob, dtype=float), (rho.shape[0],))
+    if not prob.any():
+        return rho
+    dim = 2 ** num_qubits
+    tensor = rho.reshape((-1,) + (2,) * (2 * num_qubits))
+    reduced = np.trace(tensor, axis1=1 + qubit, axis2=1 + num_qubits + qubit)
+    mixed = np.multiply.outer(reduced, np.eye(2) / 2)
+    # Put the maximally mixed qubit back at its place
+    mixed = np.moveaxis(mixed, (-2, -1), (1 + qubit, 1 + num_qubits + qubit))
+    mixed = mixed.reshape(-1, dim, dim)
+    weight = prob[:, None, None]
+    return (1. - weight) * rho + weight * mixed
+
+
+def _dephase(rho, qubit, num_qubits, prob):
+    # rho -> (1 - p) rho + p Z rho Z, as DephaseNoiseModel with time_independent=True.
+    # Z is diagonal, so this only damps the elements that are off-diagonal in the qubit.
+    if prob == 0:
+        return rho
+    signs = 1 - 2 * ((np.arange(2 ** num_qubits) >> (num_qubits - 1 - qubit)) & 1)
+    return rho * np.where(np.equal.outer(signs, signs), 1., 1. - 2. * prob)
+
+
+def _simulate_chunk(num_runs, depolar_rate, dephase_rate, timing, rng):
+    # Alice's prepared qubit idles until the pair arrives
+    rho_in = np.broadcast_to(_DM_Y0, (num_runs, 2, 2))
+    rho_in = _depolarize(rho_in, 0, 1, _depolar_probability(depolar_rate, timing["input_idle"]))
+    rho = np.einsum("nij,kl->nikjl", rho_in, _DM_B00).reshape(num_runs, 8, 8)
+    rho = _BSM_UNITARY @ rho @ _BSM_UNITARY.conj().T
+    # Depolarization commutes with H, so the idle times of Alice's qubits after
+    # the CNOT can be applied at once, just before they are measured
+    rho = _depolarize(rho, 0, 3, _depolar_probability(depolar_rate, timing["alice_idle_m1"]))
+    rho = _depolarize(rho, 1, 3, _depolar_probability(depolar_rate, timing["alice_idle_m2"]))
+    rho = _dephase(rho, 0, 3, dephase_rate)
+    # Sample all Bell measurement outcomes at once
+    blocks = rho.reshape(num_runs, 4, 2, 4, 2)
+    blocks = blocks[:, np.arange(4), :, np.arange(4), :]  # (4, N, 2, 2)
+    probs = np.real(np.trace(blocks, axis1=2, axis2=3)).T  # (N, 4)
+    cumulative = np.cumsum(probs, axis=1)
+    uniform = rng.random(num_runs)[:, None] * cumulative[:, -1:]
+    outcomes = np.minimum((uniform >= cumulative).sum(axis=1), 3)
+    rho_bob = blocks[outcomes, np.arange(num_runs)] / probs[np.arange(num_runs), outcomes,
+                                                              None, None]
+    # Bob's qubit idles until the corrections, and for each correction applied
+    num_corrections = (outcomes >> 1) + (outcomes & 1)
+    bob_idle = timing["bob_idle"] + num_corrections * timing["correction"]
+    rho_bob = _depolarize(rho_bob, 0, 1, _depolar_probability(depolar_rate, bob_idle))
+    correction = _CORRECTIONS[outcomes]
+    rho_bob = correction @ rho_bob @ correction.conj().transpose(0, 2, 1)
+    return np.real((rho_bob @ _KET_Y0) @ _KET_Y0.conj())
+
+
+def simulate_fidelities(num_runs, depolar_rate, dephase_rate=0.0, node_distance=4e-3,
+                        rng=None, chunk_size=100000):
+    """Simulate teleportations and return the fidelity of each.
+
+    Parameters
+    ----------
+    num_runs : int
+        Number of teleportations to simulate.
+    depolar_rate : float
+        Depolarization rate of qubits in memory [Hz].
+    dephase_rate : float, optional
+        Dephasing probability of the physical measurement instruction.
+    node_distance : float, optional
+        Distance between nodes [km].
+    rng : :class:`numpy.random.Generator`, int or None, optional
+        Random number generator, or seed to create one.
+    chunk_size : int, optional
+        Maximum number of shots held in memory at once.
+
+    Returns
+    -------
+    :class:`numpy.ndarray`
+        Squared fidelity of each teleported state with y0.
+
+    """
+    rng = np.random.default_rng(rng)
+    timing = teleport_timing(node_distance)
+    chunks = [_simulate_chunk(min(chunk_size, num_runs - start), depolar_rate, dephase_rate,
+                              timing, rng)
+              for start in range(0, num_runs, chunk_size)]
+    if not chunks:
+        return np.empty(0)
+    return np.concatenate(chunks)
+
+
+def _point_fidelities(num_runs, depolar_rate, dephase_rate, distance, rng, target_sem,
+                      min_runs):
+    # Fidelities of one rate, simulated in chunks until target_sem if given
+    if target_sem is None:
+        return simulate_fidelities(num_runs, depolar_rate, dephase_rate, distance, rng=rng)
+    from sweep_stats import RunningStats, next_chunk_size
+    stats = RunningStats()
+    chunks = []
+    while True:
+        chunk = next_chunk_size(stats, target_sem, min_count=min_runs, max_count=num_runs)
+        if chunk == 0:
+            return np.concatenate(chunks) if chunks else np.empty(0)
+        chunks.append(simulate_fidelities(chunk, depolar_rate, dephase_rate, distance, rng=rng))
+        stats.add_many(chunks[-1])
+
+
+def run_experiment(num_runs, depolar_rates, distance=4e-3, dephase_rate=0.0, seed=None,
+                   aggregate=False, keep_raw=False, target_sem=None, min_runs=100):
+    """Vectorized counterpart of :func:`telp.run_experiment`.
+
+    Parameters
+    ----------
+    num_runs : int
+        Number of teleportations per depolarization rate.
+    depolar_rates : list of float
+        List of depolarization rates to repeat experiment for.
+    distance : float, optional
+        Distance between nodes [km].
+    dephase_rate : float, optional
+        Dephasing rate of physical measurement instruction.
+    seed : int or None, optional
+        Root seed of a :class:`~seeding.SeedTree`. Rate ``i`` draws from the
+        generator of its ``i``-th child, so it does not depend on the other
+        rates or on how many shots they took. The root entropy is recorded
+        under "seed_tree" in the ``metadata`` of the aggregator or the
+        ``attrs`` of the dataframe.
+    aggregate : bool, optional
+        Whether to return running statistics per rate instead of every fidelity.
+    keep_raw : bool, optional
+        Whether the aggregator should also keep the raw fidelities.
+    target_sem : float or None, optional
+        If given, simulate every rate in chunks until the standard error of its
+        mean fidelity is at most ``target_sem``, with at most ``num_runs`` shots.
+    min_runs : int, optional
+        Minimum number of shots per rate before stopping on ``target_sem``.
+
+    Returns
+    -------
+    :class:`pandas.DataFrame` or :class:`~sweep_stats.SweepAggregator`
+        Dataframe with the same layout as :func:`telp.run_experiment`,
+        or the aggregator if ``aggregate`` is set.
+
+    """
+    from seeding import SeedTree
+    seed_tree = SeedTree(seed)
+    if aggregate:
+        from sweep_stats import SweepAggregator
+        aggregator = SweepAggregator(keep_raw=keep_raw)
+        aggregator.metadata["seed_tree"] = {"root_entropy": seed_tree.entropy}
+        for index, depolar_rate in enumerate(depolar_rates):
+            aggregator.add_many(depolar_rate, _point_fidelities(
+                num_runs, depolar_rate, dephase_rate, distance, seed_tree.point_rng(index),
+                target_sem, min_runs))
+        return aggregator
+    import pandas
+    frames = [pandas.DataFrame({"fidelity": _point_fidelities(num_runs, depolar_rate,
+                                                               dephase_rate, distance,
+                                                               seed_tree.point_rng(index),
+                                                               target_sem, min_runs),
+                                "depolar_rate": depolar_rate})
+              for index, depolar_rate in enumerate(depolar_rates)]
+    if not frames:
+        return pandas.DataFrame()
+    df = pandas.concat(frames)
+    df.attrs["seed_tree"] = {"root_entropy": seed_tree.entropy}
+    return df
+
+
+def cross_check(num_runs, depolar_rates, distance=4e-3, dephase_rate=0.0, seed=42,
+                max_z_score=4.0):
+    """Compare the vectorized engine against the discrete event simulation.
+
+    Requires netsquid, as :func:`telp.run_experiment` is run for every rate.
+
+    Parameters
+    ----------
+    num_runs : int
+        Number of teleportations per depolarization rate.
+    depolar_rates : list of float
+        List of depolarization rates to compare.
+    distance : float, optional
+        Distance between nodes [km].
+    dephase_rate : float, optional
+        Dephasing rate of physical measurement instruction.
+    seed : int, optional
+        Seed for both simulations.
+    max_z_score : float, optional
+        Largest accepted difference between the mean fidelities, in units of
+        their combined standard error.
+
+    Returns
+    -------
+    :class:`pandas.DataFrame`
+        Mean fidelity and SEM of both simulations per rate, the z-score of
+        their difference and whether it is acceptable (column ``ok``).
+
+    """
+    import telp
+    simulated = telp.run_experiment(num_runs, depolar_rates, distance=distance,
+                                    dephase_rate=dephase_rate, seed=seed,
+                                    aggregate=True).dataframe
+    vectorized = run_experiment(num_runs, depolar_rates, distance=distance,
+                                dephase_rate=dephase_rate, seed=seed,
+                                aggregate=True).dataframe
+    data = simulated.merge(vectorized, on="depolar_rate", suffixes=("_simulated", "_vectorized"))
+    data = data[["depolar_rate", "fidelity_simulated", "sem_simulated",
+                 "fidelity_vectorized", "sem_vectorized"]]
+    combined_sem = np.sqrt(data["sem_simulated"].fillna(0) ** 2 +
+                           data["sem_vectorized"].fillna(0) ** 2)
+    difference = (data["fidelity_simulated"] - data["fidelity_vectorized"]).abs()
+    # Points without spread (e.g. no noise at all) must agree exactly
+    data["z_score"] = np.where(combined_sem > 0, difference / combined_sem.where(
+        combined_sem > 0, 1.), np.where(difference > 1e-9, np.inf, 0.))
+    data["ok"] = data["z_score"] <= max_z_score
+    return data
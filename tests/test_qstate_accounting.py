@@ -0,0 +1,155 @@
+"""Behaviour of :class:`qstate_accounting.StateAccountant`.
+
+Most tests replace the qubit API by a small model of netsquid's: qubits share
+a state object that references them back, states merge on multi-qubit
+operations and measured qubits are dropped without being discarded, as the
+tutorials do. The scenario tests run the processor driven protocols of
+:mod:`telp` and :mod:`repeater_chain` and need netsquid.
+
+"""
+import gc
+import sys
+import types
+import warnings
+
+import pytest
+
+from qstate_accounting import StateAccountant, StateBudgetWarning, state_bytes
+
+
+class _QState:
+    def __init__(self, qubits):
+        self.qubits = list(qubits)
+        for qubit in self.qubits:
+            qubit.qstate = self
+
+    @property
+    def num_qubits(self):
+        return len(self.qubits)
+
+
+class _Qubit:
+    qstate = None
+
+
+def _create_qubits(num_qubits):
+    qubits = [_Qubit() for _ in range(num_qubits)]
+    for qubit in qubits:
+        _QState([qubit])
+    return qubits
+
+
+def _operate(qubits, operator=None):
+    states = []
+    for qubit in qubits:
+        if qubit.qstate not in states:
+            states.append(qubit.qstate)
+    if len(states) > 1:
+        _QState([qubit for qstate in states for qubit in qstate.qubits])
+
+
+def _discard(qubit):
+    qubit.qstate.qubits.remove(qubit)
+    qubit.qstate = None
+
+
+@pytest.fixture
+def fake_netsquid(monkeypatch):
+    formalism = {"current": "DM"}
+    qubitapi = types.ModuleType("netsquid.qubits.qubitapi")
+    for name in ("assign_qstate", "measure", "multi_operate", "combine_qubits"):
+        setattr(qubitapi, name, lambda *args, **kwargs: None)
+    qubitapi.create_qubits = _create_qubits
+    qubitapi.operate = _operate
+    qubitapi.discard = _discard
+    qubits = types.ModuleType("netsquid.qubits")
+    qubits.qubitapi = qubitapi
+    qubits.operate = _operate
+    netsquid = types.ModuleType("netsquid")
+    netsquid.qubits = qubits
+    netsquid.sim_time = lambda: 0.
+    netsquid.get_qstate_formalism = lambda: formalism["current"]
+    netsquid.set_qstate_formalism = lambda name: formalism.update(current=name)
+    netsquid.QFormalism = {name: name for name in ("KET", "DM", "STAB", "GSLC")}
+    monkeypatch.setitem(sys.modules, "netsquid", netsquid)
+    monkeypatch.setitem(sys.modules, "netsquid.qubits", qubits)
+    monkeypatch.setitem(sys.modules, "netsquid.qubits.qubitapi", qubitapi)
+    return netsquid, formalism
+
+
+def _teleport(qubitapi):
+    # Merge three qubits, then drop the two measured ones and keep the third
+    qubits = qubitapi.create_qubits(3)
+    qubitapi.operate(qubits[:2])
+    qubitapi.operate(qubits[1:])
+    return qubits[2]
+
+
+def test_dropped_states_leave_the_account(fake_netsquid):
+    netsquid, formalism = fake_netsquid
+    qubitapi = netsquid.qubits.qubitapi
+    accountant = StateAccountant(budget_bytes=16 * 2 ** 10, on_exceed="switch")
+    kept = None
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", StateBudgetWarning)
+        with accountant:
+            accountant.start_run()
+            for _ in range(20):
+                kept = _teleport(qubitapi)
+                gc.collect()
+                assert accountant.live_states == 1
+    assert formalism["current"] == "DM"
+    assert accountant.switches == []
+    assert accountant.runs[0]["peak_state_qubits"] == 3
+    assert accountant.live_bytes == state_bytes(3, "DM")
+    del kept
+    gc.collect()
+    assert accountant.live_states == 0
+
+
+def test_budget_switches_formalism_of_new_states(fake_netsquid):
+    netsquid, formalism = fake_netsquid
+    qubitapi = netsquid.qubits.qubitapi
+    accountant = StateAccountant(budget_bytes=state_bytes(2, "DM") + state_bytes(1, "DM"),
+                                 on_exceed="switch")
+    with accountant:
+        accountant.start_run("merge")
+        qubits = qubitapi.create_qubits(3)
+        with accountant.step("grow"):
+            qubitapi.operate(qubits[:2])
+            with pytest.warns(StateBudgetWarning):
+                qubitapi.operate(qubits[1:])
+    assert formalism["current"] == "KET"
+    assert accountant.switches[0]["step"] == "grow"
+    # The merged state keeps the formalism of the states it merged
+    assert accountant.live_bytes == state_bytes(3, "DM")
+    assert accountant.runs[0]["peak_step"] == "grow"
+    assert qubitapi.operate is _operate
+
+
+def test_teleport_scenario_reports_bell_measurement_peak():
+    ns = pytest.importorskip("netsquid")
+    import telp
+    accountant = StateAccountant(budget_bytes=state_bytes(2, "DM"), on_exceed="warn")
+    with pytest.warns(StateBudgetWarning):
+        telp._run_sweep_point(20, 1e6, 4e-3, 0., aggregate=True, formalism=ns.QFormalism.DM,
+                              accountant=accountant)
+    peak = accountant.runs[0]
+    assert peak["run"] == 1e6
+    # y0 merges with Alice's half of the pair in the Bell measurement
+    assert peak["peak_state_qubits"] == 3
+    assert peak["peak_step"] == "bell_measurement"
+    assert peak["peak_state_bytes"] == state_bytes(3, "DM")
+
+
+def test_repeater_chain_reports_merged_states():
+    pytest.importorskip("netsquid")
+    from repeater_chain import RepeaterChain
+    accountant = StateAccountant()
+    chain = RepeaterChain(num_nodes=3, total_length=4e-2, depolar_rate=1e6)
+    result = chain.run(num_runs=20, accountant=accountant)
+    # The swap merges the pairs of both links
+    assert result["peak_state_qubits"] >= 4
+    assert result["peak_step"] in ("swap", "bell_measurement")
+    chain.run(num_runs=20, accountant=accountant)
+    assert [run["run"] for run in accountant.runs] == [3, 3]
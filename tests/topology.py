@@ -0,0 +1,249 @@
+"""Network topologies from node coordinates.
+
+Vectorized version of the ``No``/``Canal`` model sketched in
+network_parameters.md: instead of computing the distance between nodes one
+pair at a time, the full pairwise great-circle distance matrix of all nodes
+is computed in a single NumPy pass. Channel lengths and fibre delays of all
+candidate links are derived from it in bulk, and netsquid networks are
+emitted from the resulting links.
+
+Example
+-------
+
+>>> topology = Topology.from_records([
+...     {"id": "Natal", "lat": -5.7945, "long": -35.2110},
+...     {"id": "Recife", "lat": -8.0476, "long": -34.8770},
+...     {"id": "Fortaleza", "lat": -3.7319, "long": -38.5267}])
+>>> print(f"{topology.distances[0, 1]:.1f}")
+253.2
+>>> topology.links(max_length=300).ids
+[('Natal', 'Recife')]
+
+"""
+import numpy as np
+
+__all__ = [
+    "EARTH_RADIUS",
+    "SPEED_OF_LIGHT_FIBRE",
+    "great_circle_distances",
+    "Links",
+    "Topology",
+]
+
+# Mean earth radius [km]
+EARTH_RADIUS = 6371.0088
+# Default speed of light in fibre of FibreDelayModel [km/s]
+SPEED_OF_LIGHT_FIBRE = 200000.
+
+
+def great_circle_distances(lat, long, radius=EARTH_RADIUS, dtype=np.float64):
+    """Pairwise great-circle distances.
+
+    Parameters
+    ----------
+    lat : array_like
+        Latitudes [degrees].
+    long : array_like
+        Longitudes [degrees].
+    radius : float, optional
+        Radius of the sphere [km].
+    dtype : data-type, optional
+        Floating point type of the result. ``numpy.float32`` halves the memory
+        needed to keep the matrix of very large topologies.
+
+    Returns
+    -------
+    :class:`numpy.ndarray`
+        Symmetric matrix of distances [km] with zeros on the diagonal.
+
+    """
+    lat = np.radians(np.asarray(lat, dtype=float))
+    long = np.radians(np.asarray(long, dtype=float))
+    # Unit vectors of the nodes: the chord between two nodes follows from a single
+    # matrix product, and the great-circle distance from the chord
+    cos_lat = np.cos(lat)
+    vectors = np.stack([cos_lat * np.cos(long), cos_lat * np.sin(long), np.sin(lat)], axis=1)
+    distances = vectors @ vectors.T
+    # Squared half chord, clipped against rounding
+    np.subtract(1., distances, out=distances)
+    np.multiply(distances, 0.5, out=distances)
+    np.clip(distances, 0., 1., out=distances)
+    np.sqrt(distances, out=distances)
+    np.arcsin(distances, out=distances)
+    distances *= 2. * radius
+    np.fill_diagonal(distances, 0.)
+    return distances.astype(dtype, copy=False)
+
+
+class Links:
+    """Candidate links between the nodes of a topology.
+
+    Parameters
+    ----------
+    topology : :class:`Topology`
+        Topology the links belong to.
+    first : :class:`numpy.ndarray`
+        Index of the first node of every link.
+    second : :class:`numpy.ndarray`
+        Index of the second node of every link.
+    lengths : :class:`numpy.ndarray`
+        Length of every link [km].
+
+    """
+
+    def __init__(self, topology, first, second, lengths):
+        self.topology = topology
+        self.first = first
+        self.second = second
+        self.lengths = lengths
+
+    def __len__(self):
+        return len(self.lengths)
+
+    @property
+    def ids(self):
+        """list of tuple: Node ids of every link."""
+        ids = self.topology.ids
+        return [(ids[i], ids[j]) for i, j in zip(self.first.tolist(), self.second.tolist())]
+
+    def delays(self, speed=SPEED_OF_LIGHT_FIBRE):
+        """Fibre delay of every link, as :class:`FibreDelayModel` computes it.
+
+        Parameters
+        ----------
+        speed : float, optional
+            Speed of light in fibre [km/s].
+
+        Returns
+        -------
+        :class:`numpy.ndarray`
+            Delays [ns].
+
+        """
+        return self.lengths * (1e9 / speed)
+
+
+class Topology:
+    """Nodes with coordinates and the distances between them.
+
+    Parameters
+    ----------
+    ids : list of str
+        Node ids.
+    lat : array_like
+        Latitudes of the nodes [degrees].
+    long : array_like
+        Longitudes of the nodes [degrees].
+    dtype : data-type, optional
+        Floating point type of the distance matrix.
+
+    """
+
+    def __init__(self, ids, lat, long, dtype=np.float64):
+        self.ids = list(ids)
+        self.lat = np.asarray(lat, dtype=float)
+        self.long = np.asarray(long, dtype=float)
+        if not len(self.ids) == len(self.lat) == len(self.long):
+            raise ValueError("ids, lat and long must have the same length")
+        self.dtype = dtype
+        self._distances = None
+
+    @classmethod
+    def from_records(cls, records, **kwargs):
+        """Create a topology from records with ``id``, ``lat`` and ``long`` keys.
+
+        Parameters
+        ----------
+        records : iterable of dict
+            Node records, as the attributes of ``No`` in network_parameters.md.
+
+        Returns
+        -------
+        :class:`Topology`
+            The topology.
+
+        """
+        records = list(records)
+        return cls([record["id"] for record in records], [record["lat"] for record in records],
+                   [record["long"] for record in records], **kwargs)
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def distances(self):
+        """:class:`numpy.ndarray`: Pairwise great-circle distances [km], computed once."""
+        if self._distances is None:
+            self._distances = great_circle_distances(self.lat, self.long, dtype=self.dtype)
+        return self._distances
+
+    def links(self, max_length=None):
+        """Candidate links, each pair of distinct nodes at most ``max_length`` apart.
+
+        Parameters
+        ----------
+        max_length : float or None, optional
+            Maximum length of a link [km]. If None all pairs are candidates.
+
+        Returns
+        -------
+        :class:`Links`
+            The candidate links.
+
+        """
+        if max_length is None:
+            first, second = np.triu_indices(len(self), k=1)
+        else:
+            # Select on the matrix first, so only the kept pairs are indexed
+            candidates = self.distances <= max_length
+            first, second = np.nonzero(np.triu(candidates, k=1))
+        return Links(self, first, second, self.distances[first, second])
+
+    def to_network(self, links=None, name="Topology", connection_factory=None):
+        """Create a netsquid network with a node per topology node.
+
+        Parameters
+        ----------
+        links : :class:`Links` or None, optional
+            Links to connect, all pairs if None.
+        name : str, optional
+            Name of the network.
+        connection_factory : callable or None, optional
+            Called as ``connection_factory(name, length, delay)`` to create the
+            connection of every link. Defaults to a bidirectional quantum
+            connection with the precomputed fibre delay.
+
+        Returns
+        -------
+        :class:`~netsquid.nodes.network.Network`
+            The network.
+
+        """
+        from netsquid.nodes import Node, Network
+        if links is None:
+            links = self.links()
+        if connection_factory is None:
+            connection_factory = _quantum_connection
+        network = Network(name)
+        nodes = [Node(node_id) for node_id in self.ids]
+        network.add_nodes(nodes)
+        delays = links.delays()
+        for i, j, length, delay in zip(links.first.tolist(), links.second.tolist(),
+                                       links.lengths.tolist(), delays.tolist()):
+            label = f"{self.ids[i]}|{self.ids[j]}"
+            network.add_connection(nodes[i], nodes[j],
+                                   connection=connection_factory(f"conn[{label}]", length, delay),
+                                   label=label)
+        return network
+
+
+def _quantum_connection(name, length, delay):
+    from netsquid.components import QuantumChannel
+    from netsquid.components.models.delaymodels import FixedDelayModel
+    from netsquid.nodes import DirectConnection
+    return DirectConnection(
+        name=name,
+        channel_AtoB=QuantumChannel(f"{name}_AtoB", length=length,
+                                    models={"delay_model": FixedDelayModel(delay=delay)}),
+        channel_BtoA=QuantumChannel(f"{name}_BtoA", length=length,
+                                    models={"delay_model": FixedDelayModel(delay=delay)}))